@@ -1,14 +1,27 @@
 """FastAPI server for SunnySips."""
 import json
+import math
+import os
 import pathlib
-from collections.abc import Iterable
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
-from fastapi import FastAPI, Query
+import numpy as np
+from fastapi import FastAPI, HTTPException, Path, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 
+from building_artifact import load_building_index
+from cafe_index import CafeIndex, feature_id
 from city_config import CITY_CONFIGS, get_city_config
+from execution import EngineExecutor, RouteLimit, RouteOverloaded, SingleFlight
+from parallel_scoring import ParallelScorer
 from recommendations import (
     FRESH_TTL_HOURS,
     OUTLOOK_CACHE_ROOT,
@@ -22,134 +35,241 @@ from recommendations import (
     read_cache,
     write_cache,
 )
-from shadow_engine import TO_UTM, build_building_index, compute_sunny_cafes
+from response_cache import (
+    NDJSON_MEDIA_TYPE,
+    EncodedPayload,
+    ResponseCache,
+    encode_payload,
+    etag_matches,
+    json_bytes,
+    ndjson_chunks,
+)
+from shadow_engine import (
+    HORIZON_BIN_DEG,
+    SHADOW_CACHE,
+    SUN_REF_LAT,
+    SUN_REF_LON,
+    HorizonProfiles,
+    SeatSunIntervals,
+    _cloud_factor,
+    build_horizon_profiles,
+    compute_seat_sun_intervals_many,
+    compute_sunny_cafes,
+    compute_sunny_timeseries,
+    get_sun_positions,
+    nearest_sunny_cafes,
+)
+from sun_atlas import load_sun_atlas
+from tiles import TILE_MAX_ZOOM, TILE_MIN_ZOOM, tile_bounds, tile_xy
 from weather import get_cloud_cover
-from weather_router import confidence_hint, get_cloud_cover_series
-from shapely import make_valid
-from shapely.geometry import shape
-from shapely.ops import transform
+from weather_router import WEATHER_FLIGHTS, confidence_hint, get_cloud_cover_series
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    yield
+    # Worker processes must not outlive the server.
+    _close_parallel_scorer()
+
 
-app = FastAPI(title="SunnySips", version="0.1.0")
+app = FastAPI(title="SunnySips", version="0.1.0", lifespan=_lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
+# Engine work (shading, weather fetches) runs on a bounded pool behind per-route gates;
+# cheap routes stay on the event loop. Beyond max_queue waiters a route answers 503.
+ENGINE = EngineExecutor(
+    {
+        "sunny": RouteLimit(max_concurrent=4, max_queue=64),
+        "outlook": RouteLimit(max_concurrent=2, max_queue=32),
+        "favorites": RouteLimit(max_concurrent=2, max_queue=16),
+    }
+)
+
+
+# Concurrent identical outlook / favorites requests share one computation (keyed like their disk caches).
+OUTLOOK_FLIGHTS = SingleFlight("outlook")
+FAVORITES_FLIGHTS = SingleFlight("favorites")
+SUNNY_FLIGHTS = SingleFlight("sunny")
+
+# /api/sunny answers are cached as response bytes per (time slot, bbox, limit, data version).
+# Times are floored to the slot the iOS client already sends. A miss ranks the bbox snapped
+# outward to a ~100 m grid (kept in SUNNY_CELLS, so nearby map pans share the scoring) and
+# then cuts that ranking back to the requested bbox and limit.
+SUNNY_SLOT_MINUTES = 15
+SUNNY_BBOX_SNAP_DEG = 0.001
+SUNNY_CACHE = ResponseCache()
+SUNNY_CELLS = ResponseCache()
+# Encoded outlooks per (outlook key, hour slot, data version). Payloads report the age of
+# their weather, so a hit may understate it by up to the TTL.
+OUTLOOK_RESPONSES = ResponseCache(max_bytes=32 * 1024 * 1024, ttl_s=900.0)
+# Encoded tiles per (z/x/y, time slot, data version). Tile URLs are the same for every
+# viewport, so this (and any CDN honouring TILE_MAX_AGE_S) is shared by all map users.
+TILE_CACHE = ResponseCache()
+TILE_MAX_AGE_S = 300
+# Queries per /api/sunny/batch request; each distinct time slot adds one engine column.
+SUNNY_BATCH_MAX_QUERIES = 96
+
+
+@app.exception_handler(RouteOverloaded)
+async def _route_overloaded(request: Request, exc: RouteOverloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
 DATA_DIR = pathlib.Path("data")
 
 # ---------- Load data at startup ----------
 
-def _load_cafes() -> list[dict]:
-    path = DATA_DIR / "cafes_copenhagen.geojson"
-    with open(path) as f:
-        return json.load(f)["features"]
+CAFES_PATH = DATA_DIR / "cafes_copenhagen.geojson"
+# How often requests stat the cafe file for changes; an edited file is picked up within this.
+CAFES_RELOAD_CHECK_S = 10.0
 
 
-def _as_float(value) -> float | None:
-    if value is None:
-        return None
-    if isinstance(value, (int, float)):
-        return float(value)
-    if isinstance(value, str):
-        cleaned = value.lower().replace("m", "").strip()
-        try:
-            return float(cleaned)
-        except ValueError:
-            return None
-    return None
-
-
-def _resolve_height_m(properties: dict) -> tuple[float, str]:
-    direct_height = _as_float(properties.get("height"))
-    if direct_height and direct_height > 0:
-        return direct_height, "height_tag"
-
-    # Datafordeler/BBR: number of floors for many buildings.
-    bbr_levels = _as_float(properties.get("byg054AntalEtager"))
-    if bbr_levels and bbr_levels > 0:
-        return bbr_levels * 3.0, "bbr_floors"
-
-    bbr_alt_levels = _as_float(properties.get("byg055AfvigendeEtager"))
-    if bbr_alt_levels and bbr_alt_levels > 0:
-        return bbr_alt_levels * 3.0, "bbr_alt_floors"
-
-    levels = _as_float(properties.get("building:levels"))
-    if levels and levels > 0:
-        return levels * 3.0, "building_levels"
-
-    building_type = (properties.get("building") or "yes").lower()
-    defaults = {
-        "house": 8.0,
-        "residential": 9.0,
-        "apartments": 12.0,
-        "commercial": 14.0,
-        "retail": 12.0,
-        "office": 15.0,
-        "industrial": 11.0,
-        "warehouse": 10.0,
-        "hospital": 18.0,
-        "hotel": 20.0,
-        "school": 12.0,
-        "church": 22.0,
-        "cathedral": 25.0,
-    }
-    return defaults.get(building_type, 9.0), f"imputed_{building_type}"
-
-
-def _load_buildings() -> list[dict]:
-    """Load buildings and convert to UTM Shapely polygons."""
-    path = DATA_DIR / "buildings.geojson"
-    with open(path) as f:
-        raw = json.load(f)
-
-    features = raw.get("features", [])
-    buildings = []
-    skipped_nonpolygon = 0
-    for feature in features:
-        geom_json = feature.get("geometry")
-        if not geom_json:
-            continue
-
-        geom = shape(geom_json)
-        if geom.is_empty:
-            continue
-        if not geom.is_valid:
-            geom = make_valid(geom)
-            if geom.is_empty:
-                continue
-        if geom.geom_type not in ("Polygon", "MultiPolygon"):
-            skipped_nonpolygon += 1
-            continue
-
-        geom_utm = transform(TO_UTM.transform, geom)
-        props = feature.get("properties", {})
-        height_m, height_source = _resolve_height_m(props)
-
-        buildings.append(
-            {
-                "osm_id": props.get("osm_id"),
-                "geom_utm": geom_utm,
-                "height_m": height_m,
-                "height_source": height_source,
-                "building_type": (
-                    props.get("building")
-                    or props.get("byg021BygningensAnvendelse")
-                    or "yes"
-                ),
-            }
-        )
+@dataclass(frozen=True, slots=True)
+class CafeCatalog:
+    """One generation of cafe data; replaced whole, so readers never mix generations."""
+
+    index: CafeIndex
+    # Bumped on every reload; part of response cache keys.
+    generation: int
+    mtime_ns: int
+    # /api/cafes body, encoded and compressed once per generation.
+    response: EncodedPayload
+
+    @property
+    def features(self) -> list[dict]:
+        return self.index.features
 
-    print(
-        f"Building load diagnostics: total_features={len(features)}, "
-        f"usable_polygons={len(buildings)}, skipped_nonpolygon={skipped_nonpolygon}"
+
+def _load_cafe_catalog(generation: int) -> CafeCatalog:
+    mtime_ns = CAFES_PATH.stat().st_mtime_ns
+    with open(CAFES_PATH) as f:
+        index = CafeIndex(json.load(f)["features"])
+    return CafeCatalog(
+        index=index,
+        generation=generation,
+        mtime_ns=mtime_ns,
+        response=encode_payload({"cafes": index.features}, f"cafes:{generation}"),
     )
-    return buildings
 
 
-CAFES = _load_cafes()
-BUILDINGS = _load_buildings()
-BUILDING_INDEX = build_building_index(BUILDINGS)
+CAFE_CATALOG = _load_cafe_catalog(generation=0)
+_CAFES_RELOAD_LOCK = threading.Lock()
+_cafes_checked_at = time.monotonic()
+BUILDING_INDEX, BUILDING_SOURCE = load_building_index(
+    DATA_DIR / "buildings.geojson",
+    DATA_DIR / "buildings_artifact",
+    cafes=CAFE_CATALOG.features,
+)
 print(
-    f"Loaded {len(CAFES)} cafes, {len(BUILDINGS)} buildings "
-    f"({len(BUILDING_INDEX['records'])} indexed for shadows)"
+    f"Loaded {len(CAFE_CATALOG.features)} cafes, {len(BUILDING_INDEX)} buildings indexed for shadows "
+    f"(from {BUILDING_SOURCE})"
 )
+# Precomputed 5-minute sun bitmasks (``python sun_atlas.py``); None falls back to the engine.
+SUN_ATLAS = load_sun_atlas(DATA_DIR / "sun_atlas", building_index=BUILDING_INDEX)
+if SUN_ATLAS is not None:
+    print(f"Sun atlas: {len(SUN_ATLAS)} cafes for {SUN_ATLAS.year}, {SUN_ATLAS.nbytes / 1e6:.1f} MB mapped")
+# Worker processes for large /api/sunny requests (0 = score in-process).
+SCORING_WORKERS = int(os.environ.get("SUNNYSIPS_SCORING_WORKERS", "0"))
+# Smaller requests are not worth the inter-process round trip.
+PARALLEL_MIN_CAFES = 300
+_SCORER: ParallelScorer | None = None
+_SCORER_LOCK = threading.Lock()
+# Seat horizons are static (buildings and seats never move), so keep them per cafe,
+# least recently used first out once the cap is reached.
+HORIZONS_MAX_ENTRIES = 4096
+HORIZONS_BY_CAFE: OrderedDict[str, HorizonProfiles] = OrderedDict()
+_HORIZONS_LOCK = threading.Lock()
+# Sun intervals per (cafe, outlook range): pure geometry, so a forecast refresh within
+# the same hour only re-applies the weather.
+SEAT_INTERVALS_MAX_ENTRIES = 4096
+SEAT_INTERVALS: OrderedDict[tuple[str, datetime, datetime], SeatSunIntervals] = OrderedDict()
+_SEAT_INTERVALS_LOCK = threading.Lock()
+# (catalog generation, id of SUN_ATLAS) -> whether the atlas has every catalog cafe.
+_ATLAS_COVERS_CATALOG: dict[tuple[int, int], bool] = {}
+
+
+def _cafe_catalog() -> CafeCatalog:
+    """
+    The current cafe catalog, reloaded first when the cafe file changed on disk.
+
+    The file is checked at most every ``CAFES_RELOAD_CHECK_S``. A file that
+    fails to parse (e.g. mid-write) keeps the current catalog until a later check.
+    """
+    global _cafes_checked_at
+    if time.monotonic() - _cafes_checked_at < CAFES_RELOAD_CHECK_S:
+        return CAFE_CATALOG
+    with _CAFES_RELOAD_LOCK:
+        if time.monotonic() - _cafes_checked_at >= CAFES_RELOAD_CHECK_S:
+            try:
+                if CAFES_PATH.stat().st_mtime_ns != CAFE_CATALOG.mtime_ns:
+                    reload_cafes()
+            except (OSError, ValueError, KeyError) as exc:
+                print(f"Cafe reload skipped: {type(exc).__name__}: {exc}")
+            _cafes_checked_at = time.monotonic()
+    return CAFE_CATALOG
+
+
+def reload_cafes() -> CafeCatalog:
+    """
+    Re-read the cafe file and swap in a new catalog in one assignment.
+
+    In-flight requests keep the catalog they started with. Per-cafe geometry
+    caches are dropped because a cafe id may now point at a moved cafe.
+    """
+    global CAFE_CATALOG
+    catalog = _load_cafe_catalog(generation=CAFE_CATALOG.generation + 1)
+    CAFE_CATALOG = catalog
+    # Workers hold seat lists for the previous cafes.
+    _close_parallel_scorer()
+    with _HORIZONS_LOCK:
+        HORIZONS_BY_CAFE.clear()
+    with _SEAT_INTERVALS_LOCK:
+        SEAT_INTERVALS.clear()
+    _ATLAS_COVERS_CATALOG.clear()
+    SUNNY_CACHE.clear()
+    SUNNY_CELLS.clear()
+    OUTLOOK_RESPONSES.clear()
+    TILE_CACHE.clear()
+    return catalog
+
+
+def _encoded_response(request: Request, encoded: EncodedPayload, cache_control: str = "no-cache") -> Response:
+    """Serve a pre-encoded payload: 304 when the client's ETag matches, else the best accepted encoding."""
+    body, encoding = encoded.negotiate(request.headers.get("accept-encoding"))
+    # no-cache (the default): clients may store the body but revalidate it, which costs a 304 when nothing changed.
+    headers = {"ETag": encoded.etag_for(encoding), "Vary": "Accept-Encoding", "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), encoded.etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=encoded.media_type, headers=headers)
+
+
+def _data_version() -> str:
+    """Identifies the cafe and building data a response was computed from."""
+    return f"{_cafe_catalog().generation}:{BUILDING_INDEX.index_id}:{SUN_ATLAS is not None}"
+
+
+def _atlas_covers_catalog(catalog: CafeCatalog) -> bool:
+    """Whether ``SUN_ATLAS`` has a row for every cafe of ``catalog``; looked up once per generation."""
+    if SUN_ATLAS is None:
+        return False
+    key = (catalog.generation, id(SUN_ATLAS))
+    covered = _ATLAS_COVERS_CATALOG.get(key)
+    if covered is None:
+        covered = SUN_ATLAS.rows_for(catalog.features) is not None
+        _ATLAS_COVERS_CATALOG[key] = covered
+    return covered
+
+
+def _atlas_rows(cafes: list[dict], times: list[datetime]) -> np.ndarray | None:
+    """Sun atlas rows for ``cafes``, or None when the atlas cannot answer for all of them at ``times``."""
+    if SUN_ATLAS is None or not SUN_ATLAS.covers(times):
+        return None
+    return SUN_ATLAS.rows_for(cafes)
 
 
 # ---------- Endpoints ----------
@@ -163,48 +283,393 @@ def _parse_iso_datetime(value: str | None) -> datetime:
     return parsed.astimezone(timezone.utc)
 
 
-def _cafes_in_bbox(
-    cafes: list[dict],
-    min_lon: float,
-    min_lat: float,
-    max_lon: float,
-    max_lat: float,
-) -> list[dict]:
-    bounded = []
-    for cafe in cafes:
-        coords = cafe.get("geometry", {}).get("coordinates", [None, None])
-        lon, lat = coords
-        if lon is None or lat is None:
-            continue
-        if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat:
-            bounded.append(cafe)
-    return bounded
+def _parallel_scorer() -> ParallelScorer:
+    """Start the worker pool on first use, not at import (workers re-import this module's deps)."""
+    global _SCORER
+    with _SCORER_LOCK:
+        if _SCORER is None:
+            _SCORER = ParallelScorer(
+                SCORING_WORKERS,
+                geojson_path=DATA_DIR / "buildings.geojson",
+                artifact_dir=DATA_DIR / "buildings_artifact",
+                cafes=CAFE_CATALOG.features,
+            )
+        return _SCORER
+
+
+def _close_parallel_scorer() -> None:
+    """Shut the worker pool down; the next large request starts a fresh one."""
+    global _SCORER
+    with _SCORER_LOCK:
+        scorer, _SCORER = _SCORER, None
+    if scorer is not None:
+        scorer.close()
 
 
 @app.get("/api/sunny")
-def sunny_cafes(
+async def sunny_cafes(
     time: str = Query(None, description="ISO 8601 datetime, e.g. 2025-06-15T14:00:00Z"),
     min_lon: float | None = Query(None),
     min_lat: float | None = Query(None),
     max_lon: float | None = Query(None),
     max_lat: float | None = Query(None),
     limit: int = Query(200, ge=1, le=2000),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+):
+    """
+    Return cafés ranked by sun score.
+
+    ``format=ndjson`` streams a header line (time, cloud cover, count) and then
+    one cafe per line, bypassing the response cache.
+    """
+    dt = _sunny_slot(_parse_iso_datetime(time))
+    bbox = _request_bbox(min_lon, min_lat, max_lon, max_lat)
+    if response_format == "ndjson":
+        payload = await ENGINE.run("sunny", _sunny_payload, dt, bbox, limit)
+        rows = payload.pop("cafes")
+        return StreamingResponse(ndjson_chunks(payload, rows), media_type=NDJSON_MEDIA_TYPE)
+    key = _sunny_cache_key(dt, bbox, limit)
+    body = SUNNY_CACHE.get(key)
+    cache_status = "HIT"
+    if body is None:
+        cache_status = "MISS"
+        body = await SUNNY_FLIGHTS.run(key, lambda: ENGINE.run("sunny", _sunny_response, key, dt, bbox, limit))
+    return Response(content=body, media_type="application/json", headers={"X-Cache": cache_status})
+
+
+class SunnyQuery(BaseModel):
+    time: str | None = None
+    min_lon: float | None = None
+    min_lat: float | None = None
+    max_lon: float | None = None
+    max_lat: float | None = None
+    limit: int = Field(default=200, ge=1, le=2000)
+
+
+class SunnyBatchRequest(BaseModel):
+    queries: list[SunnyQuery] = Field(min_length=1, max_length=SUNNY_BATCH_MAX_QUERIES)
+
+
+@app.post("/api/sunny/batch")
+async def sunny_batch(body: SunnyBatchRequest):
+    """
+    Answer many ``/api/sunny`` queries in one round trip, in query order.
+
+    Cached answers are reused as-is; the rest share one engine pass over the
+    union of their cafes and time slots, and are cached for single requests too.
+    """
+    queries = []
+    for query in body.queries:
+        dt = _sunny_slot(_parse_iso_datetime(query.time))
+        bbox = _request_bbox(query.min_lon, query.min_lat, query.max_lon, query.max_lat)
+        queries.append((_sunny_cache_key(dt, bbox, query.limit), dt, bbox, query.limit))
+
+    bodies = {key: SUNNY_CACHE.get(key) for key, *_ in queries}
+    missing = list({key: query for key, *query in queries if bodies[key] is None}.items())
+    if missing:
+        bodies.update(await ENGINE.run("sunny", _sunny_batch_responses, missing))
+    results = b",".join(bodies[key] for key, *_ in queries)
+    return Response(content=b'{"count":%d,"results":[%s]}' % (len(queries), results), media_type="application/json")
+
+
+@app.get("/api/sunny/nearest")
+async def sunny_nearest(
+    lon: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    k: int = Query(5, ge=1, le=50),
+    time: str = Query(None, description="ISO 8601 datetime; floored to its time slot"),
+    max_radius_m: float = Query(3000.0, gt=0, le=20000),
+    min_sunny_fraction: float = Query(0.0, ge=0.0, le=1.0),
+):
+    """The ``k`` closest cafés with seats in direct sun, nearest first, each with ``distance_m``."""
+    dt = _sunny_slot(_parse_iso_datetime(time))
+    return await ENGINE.run("sunny", _sunny_nearest_payload, lon, lat, k, dt, max_radius_m, min_sunny_fraction)
+
+
+def _sunny_nearest_payload(
+    lon: float,
+    lat: float,
+    k: int,
+    dt: datetime,
+    max_radius_m: float,
+    min_sunny_fraction: float,
+) -> dict:
+    try:
+        cloud_cover = get_cloud_cover(dt)
+    except Exception:
+        cloud_cover = 50.0
+
+    catalog = _cafe_catalog()
+    score_batch = None
+    # One shade model per request: the atlas only when it answers for every cafe
+    # in the catalog (so for any batch the search reaches), else polygons for all.
+    if _atlas_covers_catalog(catalog) and SUN_ATLAS.covers([dt]):
+
+        def score_batch(batch: list[dict]):
+            return SUN_ATLAS.timeseries(batch, SUN_ATLAS.rows_for(batch), [dt], {dt: cloud_cover})
+
+    results = nearest_sunny_cafes(
+        catalog.index.iter_nearest(lon, lat, max_radius_m),
+        BUILDING_INDEX,
+        dt,
+        cloud_cover,
+        k,
+        min_sunny_fraction=min_sunny_fraction,
+        shade_mode="polygon",
+        shared_shadow_cache=SHADOW_CACHE,
+        score_batch=score_batch,
+    )
+    return {"lon": lon, "lat": lat, **_sunny_result(dt, cloud_cover, results)}
+
+
+@app.get("/api/sunny/tiles/{z}/{x}/{y}")
+async def sunny_tile(
+    request: Request,
+    z: int = Path(ge=TILE_MIN_ZOOM, le=TILE_MAX_ZOOM),
+    x: int = Path(ge=0),
+    y: int = Path(ge=0),
+    time: str = Query(None, description="ISO 8601 datetime; floored to its time slot"),
 ):
-    """Return cafés ranked by sun score."""
-    dt = _parse_iso_datetime(time)
+    """Every cafe inside slippy-map tile ``z/x/y``, ranked by sun score for the time slot."""
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    slot = _sunny_slot(_parse_iso_datetime(time))
+    key = cache_key_from_parts("tile", str(z), str(x), str(y), slot.isoformat(), _data_version())
+    encoded = TILE_CACHE.get(key)
+    if encoded is None:
+        encoded = await SUNNY_FLIGHTS.run(key, lambda: ENGINE.run("sunny", _encoded_sunny_tile, key, z, x, y, slot))
+    return _encoded_response(request, encoded, cache_control=f"public, max-age={TILE_MAX_AGE_S}")
+
+
+def _encoded_sunny_tile(key: str, z: int, x: int, y: int, slot: datetime) -> EncodedPayload:
+    encoded = encode_payload(sunny_tile_payloads(z, [(x, y)], [slot])[(x, y, slot)], key)
+    TILE_CACHE.put(key, encoded)
+    return encoded
+
+
+def sunny_tile_payloads(
+    z: int,
+    tiles: list[tuple[int, int]],
+    slots: list[datetime],
+) -> dict[tuple[int, int, datetime], dict]:
+    """
+    Tile payloads for every (x, y, slot) at zoom ``z``, from one engine pass.
+
+    Shared by the tile endpoint and ``scripts/precompute_tiles.py``.
+    """
+    catalog = _cafe_catalog().index
+    rows_by_tile = [_tile_rows(catalog, z, x, y) for x, y in tiles]
+    scored = _score_catalog_rows(catalog, rows_by_tile, slots)
+    return {
+        (x, y, dt): {
+            "tile": f"{z}/{x}/{y}",
+            **_sunny_result(dt, scored.cloud_by_time[dt], scored.ranked(rows, dt)),
+        }
+        for (x, y), rows in zip(tiles, rows_by_tile)
+        for dt in slots
+    }
+
+
+def _tile_rows(catalog: CafeIndex, z: int, x: int, y: int) -> np.ndarray:
+    """Catalog rows inside the tile, half-open like ``tile_xy`` so neighbours never share a cafe."""
+    rows = catalog.bbox_rows(*tile_bounds(z, x, y))
+    xs, ys = tile_xy(catalog.lons[rows], catalog.lats[rows], z)
+    return rows[(xs == x) & (ys == y)]
+
+
+def _sunny_cache_key(dt: datetime, bbox: tuple[float, float, float, float] | None, limit: int) -> str:
+    return cache_key_from_parts(dt.isoformat(), repr(bbox), str(limit), _data_version())
+
+
+def _sunny_slot(dt: datetime) -> datetime:
+    """Floor to the start of its ``SUNNY_SLOT_MINUTES`` slot."""
+    slot_s = SUNNY_SLOT_MINUTES * 60
+    return datetime.fromtimestamp(int(dt.timestamp()) // slot_s * slot_s, tz=timezone.utc)
+
+
+def _request_bbox(
+    min_lon: float | None,
+    min_lat: float | None,
+    max_lon: float | None,
+    max_lat: float | None,
+) -> tuple[float, float, float, float] | None:
+    """The bbox a query asks for; None (every cafe) when any edge is missing."""
+    if None in (min_lon, min_lat, max_lon, max_lat):
+        return None
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _snap_bbox(bbox: tuple[float, float, float, float] | None) -> tuple[float, float, float, float] | None:
+    """Grow ``bbox`` outward to the snap grid."""
+    if bbox is None:
+        return None
+    min_lon, min_lat, max_lon, max_lat = bbox
+    step = SUNNY_BBOX_SNAP_DEG
+    # Round before flooring so float noise (12.5 / 0.001 = 12499.999...) stays on its grid line.
+    return (
+        round(math.floor(round(min_lon / step, 6)) * step, 6),
+        round(math.floor(round(min_lat / step, 6)) * step, 6),
+        round(math.ceil(round(max_lon / step, 6)) * step, 6),
+        round(math.ceil(round(max_lat / step, 6)) * step, 6),
+    )
+
+
+def _sunny_response(key: str, dt: datetime, bbox: tuple[float, float, float, float] | None, limit: int) -> bytes:
+    body = _sunny_cell(dt, _snap_bbox(bbox)).body(dt, bbox, limit)
+    SUNNY_CACHE.put(key, body)
+    return body
+
 
-    if None not in (min_lon, min_lat, max_lon, max_lat):
-        cafes = _cafes_in_bbox(CAFES, min_lon, min_lat, max_lon, max_lat)
+@dataclass(frozen=True, slots=True)
+class _RankedCell:
+    """Ranked ``/api/sunny`` rows for one snapped bbox and slot, each row already encoded."""
+
+    cloud_cover: float
+    lons: np.ndarray
+    lats: np.ndarray
+    rows: list[bytes]
+
+    @classmethod
+    def from_rows(cls, cloud_cover: float, rows: list[dict]) -> "_RankedCell":
+        return cls(
+            cloud_cover=cloud_cover,
+            lons=np.array([row["lon"] for row in rows], dtype=np.float64),
+            lats=np.array([row["lat"] for row in rows], dtype=np.float64),
+            rows=[json_bytes(row) for row in rows],
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self.lons.nbytes + self.lats.nbytes + sum(len(row) for row in self.rows)
+
+    def body(self, dt: datetime, bbox: tuple[float, float, float, float] | None, limit: int) -> bytes:
+        """``json_bytes(_sunny_result(...))`` for the cafes inside ``bbox`` (inclusive), top ``limit`` first."""
+        if bbox is None:
+            rows = self.rows[:limit]
+        else:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            inside = (self.lons >= min_lon) & (self.lons <= max_lon) & (self.lats >= min_lat) & (self.lats <= max_lat)
+            rows = [self.rows[i] for i in np.flatnonzero(inside)[:limit].tolist()]
+        head = json_bytes({"time": dt.isoformat(), "cloud_cover_pct": self.cloud_cover, "count": len(rows)})
+        return head[:-1] + b',"cafes":[' + b",".join(rows) + b"]}"
+
+
+def _sunny_cell(dt: datetime, cell: tuple[float, float, float, float] | None) -> _RankedCell:
+    """Every cafe in the snapped ``cell`` ranked for ``dt``, shared through ``SUNNY_CELLS``."""
+    key = cache_key_from_parts(dt.isoformat(), repr(cell), _data_version())
+    ranked = SUNNY_CELLS.get(key)
+    if ranked is None:
+        payload = _sunny_payload(dt, cell, None)
+        ranked = _RankedCell.from_rows(payload["cloud_cover_pct"], payload["cafes"])
+        SUNNY_CELLS.put(key, ranked)
+    return ranked
+
+
+def _sunny_payload(dt: datetime, bbox: tuple[float, float, float, float] | None, limit: int | None) -> dict:
+    catalog = _cafe_catalog().index
+    if bbox is not None:
+        cafes = catalog.in_bbox(*bbox)
     else:
-        cafes = CAFES
+        cafes = catalog.features
 
     try:
         cloud_cover = get_cloud_cover(dt)
     except Exception:
         cloud_cover = 50.0
 
-    results = compute_sunny_cafes(cafes, BUILDING_INDEX, dt, cloud_cover, limit=limit)
+    atlas_rows = _atlas_rows(cafes, [dt])
+    if atlas_rows is not None:
+        results = SUN_ATLAS.timeseries(cafes, atlas_rows, [dt], {dt: cloud_cover}).rows(0, limit)
+    elif SCORING_WORKERS > 0 and len(cafes) >= PARALLEL_MIN_CAFES:
+        results = _parallel_scorer().compute_sunny_cafes(
+            cafes,
+            dt,
+            cloud_cover,
+            limit=limit,
+            candidate_mode="static",
+            shared_shadow_cache=SHADOW_CACHE,
+        )
+    else:
+        results = compute_sunny_cafes(
+            cafes,
+            BUILDING_INDEX,
+            dt,
+            cloud_cover,
+            limit=limit,
+            candidate_mode="static",
+            shared_shadow_cache=SHADOW_CACHE,
+        )
+
+    return _sunny_result(dt, cloud_cover, results)
+
+
+def _sunny_batch_responses(
+    queries: list[tuple[str, tuple[datetime, tuple[float, float, float, float] | None, int]]],
+) -> dict[str, bytes]:
+    """Serialized answers for distinct (key, (slot, bbox, limit)) queries from one timeseries run."""
+    catalog = _cafe_catalog().index
+    rows_by_query = [
+        np.arange(len(catalog), dtype=np.intp) if bbox is None else catalog.bbox_rows(*bbox)
+        for _, (_, bbox, _) in queries
+    ]
+    times = sorted({dt for _, (dt, _, _) in queries})
+    scored = _score_catalog_rows(catalog, rows_by_query, times)
+
+    bodies = {}
+    for (key, (dt, _, limit)), rows in zip(queries, rows_by_query):
+        body = json_bytes(_sunny_result(dt, scored.cloud_by_time[dt], scored.ranked(rows, dt, limit)))
+        SUNNY_CACHE.put(key, body)
+        bodies[key] = body
+    return bodies
+
+
+class _ScoredRows:
+    """One timeseries over the union of several groups of catalog rows; ``ranked`` slices a group back out."""
+
+    __slots__ = ("union", "times", "cloud_by_time", "series")
+
+    def __init__(self, union: np.ndarray, times: list[datetime], cloud_by_time: dict[datetime, float], series):
+        self.union = union
+        self.times = times
+        self.cloud_by_time = cloud_by_time
+        self.series = series
+
+    def ranked(self, rows: np.ndarray, dt: datetime, limit: int | None = None) -> list[dict]:
+        if self.series is None:
+            return []
+        return self.series.subset(np.searchsorted(self.union, rows)).rows(self.times.index(dt), limit)
+
+
+def _score_catalog_rows(catalog: CafeIndex, row_groups: list[np.ndarray], times: list[datetime]) -> _ScoredRows:
+    union = np.unique(np.concatenate(row_groups)) if row_groups else np.empty(0, dtype=np.intp)
+    cafes = [catalog.features[row] for row in union.tolist()]
 
+    cloud_by_time = {}
+    for dt in times:
+        try:
+            cloud_by_time[dt] = get_cloud_cover(dt)
+        except Exception:
+            cloud_by_time[dt] = 50.0
+
+    atlas_rows = _atlas_rows(cafes, times)
+    if atlas_rows is not None:
+        series = SUN_ATLAS.timeseries(cafes, atlas_rows, times, cloud_by_time)
+    elif cafes:
+        # Polygon shading with the shared cache scores exactly like the single-query path.
+        series = compute_sunny_timeseries(
+            cafes,
+            BUILDING_INDEX,
+            times,
+            cloud_by_time,
+            shade_mode="polygon",
+            shared_shadow_cache=SHADOW_CACHE,
+        )
+    else:
+        series = None
+    return _ScoredRows(union, times, cloud_by_time, series)
+
+
+def _sunny_result(dt: datetime, cloud_cover: float, results: list[dict]) -> dict:
     return {
         "time": dt.isoformat(),
         "cloud_cover_pct": cloud_cover,
@@ -214,9 +679,16 @@ def sunny_cafes(
 
 
 @app.get("/api/cafes")
-def list_cafes():
-    """Return all cafés (no sun computation)."""
-    return {"cafes": CAFES}
+async def list_cafes(
+    request: Request,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+):
+    """Return all cafés (no sun computation); ``format=ndjson`` streams a count line, then one feature per line."""
+    catalog = _cafe_catalog()
+    if response_format == "ndjson":
+        features = catalog.features
+        return StreamingResponse(ndjson_chunks({"count": len(features)}, features), media_type=NDJSON_MEDIA_TYPE)
+    return _encoded_response(request, catalog.response)
 
 
 class RecommendationPrefs(BaseModel):
@@ -232,8 +704,13 @@ class FavoriteRecommendationRequest(BaseModel):
 
 
 @app.get("/api/cities")
-def list_cities():
-    return {
+async def list_cities(request: Request):
+    return _encoded_response(request, CITIES_RESPONSE)
+
+
+# City configs are static for the life of the process.
+CITIES_RESPONSE = encode_payload(
+    {
         "cities": [
             {
                 "city_id": city.city_id,
@@ -243,33 +720,98 @@ def list_cities():
             }
             for city in CITY_CONFIGS.values()
         ]
+    },
+    "cities",
+)
+
+
+@app.get("/api/metrics")
+async def engine_metrics():
+    """Return in-process cache counters for tuning."""
+    return {
+        "shadow_cache": SHADOW_CACHE.stats(),
+        "building_index": BUILDING_INDEX.memory_report(),
+        "parallel_scoring": {"workers": SCORING_WORKERS, "min_cafes": PARALLEL_MIN_CAFES},
+        "execution": ENGINE.stats(),
+        "single_flight": {
+            flights.name: flights.stats()
+            for flights in (SUNNY_FLIGHTS, OUTLOOK_FLIGHTS, FAVORITES_FLIGHTS, WEATHER_FLIGHTS)
+        },
+        "sunny_cache": SUNNY_CACHE.stats(),
+        "sunny_cells": SUNNY_CELLS.stats(),
+        "outlook_responses": OUTLOOK_RESPONSES.stats(),
+        "tile_cache": TILE_CACHE.stats(),
+        "seat_intervals": {"entries": len(SEAT_INTERVALS), "max_entries": SEAT_INTERVALS_MAX_ENTRIES},
+        "horizons": {"entries": len(HORIZONS_BY_CAFE), "max_entries": HORIZONS_MAX_ENTRIES},
+        "sun_atlas": (
+            {"cafes": len(SUN_ATLAS), "year": SUN_ATLAS.year, "bytes": SUN_ATLAS.nbytes}
+            if SUN_ATLAS is not None
+            else None
+        ),
     }
 
 
 @app.get("/api/cafe/{cafe_id}/sun-outlook")
-def cafe_sun_outlook(
+async def cafe_sun_outlook(
+    request: Request,
     cafe_id: str,
     city_id: str = Query("copenhagen"),
     days: int = Query(5, ge=1, le=5),
     include: str = Query("hourly,windows"),
     min_duration_min: int = Query(30, ge=0, le=24 * 60),
 ):
-    include_parts = _parse_include(include)
-    city = get_city_config(city_id)
+    cache_key = _outlook_cache_key(cafe_id, city_id, days, include, min_duration_min)
+    # The outlook starts at the current hour, so a new hour is a new response.
+    slot = _outlook_range(days)[0]
+    response_key = cache_key_from_parts(cache_key, slot.isoformat(), _data_version())
+    encoded = OUTLOOK_RESPONSES.get(response_key)
+    if encoded is None:
+        encoded = await OUTLOOK_FLIGHTS.run(
+            response_key,
+            lambda: ENGINE.run(
+                "outlook", _encoded_outlook, response_key, cafe_id, city_id, days, include, min_duration_min
+            ),
+        )
+    return _encoded_response(request, encoded)
+
 
-    cache_key = cache_key_from_parts(
-        city.city_id,
+def _encoded_outlook(
+    response_key: str,
+    cafe_id: str,
+    city_id: str,
+    days: int,
+    include: str,
+    min_duration_min: int,
+) -> EncodedPayload:
+    payload = _cafe_sun_outlook(cafe_id, city_id, days, include, min_duration_min)
+    encoded = encode_payload(payload, response_key)
+    # Failures are retried on the next request rather than served from memory.
+    if "error" not in payload:
+        OUTLOOK_RESPONSES.put(response_key, encoded)
+    return encoded
+
+
+def _outlook_cache_key(cafe_id: str, city_id: str, days: int, include: str, min_duration_min: int) -> str:
+    return cache_key_from_parts(
+        get_city_config(city_id).city_id,
         cafe_id,
         str(days),
-        ",".join(sorted(include_parts)),
+        ",".join(sorted(_parse_include(include))),
         str(min_duration_min),
     )
 
+
+def _cafe_sun_outlook(cafe_id: str, city_id: str, days: int, include: str, min_duration_min: int) -> dict:
+    include_parts = _parse_include(include)
+    city = get_city_config(city_id)
+
+    cache_key = _outlook_cache_key(cafe_id, city_id, days, include, min_duration_min)
+
     cached = read_cache(OUTLOOK_CACHE_ROOT, cache_key)
     if cached and cached.get("age_hours", 999) <= FRESH_TTL_HOURS:
         return _with_cache_status(cached.get("payload", {}), cached.get("age_hours"))
 
-    cafe_feature = _find_cafe_feature(cafe_id)
+    cafe_feature = _cafe_catalog().index.find(cafe_id)
     if cafe_feature is None:
         return {
             "cafe_id": cafe_id,
@@ -320,19 +862,30 @@ def cafe_sun_outlook(
 
 
 @app.post("/api/recommendations/favorites")
-def favorites_recommendations(body: FavoriteRecommendationRequest):
+async def favorites_recommendations(body: FavoriteRecommendationRequest):
+    return await FAVORITES_FLIGHTS.run(
+        _favorites_cache_key(body),
+        lambda: ENGINE.run("favorites", _favorites_recommendations, body),
+    )
+
+
+def _favorites_cache_key(body: FavoriteRecommendationRequest) -> str:
+    return cache_key_from_parts(
+        get_city_config(body.city_id).city_id,
+        ",".join(sorted(dict.fromkeys(body.favorite_ids))),
+        str(max(1, min(5, body.days))),
+        str(body.prefs.min_duration_min),
+        ",".join(sorted(body.prefs.preferred_periods)),
+    )
+
+
+def _favorites_recommendations(body: FavoriteRecommendationRequest) -> dict:
     city = get_city_config(body.city_id)
     days = max(1, min(5, body.days))
     favorite_ids = list(dict.fromkeys(body.favorite_ids))
     prefs = body.prefs
 
-    cache_key = cache_key_from_parts(
-        city.city_id,
-        ",".join(sorted(favorite_ids)),
-        str(days),
-        str(prefs.min_duration_min),
-        ",".join(sorted(prefs.preferred_periods)),
-    )
+    cache_key = _favorites_cache_key(body)
     cached = read_cache(RECOMMENDATIONS_CACHE_ROOT, cache_key)
     if cached and cached.get("age_hours", 999) <= FRESH_TTL_HOURS:
         return _with_cache_status(cached.get("payload", {}), cached.get("age_hours"))
@@ -341,24 +894,19 @@ def favorites_recommendations(body: FavoriteRecommendationRequest):
         start_utc, end_utc = _outlook_range(days)
         weather = get_cloud_cover_series(city.city_id, start_utc, end_utc)
 
+        catalog = _cafe_catalog().index
+        features = [
+            feature
+            for feature in (catalog.find(favorite_id) for favorite_id in favorite_ids)
+            if feature is not None
+        ]
+        all_intervals = _seat_intervals_for_cafes(features, start_utc, end_utc + timedelta(hours=1))
         windows_by_cafe: dict[str, dict] = {}
-        for favorite_id in favorite_ids:
-            feature = _find_cafe_feature(favorite_id)
-            if feature is None:
-                continue
-            cafe_key = _feature_id(feature)
-            cafe_name = feature.get("properties", {}).get("name") or "Cafe"
-            hourly = _build_hourly_for_cafe(
-                cafe_feature=feature,
-                city_id=city.city_id,
-                start_utc=start_utc,
-                end_utc=end_utc,
-                weather_cloud_by_hour=weather.cloud_by_hour,
-            )
-            windows = merge_windows(hourly, min_duration_min=prefs.min_duration_min)
-            windows_by_cafe[cafe_key] = {
-                "cafe_name": cafe_name,
-                "windows": windows,
+        for feature, intervals in zip(features, all_intervals):
+            segments = _build_segments(intervals, city.city_id, weather.cloud_by_hour)
+            windows_by_cafe[feature_id(feature)] = {
+                "cafe_name": feature.get("properties", {}).get("name") or "Cafe",
+                "windows": merge_windows(segments, min_duration_min=prefs.min_duration_min),
             }
 
         items = rank_recommendations(
@@ -411,14 +959,11 @@ def _compute_cafe_outlook_payload(
     city = get_city_config(city_id)
     start_utc, end_utc = _outlook_range(days)
     weather = get_cloud_cover_series(city.city_id, start_utc, end_utc)
-    hourly = _build_hourly_for_cafe(
-        cafe_feature=cafe_feature,
-        city_id=city.city_id,
-        start_utc=start_utc,
-        end_utc=end_utc,
-        weather_cloud_by_hour=weather.cloud_by_hour,
-    )
-    windows = merge_windows(hourly, min_duration_min=min_duration_min)
+    # Hourly rows and windows read the same seat intervals, so they cannot disagree.
+    intervals = _seat_intervals_for_cafes([cafe_feature], start_utc, end_utc + timedelta(hours=1))[0]
+    hourly = _build_hourly(intervals, city.city_id, start_utc, end_utc, weather.cloud_by_hour)
+    segments = _build_segments(intervals, city.city_id, weather.cloud_by_hour)
+    windows = merge_windows(segments, min_duration_min=min_duration_min)
 
     return {
         "cafe_id": cafe_id,
@@ -434,44 +979,132 @@ def _compute_cafe_outlook_payload(
     }
 
 
-def _build_hourly_for_cafe(
-    cafe_feature: dict,
+def _build_hourly(
+    intervals: SeatSunIntervals,
     city_id: str,
     start_utc: datetime,
     end_utc: datetime,
     weather_cloud_by_hour: dict[datetime, float],
 ) -> list[dict]:
+    """Hourly outlook rows: the seat-interval sunny fraction at each hour start from ``start_utc`` to ``end_utc``."""
     city = get_city_config(city_id)
+    hours: list[datetime] = []
     dt = start_utc
-    rows: list[dict] = []
-    now_utc = datetime.now(timezone.utc)
     while dt <= end_utc:
+        hours.append(dt)
+        dt = dt + timedelta(hours=1)
+    fractions = intervals.fractions_at(hours)
+    _, sun_elevations = get_sun_positions(SUN_REF_LAT, SUN_REF_LON, hours)
+
+    now_utc = datetime.now(timezone.utc)
+    hourly: list[dict] = []
+    for dt, fraction, sun_elevation in zip(hours, fractions.tolist(), sun_elevations.tolist()):
         cloud_cover = float(weather_cloud_by_hour.get(dt, 50.0))
-        ranking = compute_sunny_cafes([cafe_feature], BUILDING_INDEX, dt, cloud_cover, limit=1)
-        row = ranking[0] if ranking else _fallback_row(cafe_feature, cloud_cover)
-        condition = classify_condition(row, cloud_cover)
-        rows.append(
+        row = {
+            "sunny_score": round(100.0 * fraction * _cloud_factor(cloud_cover), 1),
+            "sun_elevation_deg": float(sun_elevation),
+        }
+        hourly.append(
             {
                 "time_utc": dt.isoformat(),
                 "time_local": dt.astimezone(city.tz).isoformat(),
                 "timezone": city.timezone,
-                "condition": condition,
-                "score": round(float(row.get("sunny_score", 0.0)), 1),
+                "condition": classify_condition(row, cloud_cover),
+                "score": row["sunny_score"],
                 "confidence_hint": confidence_hint(max(0.0, (dt - now_utc).total_seconds() / 3600.0)),
                 "cloud_cover_pct": round(cloud_cover, 1),
             }
         )
-        dt = dt + timedelta(hours=1)
+    return hourly
+
+
+def _build_segments(
+    intervals: SeatSunIntervals,
+    city_id: str,
+    weather_cloud_by_hour: dict[datetime, float],
+) -> list[dict]:
+    """Minute-level condition rows (each with its own ``end_utc``) for precise sun windows."""
+    city = get_city_config(city_id)
+
+    # Cloud cover is hourly, so cut every constant-sun piece at hour boundaries too.
+    pieces: list[tuple[datetime, datetime, float]] = []
+    for piece_start, piece_end, fraction in intervals.fraction_segments():
+        cursor = piece_start
+        while cursor < piece_end:
+            next_hour = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            pieces.append((cursor, min(piece_end, next_hour), fraction))
+            cursor = min(piece_end, next_hour)
+    if not pieces:
+        return []
+    _, sun_elevations = get_sun_positions(SUN_REF_LAT, SUN_REF_LON, [piece[0] for piece in pieces])
+
+    rows: list[dict] = []
+    for (piece_start, piece_end, fraction), sun_elevation in zip(pieces, sun_elevations):
+        hour = piece_start.replace(minute=0, second=0, microsecond=0)
+        cloud_cover = float(weather_cloud_by_hour.get(hour, 50.0))
+        row = {
+            "sunny_score": round(100.0 * fraction * _cloud_factor(cloud_cover), 1),
+            "sun_elevation_deg": float(sun_elevation),
+        }
+        rows.append(
+            {
+                "time_utc": piece_start.isoformat(),
+                "end_utc": piece_end.isoformat(),
+                "time_local": piece_start.astimezone(city.tz).isoformat(),
+                "timezone": city.timezone,
+                "condition": classify_condition(row, cloud_cover),
+            }
+        )
     return rows
 
 
-def _fallback_row(cafe_feature: dict, cloud_cover: float) -> dict:
-    props = cafe_feature.get("properties", {})
-    return {
-        "sunny_score": 0.0,
-        "sun_elevation_deg": float(props.get("sun_elevation_deg", 1.0)),
-        "cloud_cover_pct": cloud_cover,
-    }
+def _seat_intervals_for_cafes(
+    cafe_features: list[dict],
+    start_utc: datetime,
+    end_utc: datetime,
+) -> list[SeatSunIntervals]:
+    """Seat sun intervals per cafe; cache misses are computed together in one engine pass."""
+    found: dict[str, SeatSunIntervals] = {}
+    with _SEAT_INTERVALS_LOCK:
+        for feature in cafe_features:
+            key = (feature_id(feature), start_utc, end_utc)
+            intervals = SEAT_INTERVALS.get(key)
+            if intervals is not None:
+                SEAT_INTERVALS.move_to_end(key)
+                found[key[0]] = intervals
+    missing = list({feature_id(f): f for f in cafe_features if feature_id(f) not in found}.values())
+    if missing:
+        horizons = HorizonProfiles(
+            bin_deg=HORIZON_BIN_DEG,
+            horizons=np.concatenate([_horizons_for_cafe(feature).horizons for feature in missing]),
+        )
+        computed = compute_seat_sun_intervals_many(missing, BUILDING_INDEX, start_utc, end_utc, horizons=horizons)
+        with _SEAT_INTERVALS_LOCK:
+            for feature, intervals in zip(missing, computed):
+                found[feature_id(feature)] = intervals
+                SEAT_INTERVALS[(feature_id(feature), start_utc, end_utc)] = intervals
+            while len(SEAT_INTERVALS) > SEAT_INTERVALS_MAX_ENTRIES:
+                SEAT_INTERVALS.popitem(last=False)
+    return [found[feature_id(feature)] for feature in cafe_features]
+
+
+def _horizons_for_cafe(cafe_feature: dict) -> HorizonProfiles:
+    cafe_key = feature_id(cafe_feature)
+    with _HORIZONS_LOCK:
+        horizons = HORIZONS_BY_CAFE.get(cafe_key)
+        if horizons is not None:
+            HORIZONS_BY_CAFE.move_to_end(cafe_key)
+            return horizons
+    atlas_rows = SUN_ATLAS.rows_for([cafe_feature]) if SUN_ATLAS is not None else None
+    if atlas_rows is not None:
+        horizons = SUN_ATLAS.horizon_profiles(atlas_rows)
+    else:
+        horizons = build_horizon_profiles([cafe_feature], BUILDING_INDEX)
+    with _HORIZONS_LOCK:
+        HORIZONS_BY_CAFE[cafe_key] = horizons
+        while len(HORIZONS_BY_CAFE) > HORIZONS_MAX_ENTRIES:
+            HORIZONS_BY_CAFE.popitem(last=False)
+    return horizons
 
 
 def _parse_include(raw: str) -> set[str]:
@@ -487,36 +1120,6 @@ def _outlook_range(days: int) -> tuple[datetime, datetime]:
     return now, end
 
 
-def _find_cafe_feature(cafe_id: str) -> dict | None:
-    normalized = cafe_id.strip().lower()
-    for feature in CAFES:
-        if _feature_id(feature).lower() == normalized:
-            return feature
-    if normalized.startswith("osm-"):
-        normalized = normalized[4:]
-    try:
-        osm_id = int(normalized)
-    except Exception:
-        return None
-    for feature in CAFES:
-        props = feature.get("properties", {})
-        if props.get("osm_id") == osm_id:
-            return feature
-    return None
-
-
-def _feature_id(feature: dict) -> str:
-    props = feature.get("properties", {})
-    osm_id = props.get("osm_id")
-    if osm_id is not None:
-        return f"osm-{osm_id}"
-    name = (props.get("name") or "cafe").strip()
-    coords = feature.get("geometry", {}).get("coordinates", [0, 0])
-    lon = coords[0] if len(coords) > 0 else 0
-    lat = coords[1] if len(coords) > 1 else 0
-    return f"{name}-{lat}-{lon}"
-
-
 def _with_cache_status(payload: dict, age_hours: float | None) -> dict:
     out = dict(payload)
     status = cache_status_from_age(age_hours)
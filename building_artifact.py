@@ -0,0 +1,416 @@
+"""
+Prebuilt, memory-mappable building index for fast API startup.
+
+``python building_artifact.py`` parses ``data/buildings.geojson`` once (validity
+repair, UTM projection, height resolution) and writes a versioned directory of
+``.npy`` columns plus ``meta.json``. Rows are stored in Morton order of their
+centroids so the STRtree rebuilt at load time, and every column gather, walks
+memory in spatial order. When a cafe file is given, the per-seat candidate
+lists are stored too, tagged with a digest of the seat coordinates.
+
+``load_building_index`` memory-maps the artifact and falls back to parsing the
+GeoJSON when the artifact is missing, from an older format, or built from a
+different source file.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+import shapely
+from shapely import make_valid
+from shapely.geometry import shape
+from shapely.ops import transform
+
+from shadow_engine import (
+    TO_UTM,
+    BuildingIndex,
+    SeatCandidates,
+    _seat_row_lookup,
+    _seat_utm_coords,
+    build_building_index,
+    build_seat_candidates,
+)
+
+DATA_DIR = pathlib.Path("data")
+BUILDINGS_GEOJSON = DATA_DIR / "buildings.geojson"
+CAFES_GEOJSON = DATA_DIR / "cafes_copenhagen.geojson"
+ARTIFACT_DIR = DATA_DIR / "buildings_artifact"
+
+# Bump whenever the on-disk layout or the height/geometry preprocessing changes.
+ARTIFACT_FORMAT_VERSION = 2
+
+_SEAT_COLUMNS = ("offsets", "building_idx", "distances", "azimuth_lo", "azimuth_span")
+
+
+# ---------- GeoJSON source ----------
+
+def _as_float(value) -> float | None:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        cleaned = value.lower().replace("m", "").strip()
+        try:
+            return float(cleaned)
+        except ValueError:
+            return None
+    return None
+
+
+def _resolve_height_m(properties: dict) -> tuple[float, str]:
+    direct_height = _as_float(properties.get("height"))
+    if direct_height and direct_height > 0:
+        return direct_height, "height_tag"
+
+    # Datafordeler/BBR: number of floors for many buildings.
+    bbr_levels = _as_float(properties.get("byg054AntalEtager"))
+    if bbr_levels and bbr_levels > 0:
+        return bbr_levels * 3.0, "bbr_floors"
+
+    bbr_alt_levels = _as_float(properties.get("byg055AfvigendeEtager"))
+    if bbr_alt_levels and bbr_alt_levels > 0:
+        return bbr_alt_levels * 3.0, "bbr_alt_floors"
+
+    levels = _as_float(properties.get("building:levels"))
+    if levels and levels > 0:
+        return levels * 3.0, "building_levels"
+
+    building_type = (properties.get("building") or "yes").lower()
+    defaults = {
+        "house": 8.0,
+        "residential": 9.0,
+        "apartments": 12.0,
+        "commercial": 14.0,
+        "retail": 12.0,
+        "office": 15.0,
+        "industrial": 11.0,
+        "warehouse": 10.0,
+        "hospital": 18.0,
+        "hotel": 20.0,
+        "school": 12.0,
+        "church": 22.0,
+        "cathedral": 25.0,
+    }
+    return defaults.get(building_type, 9.0), f"imputed_{building_type}"
+
+
+def load_buildings_geojson(path: pathlib.Path = BUILDINGS_GEOJSON) -> list[dict]:
+    """Load buildings and convert to UTM Shapely polygons."""
+    with open(path) as f:
+        raw = json.load(f)
+
+    features = raw.get("features", [])
+    buildings = []
+    skipped_nonpolygon = 0
+    for feature in features:
+        geom_json = feature.get("geometry")
+        if not geom_json:
+            continue
+
+        geom = shape(geom_json)
+        if geom.is_empty:
+            continue
+        if not geom.is_valid:
+            geom = make_valid(geom)
+            if geom.is_empty:
+                continue
+        if geom.geom_type not in ("Polygon", "MultiPolygon"):
+            skipped_nonpolygon += 1
+            continue
+
+        geom_utm = transform(TO_UTM.transform, geom)
+        props = feature.get("properties", {})
+        height_m, height_source = _resolve_height_m(props)
+
+        buildings.append(
+            {
+                "osm_id": props.get("osm_id"),
+                "geom_utm": geom_utm,
+                "height_m": height_m,
+                "height_source": height_source,
+                "building_type": (
+                    props.get("building")
+                    or props.get("byg021BygningensAnvendelse")
+                    or "yes"
+                ),
+            }
+        )
+
+    print(
+        f"Building load diagnostics: total_features={len(features)}, "
+        f"usable_polygons={len(buildings)}, skipped_nonpolygon={skipped_nonpolygon}"
+    )
+    return buildings
+
+
+def _source_stamp(path: pathlib.Path) -> dict | None:
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return {"name": path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _file_sha256(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def buildings_fingerprint(building_index: BuildingIndex) -> str:
+    """
+    Row-order independent fingerprint of every footprint (WKB) and height.
+
+    Hashed once per index; artifacts record it at compile time, so an index
+    loaded from one never hashes its buildings.
+    """
+    if building_index.fingerprint is None:
+        building_index.fingerprint = hashlib.sha256(np.sort(_building_hashes(building_index)).tobytes()).hexdigest()
+    return building_index.fingerprint
+
+
+def _building_hashes(building_index: BuildingIndex) -> np.ndarray:
+    """Order-independent uint64 fingerprint per building (footprint WKB + height)."""
+    wkb = shapely.to_wkb(building_index.geometries, output_dimension=2)
+    hashes = np.empty(len(wkb), dtype=np.uint64)
+    for idx, (blob, height) in enumerate(zip(wkb, building_index.heights.tolist())):
+        digest = hashlib.blake2b(blob + np.float32(height).tobytes(), digest_size=8).digest()
+        hashes[idx] = int.from_bytes(digest, "little")
+    return hashes
+
+
+def _seat_digest(cafes: list[dict]) -> str:
+    xs, ys, _ = _seat_utm_coords(cafes)
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(xs, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(ys, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+# ---------- Compile ----------
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    v = values.astype(np.uint64)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def _morton_order(points: np.ndarray) -> np.ndarray:
+    """Row order along a Z-curve through ``points`` (n, 2)."""
+    if len(points) == 0:
+        return np.empty(0, dtype=np.intp)
+    lo = points.min(axis=0)
+    span = np.ptp(points, axis=0)
+    span[span == 0] = 1.0
+    cells = np.floor((points - lo) / span * 65535.0).astype(np.uint64)
+    keys = _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1))
+    return np.argsort(keys, kind="stable")
+
+
+def compile_artifact(
+    geojson_path: pathlib.Path = BUILDINGS_GEOJSON,
+    artifact_dir: pathlib.Path = ARTIFACT_DIR,
+    cafes: list[dict] | None = None,
+) -> dict:
+    """Write the building artifact for ``geojson_path``; returns its metadata."""
+    source = _source_stamp(geojson_path)
+    if source is None:
+        raise FileNotFoundError(geojson_path)
+    source["sha256"] = _file_sha256(geojson_path)
+
+    unordered = build_building_index(load_buildings_geojson(geojson_path))
+    order = _morton_order(unordered.centroids)
+    building_index = BuildingIndex(
+        geometries=unordered.geometries[order],
+        heights=unordered.heights[order],
+        osm_ids=unordered.osm_ids[order],
+        source_codes=unordered.source_codes[order],
+        source_names=unordered.source_names,
+        bounds=unordered.bounds[order],
+    )
+
+    geometry_type, coords, offsets = shapely.to_ragged_array(building_index.geometries)
+    columns = {
+        "coords": coords,
+        "heights": building_index.heights,
+        "osm_ids": building_index.osm_ids,
+        "source_codes": building_index.source_codes,
+        "bounds": building_index.bounds,
+    }
+    for level, offset in enumerate(offsets):
+        columns[f"offsets_{level}"] = offset
+
+    seat_digest = None
+    if cafes is not None:
+        seat_candidates = build_seat_candidates(cafes, building_index)
+        for name in _SEAT_COLUMNS:
+            columns[f"seat_{name}"] = getattr(seat_candidates, name)
+        seat_digest = _seat_digest(cafes)
+
+    meta = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "rows": len(building_index),
+        "geometry_type": int(geometry_type),
+        "offset_levels": len(offsets),
+        "source_names": list(building_index.source_names),
+        "buildings_fingerprint": buildings_fingerprint(building_index),
+        "source": source,
+        "seat_digest": seat_digest,
+        "columns": sorted(columns),
+    }
+
+    # Write next to the target and swap in, so a running reader never sees half a file set.
+    artifact_dir = pathlib.Path(artifact_dir)
+    staging = artifact_dir.with_name(artifact_dir.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    for name, values in columns.items():
+        np.save(staging / f"{name}.npy", np.ascontiguousarray(values), allow_pickle=False)
+    with open(staging / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    retired = artifact_dir.with_name(artifact_dir.name + ".old")
+    shutil.rmtree(retired, ignore_errors=True)
+    if artifact_dir.exists():
+        os.replace(artifact_dir, retired)
+    os.replace(staging, artifact_dir)
+    shutil.rmtree(retired, ignore_errors=True)
+    return meta
+
+
+# ---------- Load ----------
+
+def read_artifact_meta(artifact_dir: pathlib.Path = ARTIFACT_DIR) -> dict | None:
+    meta_path = pathlib.Path(artifact_dir) / "meta.json"
+    if not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def artifact_stale_reason(
+    meta: dict | None,
+    geojson_path: pathlib.Path = BUILDINGS_GEOJSON,
+) -> str | None:
+    """Why the artifact cannot be used, or None when it matches its source."""
+    if meta is None:
+        return "missing"
+    if meta.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        return f"format {meta.get('format_version')} != {ARTIFACT_FORMAT_VERSION}"
+    current = _source_stamp(geojson_path)
+    if current is None:
+        # Deployments may ship the artifact without the raw GeoJSON.
+        return None
+    recorded = meta.get("source") or {}
+    if current["size"] != recorded.get("size"):
+        return "source size changed"
+    if current["mtime_ns"] != recorded.get("mtime_ns") and _file_sha256(geojson_path) != recorded.get("sha256"):
+        return "source content changed"
+    return None
+
+
+def _load_column(artifact_dir: pathlib.Path, name: str) -> np.ndarray:
+    return np.load(artifact_dir / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+
+
+def load_artifact(
+    artifact_dir: pathlib.Path = ARTIFACT_DIR,
+    cafes: list[dict] | None = None,
+    meta: dict | None = None,
+) -> BuildingIndex:
+    """Memory-map a compiled artifact into a ``BuildingIndex``."""
+    artifact_dir = pathlib.Path(artifact_dir)
+    if meta is None:
+        meta = read_artifact_meta(artifact_dir)
+        if meta is None:
+            raise FileNotFoundError(artifact_dir / "meta.json")
+
+    offsets = tuple(_load_column(artifact_dir, f"offsets_{level}") for level in range(meta["offset_levels"]))
+    geometries = shapely.from_ragged_array(
+        shapely.GeometryType(meta["geometry_type"]),
+        _load_column(artifact_dir, "coords"),
+        offsets,
+    )
+    if meta["geometry_type"] == shapely.GeometryType.MULTIPOLYGON:
+        # Ragged arrays promote mixed input to MultiPolygon; unwrap single parts again.
+        single = shapely.get_num_geometries(geometries) == 1
+        geometries[single] = shapely.get_geometry(geometries[single], 0)
+
+    building_index = BuildingIndex(
+        geometries=geometries,
+        heights=_load_column(artifact_dir, "heights"),
+        osm_ids=_load_column(artifact_dir, "osm_ids"),
+        source_codes=_load_column(artifact_dir, "source_codes"),
+        source_names=meta["source_names"],
+        bounds=_load_column(artifact_dir, "bounds"),
+    )
+    building_index.fingerprint = meta.get("buildings_fingerprint")
+
+    if cafes is not None:
+        if meta.get("seat_digest") is not None and meta["seat_digest"] == _seat_digest(cafes):
+            _, _, owners = _seat_utm_coords(cafes)
+            building_index.seat_candidates = SeatCandidates(
+                **{name: _load_column(artifact_dir, f"seat_{name}") for name in _SEAT_COLUMNS},
+                seat_rows=_seat_row_lookup(cafes, owners),
+            )
+        else:
+            building_index.seat_candidates = build_seat_candidates(cafes, building_index)
+    return building_index
+
+
+def load_building_index(
+    geojson_path: pathlib.Path = BUILDINGS_GEOJSON,
+    artifact_dir: pathlib.Path = ARTIFACT_DIR,
+    cafes: list[dict] | None = None,
+) -> tuple[BuildingIndex, str]:
+    """
+    Return (index, origin): the compiled artifact when it is current, else the GeoJSON.
+
+    ``origin`` is ``"artifact"`` or ``"geojson (<reason>)"`` for startup logging.
+    """
+    meta = read_artifact_meta(artifact_dir)
+    reason = artifact_stale_reason(meta, geojson_path)
+    if reason is None:
+        return load_artifact(artifact_dir, cafes=cafes, meta=meta), "artifact"
+
+    print(f"Building artifact unusable ({reason}); parsing {geojson_path}. Run `python building_artifact.py` to rebuild.")
+    return build_building_index(load_buildings_geojson(geojson_path), cafes=cafes), f"geojson ({reason})"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile buildings.geojson into a memory-mappable index artifact.")
+    parser.add_argument("--geojson", type=pathlib.Path, default=BUILDINGS_GEOJSON)
+    parser.add_argument("--cafes", type=pathlib.Path, default=CAFES_GEOJSON, help="Also store per-seat candidate lists for these cafes.")
+    parser.add_argument("--no-seats", action="store_true", help="Skip per-seat candidate lists.")
+    parser.add_argument("--output", type=pathlib.Path, default=ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    cafes = None
+    if not args.no_seats and args.cafes.exists():
+        with open(args.cafes) as f:
+            cafes = json.load(f)["features"]
+
+    meta = compile_artifact(args.geojson, args.output, cafes=cafes)
+    size_mb = sum(p.stat().st_size for p in args.output.iterdir()) / (1024 * 1024)
+    print(
+        f"Wrote {args.output} (format v{meta['format_version']}, {meta['rows']} buildings, "
+        f"seats={'yes' if meta['seat_digest'] else 'no'}, {size_mb:.1f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
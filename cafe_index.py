@@ -0,0 +1,228 @@
+"""
+Startup-built cafe catalog: the feature list plus lookup tables over it.
+
+An index is immutable once built. A data reload builds a fresh one and swaps
+the module-level reference, so a request that grabbed the old index keeps a
+consistent view until it finishes.
+
+Spatial queries run on a uniform lon/lat grid over NumPy coordinate arrays:
+bbox queries touch only the occupied cells they overlap, and nearest-first
+walks expand ring by ring, so cost follows the result size, not the catalog.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from collections.abc import Iterator
+
+import numpy as np
+
+# ~550 m north-south, ~310 m east-west at Copenhagen's latitude.
+GRID_CELL_DEG = 0.005
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEG = EARTH_RADIUS_M * math.pi / 180.0
+
+
+def haversine_m(lon: float, lat: float, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Great-circle distances in metres from one point to many."""
+    lon_r, lat_r = math.radians(lon), math.radians(lat)
+    lons_r, lats_r = np.radians(lons), np.radians(lats)
+    a = np.sin((lats_r - lat_r) / 2.0) ** 2 + math.cos(lat_r) * np.cos(lats_r) * np.sin((lons_r - lon_r) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def feature_id(feature: dict) -> str:
+    """Public cafe id: ``osm-<id>`` when known, else name plus coordinates."""
+    props = feature.get("properties", {})
+    osm_id = props.get("osm_id")
+    if osm_id is not None:
+        return f"osm-{osm_id}"
+    name = (props.get("name") or "cafe").strip()
+    coords = feature.get("geometry", {}).get("coordinates", [0, 0])
+    lon = coords[0] if len(coords) > 0 else 0
+    lat = coords[1] if len(coords) > 1 else 0
+    return f"{name}-{lat}-{lon}"
+
+
+class CafeIndex:
+    """
+    Cafe features with constant-time lookup by normalized feature id and by osm_id,
+    plus a grid for bbox, radius and nearest-first queries.
+
+    Lookups follow the first feature in file order when ids collide, matching
+    the linear scans this replaces. Spatial results come back in file order
+    (bbox) or by distance (radius, nearest); cafes without coordinates are never
+    returned by them.
+    """
+
+    __slots__ = ("features", "lons", "lats", "cell_deg", "_by_id", "_by_osm_id", "_order", "_cells")
+
+    def __init__(self, features: list[dict], cell_deg: float = GRID_CELL_DEG):
+        self.features = features
+        self.cell_deg = float(cell_deg)
+        self.lons = np.full(len(features), np.nan, dtype=np.float64)
+        self.lats = np.full(len(features), np.nan, dtype=np.float64)
+        for row, feature in enumerate(features):
+            lon, lat = feature.get("geometry", {}).get("coordinates", [None, None])
+            if lon is not None and lat is not None:
+                self.lons[row], self.lats[row] = lon, lat
+        self._by_id: dict[str, dict] = {}
+        self._by_osm_id: dict[int | float, dict] = {}
+        for feature in features:
+            self._by_id.setdefault(feature_id(feature).lower(), feature)
+            osm_id = feature.get("properties", {}).get("osm_id")
+            # Numeric keys hash by value, so 123.0 from a float column still matches 123.
+            if isinstance(osm_id, (int, float)):
+                self._by_osm_id.setdefault(osm_id, feature)
+
+        # Rows grouped by grid cell (CSR-style): cell -> (start, end) into _order.
+        located = np.flatnonzero(~np.isnan(self.lons))
+        cx = np.floor(self.lons[located] / self.cell_deg).astype(np.int64)
+        cy = np.floor(self.lats[located] / self.cell_deg).astype(np.int64)
+        by_cell = np.lexsort((located, cy, cx))
+        self._order = located[by_cell]
+        cx, cy = cx[by_cell], cy[by_cell]
+        breaks = np.flatnonzero((np.diff(cx) != 0) | (np.diff(cy) != 0)) + 1
+        starts = np.concatenate([[0], breaks]).astype(np.int64) if len(located) else np.empty(0, dtype=np.int64)
+        ends = np.append(starts[1:], len(located))
+        self._cells: dict[tuple[int, int], tuple[int, int]] = {
+            (int(cx[start]), int(cy[start])): (int(start), int(end)) for start, end in zip(starts, ends)
+        }
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def find(self, cafe_id: str) -> dict | None:
+        """Feature for a client cafe id (``osm-123``, ``123`` or a name-lat-lon id)."""
+        normalized = cafe_id.strip().lower()
+        feature = self._by_id.get(normalized)
+        if feature is not None:
+            return feature
+        if normalized.startswith("osm-"):
+            normalized = normalized[4:]
+        try:
+            osm_id = int(normalized)
+        except Exception:
+            return None
+        return self._by_osm_id.get(osm_id)
+
+    def _cell(self, lon: float, lat: float) -> tuple[int, int]:
+        return math.floor(lon / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def _rows_in_cells(self, ix0: int, iy0: int, ix1: int, iy1: int) -> np.ndarray:
+        """Rows in occupied cells of the inclusive cell range (unsorted)."""
+        n_cells = (ix1 - ix0 + 1) * (iy1 - iy0 + 1)
+        if n_cells <= len(self._cells):
+            spans = [
+                self._cells[(ix, iy)]
+                for ix in range(ix0, ix1 + 1)
+                for iy in range(iy0, iy1 + 1)
+                if (ix, iy) in self._cells
+            ]
+        else:
+            # Huge ranges (e.g. a world bbox): walk occupied cells instead.
+            spans = [span for (ix, iy), span in self._cells.items() if ix0 <= ix <= ix1 and iy0 <= iy <= iy1]
+        if not spans:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate([self._order[start:end] for start, end in spans])
+
+    def bbox_rows(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> np.ndarray:
+        """Rows inside the inclusive bbox, in file order."""
+        if min_lon > max_lon or min_lat > max_lat:
+            return np.empty(0, dtype=np.intp)
+        ix0, iy0 = self._cell(min_lon, min_lat)
+        ix1, iy1 = self._cell(max_lon, max_lat)
+        rows = self._rows_in_cells(ix0, iy0, ix1, iy1)
+        lons, lats = self.lons[rows], self.lats[rows]
+        inside = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+        return np.sort(rows[inside])
+
+    def in_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> list[dict]:
+        """Features inside the inclusive bbox, in file order."""
+        return [self.features[row] for row in self.bbox_rows(min_lon, min_lat, max_lon, max_lat)]
+
+    def within_radius(self, lon: float, lat: float, radius_m: float) -> list[tuple[dict, float]]:
+        """(feature, distance in metres) within ``radius_m``, nearest first."""
+        dlat = radius_m / METERS_PER_DEG
+        dlon = radius_m / (METERS_PER_DEG * max(math.cos(math.radians(min(89.0, abs(lat) + dlat))), 1e-6))
+        ix0, iy0 = self._cell(lon - dlon, lat - dlat)
+        ix1, iy1 = self._cell(lon + dlon, lat + dlat)
+        rows = self._rows_in_cells(ix0, iy0, ix1, iy1)
+        distances = haversine_m(lon, lat, self.lons[rows], self.lats[rows])
+        keep = distances <= radius_m
+        rows, distances = rows[keep], distances[keep]
+        order = np.lexsort((rows, distances))
+        return [(self.features[rows[i]], float(distances[i])) for i in order]
+
+    def nearest(self, lon: float, lat: float, k: int, max_radius_m: float | None = None) -> list[tuple[dict, float]]:
+        """The ``k`` closest features as (feature, distance in metres)."""
+        found = []
+        for item in self.iter_nearest(lon, lat, max_radius_m):
+            if len(found) >= k:
+                break
+            found.append(item)
+        return found
+
+    def iter_nearest(
+        self,
+        lon: float,
+        lat: float,
+        max_radius_m: float | None = None,
+    ) -> Iterator[tuple[dict, float]]:
+        """
+        Yield (feature, distance in metres) in increasing distance, lazily.
+
+        Grid rings around the query cell are opened one at a time. A candidate
+        is yielded once it is closer than anything an unopened ring could hold,
+        so stopping early (first k matches of some predicate) only pays for the
+        rings actually reached.
+        """
+        cx, cy = self._cell(lon, lat)
+        heap: list[tuple[float, int]] = []
+        opened = 0
+        ring = 0
+        while True:
+            if ring == 0:
+                cells = [(cx, cy)]
+            else:
+                cells = [(cx + dx, cy - ring) for dx in range(-ring, ring + 1)]
+                cells += [(cx + dx, cy + ring) for dx in range(-ring, ring + 1)]
+                cells += [(cx - ring, cy + dy) for dy in range(-ring + 1, ring)]
+                cells += [(cx + ring, cy + dy) for dy in range(-ring + 1, ring)]
+            exhausted = opened == len(self._cells) or len(cells) > 4 * len(self._cells)
+            if exhausted:
+                # Rings have outgrown the occupied cells: take every remaining cell at once.
+                spans = [
+                    span
+                    for (ix, iy), span in self._cells.items()
+                    if max(abs(ix - cx), abs(iy - cy)) >= ring
+                ]
+            else:
+                spans = [self._cells[cell] for cell in cells if cell in self._cells]
+            opened += len(spans)
+            if spans:
+                rows = np.concatenate([self._order[start:end] for start, end in spans])
+                distances = haversine_m(lon, lat, self.lons[rows], self.lats[rows])
+                for distance, row in zip(distances.tolist(), rows.tolist()):
+                    heapq.heappush(heap, (distance, row))
+
+            # Nothing unopened is closer than `ring` whole cells from the query cell.
+            if exhausted:
+                bound = math.inf
+            else:
+                edge_lat = min(89.0, abs(lat) + (ring + 1) * self.cell_deg)
+                cell_m = self.cell_deg * METERS_PER_DEG * min(1.0, math.cos(math.radians(edge_lat)))
+                bound = ring * cell_m
+            while heap and heap[0][0] <= bound:
+                distance, row = heapq.heappop(heap)
+                if max_radius_m is not None and distance > max_radius_m:
+                    return
+                yield self.features[row], distance
+            if exhausted or (max_radius_m is not None and bound > max_radius_m):
+                while heap:
+                    distance, row = heapq.heappop(heap)
+                    if max_radius_m is not None and distance > max_radius_m:
+                        return
+                    yield self.features[row], distance
+                return
+            ring += 1
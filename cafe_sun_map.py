@@ -309,7 +309,7 @@ def main() -> None:
 
     dt = _parse_time(args.time)
     min_lon, min_lat, max_lon, max_lat = _resolve_bbox(args.area)
-    cafes = api._cafes_in_bbox(api.CAFES, min_lon, min_lat, max_lon, max_lat)
+    cafes = api.CAFE_CATALOG.index.in_bbox(min_lon, min_lat, max_lon, max_lat)
     if not cafes:
         raise SystemExit(f"No cafes found in area '{args.area}'.")
 
@@ -0,0 +1,255 @@
+"""
+Execution model for the API: engine work runs on one bounded thread pool,
+and each expensive route gets its own concurrency gate in front of it.
+
+Handlers are ``async``; they await ``EngineExecutor.run(route, fn, ...)``,
+which waits for a slot on the route's gate (queueing up to ``max_queue``
+callers, rejecting beyond that) and then runs ``fn`` on the engine pool. Cheap
+routes never touch the pool, so a burst of outlooks cannot starve them, and
+one expensive route cannot take every engine thread from another.
+
+``SingleFlight`` coalesces identical concurrent computations: the first caller
+for a key computes, everyone arriving while it runs shares its result.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# Shapely and NumPy release the GIL in their heavy loops, so threads scale on
+# the shared in-memory index without copying it into processes.
+ENGINE_THREADS = int(os.environ.get("SUNNYSIPS_ENGINE_THREADS", str(min(8, os.cpu_count() or 1))))
+
+
+class RouteOverloaded(Exception):
+    """The route's queue is full; callers should answer 503 with ``retry_after_s``."""
+
+    def __init__(self, route: str, retry_after_s: int = 1):
+        super().__init__(f"Route '{route}' is at capacity")
+        self.route = route
+        self.retry_after_s = retry_after_s
+
+
+@dataclass(frozen=True, slots=True)
+class RouteLimit:
+    max_concurrent: int
+    max_queue: int
+
+
+class _RouteGate:
+    """FIFO concurrency gate with an explicit waiter queue, so its depth is observable."""
+
+    __slots__ = (
+        "route",
+        "limit",
+        "active",
+        "_waiters",
+        "_granted",
+        "_lock",
+        "completed",
+        "rejected",
+        "max_waiting",
+        "wait_s_total",
+        "run_s_total",
+    )
+
+    def __init__(self, route: str, limit: RouteLimit):
+        self.route = route
+        self.limit = limit
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        # Waiters handed a slot whose wake-up has not run yet.
+        self._granted: set[asyncio.Future] = set()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.max_waiting = 0
+        self.wait_s_total = 0.0
+        self.run_s_total = 0.0
+
+    async def acquire(self) -> None:
+        with self._lock:
+            if self.active < self.limit.max_concurrent and not self._waiters:
+                self.active += 1
+                return
+            if len(self._waiters) >= self.limit.max_queue:
+                self.rejected += 1
+                raise RouteOverloaded(self.route)
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.max_waiting = max(self.max_waiting, len(self._waiters))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+                handed_over = waiter in self._granted
+                self._granted.discard(waiter)
+            if handed_over:
+                # The slot arrived just as the caller went away: pass it on.
+                self.release()
+            raise
+        with self._lock:
+            self._granted.discard(waiter)
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.cancelled():
+                    # Hand the slot straight to the next caller; ``active`` is unchanged.
+                    self._granted.add(waiter)
+                    waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+                    return
+            self.active -= 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            finished = max(1, self.completed)
+            return {
+                "max_concurrent": self.limit.max_concurrent,
+                "max_queue": self.limit.max_queue,
+                "active": self.active,
+                "waiting": len(self._waiters),
+                "max_waiting": self.max_waiting,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(1000.0 * self.wait_s_total / finished, 2),
+                "avg_run_ms": round(1000.0 * self.run_s_total / finished, 2),
+            }
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class EngineExecutor:
+    """Bounded engine thread pool plus per-route gates; see the module docstring."""
+
+    def __init__(self, routes: dict[str, RouteLimit], threads: int = ENGINE_THREADS):
+        self.threads = max(1, int(threads))
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="engine")
+        self._gates = {route: _RouteGate(route, limit) for route, limit in routes.items()}
+        self._lock = threading.Lock()
+        self._running = 0
+
+    async def run(self, route: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        gate = self._gates[route]
+        waited_from = time.perf_counter()
+        await gate.acquire()
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool,
+                functools.partial(self._call, fn, args, kwargs),
+            )
+        finally:
+            finished = time.perf_counter()
+            with gate._lock:
+                gate.completed += 1
+                gate.wait_s_total += started - waited_from
+                gate.run_s_total += finished - started
+            gate.release()
+
+    def _call(self, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            running = self._running
+        # Submitted but not yet picked up by a thread (work cancelled by a client disconnect included).
+        pool = {"threads": self.threads, "running": running, "queued": self._pool._work_queue.qsize()}
+        return {"pool": pool, "routes": {route: gate.stats() for route, gate in self._gates.items()}}
+
+
+class SingleFlight:
+    """
+    Keyed request coalescing (keys are usually ``cache_key_from_parts`` output).
+
+    ``do`` serves threads, ``run`` serves coroutines; the two keep separate
+    in-flight tables but share counters. Errors reach every waiter, and nothing
+    is remembered once the leader finishes: caching stays the caller's job.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """Run ``fn`` once per key across concurrent threads; waiters block on the leader."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result()
+        try:
+            result = fn()
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await ``factory()`` once per key; a waiter going away never cancels the shared work."""
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                task = asyncio.ensure_future(factory())
+                self._tasks[key] = task
+                self.leaders += 1
+                task.add_done_callback(functools.partial(self._forget, key))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so an abandoned failure is not logged as unhandled
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
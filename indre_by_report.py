@@ -60,7 +60,7 @@ def main() -> None:
         datetimes = [now_utc] + [d.astimezone(timezone.utc) for d in defaults_local]
 
     min_lon, min_lat, max_lon, max_lat = INDRE_BY_BBOX
-    cafes = api._cafes_in_bbox(api.CAFES, min_lon, min_lat, max_lon, max_lat)
+    cafes = api.CAFE_CATALOG.index.in_bbox(min_lon, min_lat, max_lon, max_lat)
     if not cafes:
         raise SystemExit("No cafes found in Indre By bbox.")
 
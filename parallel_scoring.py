@@ -0,0 +1,190 @@
+"""
+Process-pool scoring for large cafe sets and many time slots.
+
+Workers attach to the building index once, in the pool initializer, by
+memory-mapping the compiled artifact (see ``building_artifact``), so the
+STRtree is never pickled across processes and all workers page in the same
+read-only file. Work is split into contiguous chunks and merged in input
+order, so results are identical to the serial engine calls.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import pathlib
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from building_artifact import ARTIFACT_DIR, BUILDINGS_GEOJSON, load_building_index
+from shadow_engine import (
+    MIN_SUN_ELEVATION,
+    SUN_REF_LAT,
+    SUN_REF_LON,
+    BuildingIndex,
+    HorizonProfiles,
+    ShadowCache,
+    SunnyTimeseries,
+    compute_sunny_cafes,
+    compute_sunny_timeseries,
+    get_sun_position,
+)
+
+# Chunks per worker: enough slack to even out uneven chunks without much merge overhead.
+CHUNKS_PER_WORKER = 4
+
+_WORKER_INDEX: BuildingIndex | None = None
+# Per-worker shadow caches, keyed by (azimuth step, elevation step, max_bytes) of the caller's cache.
+_WORKER_SHADOW_CACHES: dict[tuple[float, float, int], ShadowCache] = {}
+
+
+def _attach_worker(geojson_path: str, artifact_dir: str, cafes: list[dict] | None) -> None:
+    global _WORKER_INDEX
+    _WORKER_INDEX, _ = load_building_index(pathlib.Path(geojson_path), pathlib.Path(artifact_dir), cafes=cafes)
+
+
+def _worker_rows() -> int:
+    return len(_WORKER_INDEX) if _WORKER_INDEX is not None else 0
+
+
+def _with_worker_cache(kwargs: dict) -> dict:
+    settings = kwargs.get("shared_shadow_cache")
+    if settings is None:
+        return kwargs
+    cache = _WORKER_SHADOW_CACHES.get(settings)
+    if cache is None:
+        azimuth_step_deg, elevation_step_deg, max_bytes = settings
+        cache = ShadowCache(max_bytes, azimuth_step_deg, elevation_step_deg)
+        _WORKER_SHADOW_CACHES[settings] = cache
+    return {**kwargs, "shared_shadow_cache": cache}
+
+
+def _shareable(kwargs: dict) -> dict:
+    """Replace an in-process ShadowCache by its settings; each worker keeps its own."""
+    cache = kwargs.get("shared_shadow_cache")
+    if cache is None:
+        return kwargs
+    return {**kwargs, "shared_shadow_cache": (cache.azimuth_step_deg, cache.elevation_step_deg, cache.max_bytes)}
+
+
+def _score_cafes_chunk(cafes: list[dict], dt: datetime, cloud_cover_pct: float, kwargs: dict) -> list[dict]:
+    return compute_sunny_cafes(cafes, _WORKER_INDEX, dt, cloud_cover_pct, limit=None, **_with_worker_cache(kwargs))
+
+
+def _score_slots_chunk(
+    cafes: list[dict],
+    times: list[datetime],
+    cloud_by_time: dict[datetime, float],
+    kwargs: dict,
+) -> SunnyTimeseries:
+    return compute_sunny_timeseries(cafes, _WORKER_INDEX, times, cloud_by_time, **_with_worker_cache(kwargs))
+
+
+def _chunk_bounds(n_items: int, n_chunks: int) -> list[tuple[int, int]]:
+    n_chunks = max(1, min(n_items, n_chunks))
+    edges = np.linspace(0, n_items, n_chunks + 1).round().astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(edges, edges[1:]) if hi > lo]
+
+
+class ParallelScorer:
+    """
+    Pool of scoring workers sharing one memory-mapped building artifact.
+
+    ``cafes`` (optional) is handed to each worker once so per-seat candidate
+    lists stored in the artifact can be reused. Use as a context manager or
+    call ``close()``.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        geojson_path: pathlib.Path = BUILDINGS_GEOJSON,
+        artifact_dir: pathlib.Path = ARTIFACT_DIR,
+        cafes: list[dict] | None = None,
+    ):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        # spawn: workers start clean instead of forking a threaded server process.
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_attach_worker,
+            initargs=(str(geojson_path), str(artifact_dir), cafes),
+        )
+
+    def __enter__(self) -> ParallelScorer:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def warm_up(self) -> list[int]:
+        """Start every worker and attach it to the index; returns each worker's building count."""
+        futures = [self._pool.submit(_worker_rows) for _ in range(self.workers)]
+        return [future.result() for future in futures]
+
+    def compute_sunny_cafes(
+        self,
+        cafes: list[dict],
+        dt: datetime,
+        cloud_cover_pct: float,
+        limit: int | None = 200,
+        **kwargs,
+    ) -> list[dict]:
+        """``compute_sunny_cafes`` with cafes partitioned across the pool."""
+        if not cafes:
+            return []
+        # Resolve the sun once so every chunk (and the merge below) agrees on it.
+        if kwargs.get("sun_position") is None:
+            kwargs["sun_position"] = get_sun_position(SUN_REF_LAT, SUN_REF_LON, dt)
+        kwargs = _shareable(kwargs)
+        futures = [
+            self._pool.submit(_score_cafes_chunk, cafes[lo:hi], dt, cloud_cover_pct, kwargs)
+            for lo, hi in _chunk_bounds(len(cafes), self.workers * CHUNKS_PER_WORKER)
+        ]
+        results = [row for future in futures for row in future.result()]
+        # Chunks keep input order and the sort is stable, so ties break exactly as in the serial call.
+        if float(kwargs["sun_position"][1]) > MIN_SUN_ELEVATION:
+            results.sort(key=lambda r: (r["sunny_score"], r["sunny_fraction"], r["name"]), reverse=True)
+        return results[:limit] if limit else results
+
+    def compute_sunny_timeseries(
+        self,
+        cafes: list[dict],
+        times: Sequence[datetime],
+        cloud_by_time: dict[datetime, float],
+        shade_mode: str = "polygon",
+        horizons: HorizonProfiles | None = None,
+        shared_shadow_cache: ShadowCache | None = None,
+        default_cloud_cover_pct: float = 50.0,
+    ) -> SunnyTimeseries:
+        """``compute_sunny_timeseries`` with time slots partitioned across the pool."""
+        times = list(times)
+        kwargs = _shareable(
+            {
+                "shade_mode": shade_mode,
+                "horizons": horizons,
+                "shared_shadow_cache": shared_shadow_cache,
+                "default_cloud_cover_pct": default_cloud_cover_pct,
+            }
+        )
+        futures = [
+            self._pool.submit(_score_slots_chunk, cafes, times[lo:hi], cloud_by_time, kwargs)
+            for lo, hi in _chunk_bounds(len(times), self.workers * CHUNKS_PER_WORKER)
+        ]
+        parts = [future.result() for future in futures]
+        if not parts:
+            return compute_sunny_timeseries(cafes, [], [], cloud_by_time, shade_mode=shade_mode)
+        return SunnyTimeseries(
+            cafes=list(cafes),
+            times=[dt for part in parts for dt in part.times],
+            sunny_fraction=np.concatenate([part.sunny_fraction for part in parts], axis=1),
+            sunny_score=np.concatenate([part.sunny_score for part in parts], axis=1),
+            cloud_cover_pct=np.concatenate([part.cloud_cover_pct for part in parts]),
+            sun_azimuth_deg=np.concatenate([part.sun_azimuth_deg for part in parts]),
+            sun_elevation_deg=np.concatenate([part.sun_elevation_deg for part in parts]),
+        )
@@ -181,7 +181,8 @@ def _build_window(hourly_rows: list[dict], start_idx: int, end_idx: int, conditi
     end_start = _parse_iso(end_row.get("time_utc"))
     if start is None or end_start is None:
         return None
-    end = end_start + timedelta(hours=1)
+    # Rows are hourly unless they carry their own end (minute-level segments).
+    end = _parse_iso(end_row.get("end_utc")) or end_start + timedelta(hours=1)
     duration_min = int((end - start).total_seconds() / 60.0)
     condition = "sunny" if all(c == "sunny" for c in conditions) else "partial"
     return {
@@ -0,0 +1,241 @@
+"""
+In-memory cache of serialized API responses, plus the encoders that feed it.
+
+Entries are the exact response bytes (optionally pre-compressed, with an
+ETag), so a hit skips both the engine and JSON encoding. Each entry lives at
+most ``ttl_s`` seconds (weather moves on even when the key does not), and the
+cache stays under a byte budget by evicting least-recently-used entries first.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+try:  # optional: without it clients get gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_TTL_S = 300.0
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Bodies below this are sent as-is; compression would barely pay for its headers.
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+# Rows per streamed chunk: big enough to amortize a socket write, small enough to render early.
+NDJSON_CHUNK_ROWS = 100
+# Strong ETags name exact bytes, so each Content-Encoding gets its own tag.
+_ETAG_SUFFIXES = {"gzip": "-gz", "br": "-br"}
+
+
+def json_bytes(payload: Any) -> bytes:
+    """Encode a payload exactly as FastAPI's ``JSONResponse`` would."""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def ndjson_chunks(header: dict, rows: Iterable[Any], chunk_rows: int = NDJSON_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    NDJSON body as chunks: ``header`` on the first line, then one line per row.
+
+    Rows are encoded only as the chunk holding them is sent, so a large result
+    is never held as one serialized document.
+    """
+    yield json_bytes(header) + b"\n"
+    lines = []
+    for row in rows:
+        lines.append(json_bytes(row))
+        if len(lines) >= chunk_rows:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+@dataclass(frozen=True, slots=True)
+class EncodedPayload:
+    """
+    A JSON payload encoded once: identity bytes, compressed variants and a strong ETag.
+
+    ``etag`` hashes the version tag together with the identity bytes, so equal
+    ETags always mean byte-identical bodies. Compressed variants are served
+    under ``etag_for(encoding)``, which appends a per-encoding suffix.
+    """
+
+    body: bytes
+    gzip: bytes | None
+    br: bytes | None
+    etag: str
+    media_type: str = "application/json"
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body) + len(self.gzip or b"") + len(self.br or b"")
+
+    def negotiate(self, accept_encoding: str | None) -> tuple[bytes, str | None]:
+        """Smallest variant the client accepts, as (body, Content-Encoding or None)."""
+        accepted = _accepted_encodings(accept_encoding)
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if self.gzip is not None and "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.body, None
+
+    def etag_for(self, encoding: str | None) -> str:
+        """ETag of the variant sent with ``encoding`` (None = identity)."""
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}{_ETAG_SUFFIXES[encoding]}"'
+
+
+def encode_payload(payload: Any, version: str, media_type: str = "application/json") -> EncodedPayload:
+    """Serialize and pre-compress ``payload``; ``version`` names the data it came from."""
+    body = json_bytes(payload)
+    digest = hashlib.blake2b(version.encode("utf-8"), digest_size=16)
+    digest.update(b"\0")
+    digest.update(body)
+    compress = len(body) >= COMPRESS_MIN_BYTES
+    return EncodedPayload(
+        body=body,
+        gzip=gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0) if compress else None,
+        br=brotli.compress(body, quality=BROTLI_QUALITY) if compress and brotli is not None else None,
+        etag=f'"{digest.hexdigest()}"',
+        media_type=media_type,
+    )
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    ``If-None-Match`` check (weak comparison, as RFC 9110 prescribes for it).
+
+    ``etag`` is a payload's identity ETag; a tag of any of its encoded
+    variants matches too, since they all decode to the same body.
+    """
+    if not if_none_match:
+        return False
+    variants = {etag, *(f'{etag[:-1]}{suffix}"' for suffix in _ETAG_SUFFIXES.values())}
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") in variants:
+            return True
+    return False
+
+
+def _accepted_encodings(accept_encoding: str | None) -> set[str]:
+    accepted = set()
+    refused = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+        elif coding:
+            refused.add(coding)
+    if "*" in accepted:
+        # The wildcard covers codings not named otherwise; an explicit q=0 still refuses one.
+        accepted |= {"br", "gzip"} - refused
+    return accepted
+
+
+class ResponseCache:
+    """
+    Thread-safe TTL + byte-bounded LRU of response bodies.
+
+    Values are raw bytes or anything reporting its own ``nbytes``, such as ``EncodedPayload``.
+    """
+
+    __slots__ = (
+        "max_bytes",
+        "ttl_s",
+        "_clock",
+        "_entries",
+        "_bytes",
+        "_lock",
+        "hits",
+        "misses",
+        "expirations",
+        "evictions",
+    )
+
+    def __init__(
+        self,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl_s: float = RESPONSE_CACHE_TTL_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+        self._clock = clock
+        # key -> (body, size in bytes, expiry on ``clock``)
+        self._entries: OrderedDict[Hashable, tuple[bytes | EncodedPayload, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> bytes | EncodedPayload | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= self._clock():
+                del self._entries[key]
+                self._bytes -= entry[1]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: bytes | EncodedPayload) -> None:
+        size = len(value) if isinstance(value, bytes) else value.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size, self._clock() + self.ttl_s)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,72 @@
+"""Benchmark process-pool scoring against the serial engine.
+
+Scores every cafe over a day of snapshot slots with 1..N workers, checks each
+run is identical to the serial result, and prints wall time and speedup.
+Run ``python building_artifact.py`` first so workers can memory-map the index.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from building_artifact import ARTIFACT_DIR, BUILDINGS_GEOJSON, CAFES_GEOJSON, load_building_index
+from parallel_scoring import ParallelScorer
+from shadow_engine import compute_sunny_timeseries
+
+
+def _worker_counts(max_workers: int) -> list[int]:
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--slot-minutes", type=int, default=15)
+    parser.add_argument("--date", default="2026-06-21", help="UTC day to score.")
+    parser.add_argument("--shade-mode", choices=["layer", "raycast"], default="layer")
+    args = parser.parse_args()
+
+    with open(CAFES_GEOJSON) as f:
+        cafes = json.load(f)["features"]
+    building_index, origin = load_building_index(BUILDINGS_GEOJSON, ARTIFACT_DIR, cafes=cafes)
+    day = datetime.fromisoformat(args.date).replace(tzinfo=timezone.utc)
+    times = [day + timedelta(minutes=m) for m in range(0, 24 * 60, args.slot_minutes)]
+    cloud_by_time = {dt: 20.0 for dt in times}
+    print(f"{len(cafes)} cafes x {len(times)} slots, shade_mode={args.shade_mode}, index from {origin}")
+
+    started = time.perf_counter()
+    serial = compute_sunny_timeseries(cafes, building_index, times, cloud_by_time, shade_mode=args.shade_mode)
+    serial_s = time.perf_counter() - started
+    print(f"serial      {serial_s:8.2f}s")
+
+    for workers in _worker_counts(max(1, args.max_workers)):
+        with ParallelScorer(workers, cafes=cafes) as scorer:
+            scorer.warm_up()
+            started = time.perf_counter()
+            parallel = scorer.compute_sunny_timeseries(cafes, times, cloud_by_time, shade_mode=args.shade_mode)
+            elapsed = time.perf_counter() - started
+        identical = np.array_equal(parallel.sunny_score, serial.sunny_score)
+        print(
+            f"workers={workers:<3} {elapsed:8.2f}s  speedup={serial_s / elapsed:5.2f}x  "
+            f"efficiency={serial_s / elapsed / workers:5.0%}  identical={identical}"
+        )
+
+
+if __name__ == "__main__":
+    main()
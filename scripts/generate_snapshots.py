@@ -8,18 +8,34 @@ import argparse
 import json
 import pathlib
 import sys
+import time
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
+import numpy as np
+
 ROOT_DIR = pathlib.Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 import api
-from shadow_engine import compute_sunny_cafes
+from building_artifact import buildings_fingerprint
+from parallel_scoring import ParallelScorer
+from recommendations import cache_key_from_parts
+from shadow_engine import (
+    SunnyGeometry,
+    build_horizon_profiles,
+    compute_sunny_geometry,
+)
 from weather import get_cloud_cover
 
 CPH_TZ = ZoneInfo("Europe/Copenhagen")
+GEOMETRY_CACHE_ROOT = pathlib.Path(".cache/sunnysips_v1/geometry")
+# Hourly runs only ever ask for today onwards, so older geometry is dead weight.
+GEOMETRY_CACHE_MAX_AGE_DAYS = 2
+# Part of every geometry cache key. Bump whenever the shade engine's results or
+# the cached arrays change, so older entries are no longer read.
+GEOMETRY_CACHE_VERSION = 2
 
 AREAS = {
     "core-cph": (12.500, 55.660, 12.640, 55.730),
@@ -62,6 +78,90 @@ def _build_full_day_slots(base_dt: datetime, slot_minutes: int, days: int) -> li
     return slots
 
 
+def _compute_geometry(
+    cafes: list[dict],
+    time_slots: list[datetime],
+    shade_mode: str,
+    scorer: ParallelScorer | None = None,
+) -> SunnyGeometry:
+    horizons = build_horizon_profiles(cafes, api.BUILDING_INDEX) if shade_mode == "horizon" else None
+    if scorer is not None:
+        return scorer.compute_sunny_timeseries(
+            cafes,
+            time_slots,
+            {},
+            shade_mode=shade_mode,
+            horizons=horizons,
+        ).geometry
+    return compute_sunny_geometry(
+        cafes,
+        api.BUILDING_INDEX,
+        time_slots,
+        shade_mode=shade_mode,
+        horizons=horizons,
+    )
+
+
+def _geometry_cache_key(
+    cafes: list[dict],
+    time_slots: list[datetime],
+    shade_mode: str,
+    buildings_key: str,
+) -> str:
+    return cache_key_from_parts(
+        f"v{GEOMETRY_CACHE_VERSION}",
+        shade_mode,
+        buildings_key,
+        json.dumps([cafe.get("geometry", {}).get("coordinates") for cafe in cafes]),
+        ",".join(dt.isoformat() for dt in time_slots),
+    )
+
+
+def _cached_geometry(
+    cafes: list[dict],
+    time_slots: list[datetime],
+    shade_mode: str,
+    scorer: ParallelScorer | None,
+    cache_root: pathlib.Path | None,
+    buildings_key: str,
+) -> SunnyGeometry:
+    """
+    Geometry from the on-disk cache when buildings, cafes and slots match; weather is applied by the caller.
+
+    ``buildings_key`` is the run's ``buildings_fingerprint``, computed once by the caller.
+    """
+    if cache_root is None:
+        return _compute_geometry(cafes, time_slots, shade_mode, scorer)
+    path = cache_root / f"{_geometry_cache_key(cafes, time_slots, shade_mode, buildings_key)}.npz"
+    if path.exists():
+        with np.load(path) as cached:
+            return SunnyGeometry(
+                cafes=list(cafes),
+                times=list(time_slots),
+                sunny_fraction=cached["sunny_fraction"],
+                sun_azimuth_deg=cached["sun_azimuth_deg"],
+                sun_elevation_deg=cached["sun_elevation_deg"],
+            )
+    geometry = _compute_geometry(cafes, time_slots, shade_mode, scorer)
+    cache_root.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        path,
+        sunny_fraction=geometry.sunny_fraction,
+        sun_azimuth_deg=geometry.sun_azimuth_deg,
+        sun_elevation_deg=geometry.sun_elevation_deg,
+    )
+    return geometry
+
+
+def _prune_geometry_cache(cache_root: pathlib.Path) -> None:
+    if not cache_root.exists():
+        return
+    cutoff = time.time() - GEOMETRY_CACHE_MAX_AGE_DAYS * 86400
+    for path in cache_root.glob("*.npz"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+
+
 def _bucket(sunny_fraction: float) -> str:
     if sunny_fraction >= 0.99:
         return "sunny"
@@ -183,6 +283,23 @@ def main() -> None:
         default=2,
         help="How many whole local days of slots to generate (starting today in Copenhagen).",
     )
+    parser.add_argument(
+        "--shade-mode",
+        choices=["layer", "horizon"],
+        default="layer",
+        help="layer: exact city-wide shadow layer per slot; horizon: precomputed seat horizons.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Score time slots across this many processes (they share the building artifact).",
+    )
+    parser.add_argument(
+        "--geometry-cache",
+        default=str(GEOMETRY_CACHE_ROOT),
+        help="Directory for cached shade geometry; reruns with a new forecast only re-apply weather. Empty disables.",
+    )
     args = parser.parse_args()
 
     requested_areas = []
@@ -213,6 +330,13 @@ def main() -> None:
         )
         slot_mode = f"full-day({args.days} day, {args.slot_minutes} min)"
 
+    cloud_by_time: dict[datetime, float] = {}
+    for dt in time_slots:
+        try:
+            cloud_by_time[dt] = float(get_cloud_cover(dt))
+        except Exception:
+            cloud_by_time[dt] = 50.0
+
     area_index = []
     print(
         f"Generating snapshots for {len(requested_areas)} areas and {len(time_slots)} time slot(s)"
@@ -224,91 +348,93 @@ def main() -> None:
     for area in requested_areas:
         bbox = AREAS[area]
         area_bboxes[area] = bbox
-        area_cafes[area] = api._cafes_in_bbox(api.CAFES, *bbox)
+        area_cafes[area] = api.CAFE_CATALOG.index.in_bbox(*bbox)
 
     # Performance path: compute once on core-cph and filter for sub-areas.
     use_core_fastpath = "core-cph" in requested_areas and bool(area_cafes.get("core-cph"))
-    core_rows_by_time: dict[datetime, tuple[float, list[dict]]] = {}
-    if use_core_fastpath:
-        print("Using core-cph fast path for shadow computations.")
-        core_cafes = area_cafes["core-cph"]
-        for dt in time_slots:
-            try:
-                cloud_cover = float(get_cloud_cover(dt))
-            except Exception:
-                cloud_cover = 50.0
-            core_rows = compute_sunny_cafes(
-                core_cafes,
-                api.BUILDING_INDEX,
-                dt,
-                cloud_cover,
-                limit=None,
+    scorer = None
+    if args.workers > 1:
+        scorer = ParallelScorer(
+            args.workers,
+            geojson_path=api.DATA_DIR / "buildings.geojson",
+            artifact_dir=api.DATA_DIR / "buildings_artifact",
+            cafes=api.CAFE_CATALOG.features,
+        )
+
+    try:
+        geometry_root = pathlib.Path(args.geometry_cache) if args.geometry_cache else None
+        buildings_key = ""
+        if geometry_root is not None:
+            _prune_geometry_cache(geometry_root)
+            # Every footprint's WKB and height, so any geometry edit changes the cache keys.
+            buildings_key = buildings_fingerprint(api.BUILDING_INDEX)
+
+        core_series = None
+        if use_core_fastpath:
+            print("Using core-cph fast path for shadow computations.")
+            core_series = _cached_geometry(
+                area_cafes["core-cph"], time_slots, args.shade_mode, scorer, geometry_root, buildings_key
+            ).score(cloud_by_time)
+
+        for area in requested_areas:
+            bbox = area_bboxes[area]
+            cafes = area_cafes[area]
+            min_lon, min_lat, max_lon, max_lat = bbox
+            if not cafes:
+                payload = {
+                    "generated_at_utc": generated_at.isoformat(),
+                    "area": area,
+                    "bbox": [min_lon, min_lat, max_lon, max_lat],
+                    "error": "No cafes in bbox",
+                    "snapshots": [],
+                }
+                _write_json(output_dir / f"{area}.json", payload)
+                area_index.append({"area": area, "file": f"{area}.json", "count": 0})
+                continue
+
+            snapshots = []
+            series = (
+                core_series
+                if use_core_fastpath
+                else _cached_geometry(
+                    cafes, time_slots, args.shade_mode, scorer, geometry_root, buildings_key
+                ).score(cloud_by_time)
             )
-            core_rows_by_time[dt] = (cloud_cover, core_rows)
+            for slot, dt in enumerate(time_slots):
+                cloud_cover = cloud_by_time[dt]
+                rows = series.rows(slot)
+                if use_core_fastpath and area != "core-cph":
+                    rows = [
+                        row for row in rows
+                        if _in_bbox(float(row.get("lon", 0.0)), float(row.get("lat", 0.0)), bbox)
+                    ]
+
+                snapshots.append(
+                    {
+                        "time_utc": dt.isoformat(),
+                        "time_local": dt.astimezone(CPH_TZ).isoformat(),
+                        "cloud_cover_pct": round(cloud_cover, 1),
+                        "summary": _summarize(rows),
+                        "cafes": _to_preview_rows(rows),
+                    }
+                )
 
-    for area in requested_areas:
-        bbox = area_bboxes[area]
-        cafes = area_cafes[area]
-        min_lon, min_lat, max_lon, max_lat = bbox
-        if not cafes:
             payload = {
                 "generated_at_utc": generated_at.isoformat(),
                 "area": area,
                 "bbox": [min_lon, min_lat, max_lon, max_lat],
-                "error": "No cafes in bbox",
-                "snapshots": [],
+                "slot_minutes": args.slot_minutes if args.hours_ahead is None else 60,
+                "slot_mode": slot_mode,
+                "snapshots": snapshots,
             }
             _write_json(output_dir / f"{area}.json", payload)
-            area_index.append({"area": area, "file": f"{area}.json", "count": 0})
-            continue
-
-        snapshots = []
-        for dt in time_slots:
-            if use_core_fastpath:
-                cloud_cover, base_rows = core_rows_by_time[dt]
-                if area == "core-cph":
-                    rows = base_rows
-                else:
-                    rows = [
-                        row for row in base_rows
-                        if _in_bbox(float(row.get("lon", 0.0)), float(row.get("lat", 0.0)), bbox)
-                    ]
-            else:
-                try:
-                    cloud_cover = float(get_cloud_cover(dt))
-                except Exception:
-                    cloud_cover = 50.0
-                rows = compute_sunny_cafes(
-                    cafes,
-                    api.BUILDING_INDEX,
-                    dt,
-                    cloud_cover,
-                    limit=None,
-                )
-
-            snapshots.append(
-                {
-                    "time_utc": dt.isoformat(),
-                    "time_local": dt.astimezone(CPH_TZ).isoformat(),
-                    "cloud_cover_pct": round(cloud_cover, 1),
-                    "summary": _summarize(rows),
-                    "cafes": _to_preview_rows(rows),
-                }
-            )
-
-        payload = {
-            "generated_at_utc": generated_at.isoformat(),
-            "area": area,
-            "bbox": [min_lon, min_lat, max_lon, max_lat],
-            "slot_minutes": args.slot_minutes if args.hours_ahead is None else 60,
-            "slot_mode": slot_mode,
-            "snapshots": snapshots,
-        }
-        _write_json(output_dir / f"{area}.json", payload)
 
-        first_count = snapshots[0]["summary"]["total"] if snapshots else 0
-        area_index.append({"area": area, "file": f"{area}.json", "count": first_count})
-        print(f"  - {area}: {first_count} cafes")
+            first_count = snapshots[0]["summary"]["total"] if snapshots else 0
+            area_index.append({"area": area, "file": f"{area}.json", "count": first_count})
+            print(f"  - {area}: {first_count} cafes")
+    finally:
+        if scorer is not None:
+            scorer.close()
 
     index_payload = {
         "generated_at_utc": generated_at.isoformat(),
@@ -0,0 +1,87 @@
+"""Precompute /api/sunny/tiles payloads as static files for a CDN or GitHub Pages.
+
+Files are the exact JSON the tile endpoint serves, laid out as
+``<output-dir>/<slot>/<z>/<x>/<y>.json`` with an ``index.json`` listing the
+slots and tiles. Only tiles holding at least one cafe are written; clients
+treat a missing tile as empty.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import api
+from city_config import get_city_config
+from response_cache import json_bytes
+from tiles import TILE_MAX_ZOOM, TILE_MIN_ZOOM, tile_xy, tiles_covering
+
+
+def _slot_name(dt: datetime) -> str:
+    return dt.strftime("%Y%m%dT%H%MZ")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output-dir", default="site/tiles", help="Directory where tile files are written.")
+    parser.add_argument("--city", default="copenhagen", help="City whose bbox is tiled.")
+    parser.add_argument("--zoom", type=int, default=15, help=f"Tile zoom ({TILE_MIN_ZOOM}-{TILE_MAX_ZOOM}).")
+    parser.add_argument("--time", default=None, help="ISO timestamp of the first slot (UTC). Default is now.")
+    parser.add_argument("--hours", type=int, default=12, help="How many hours of slots to generate.")
+    parser.add_argument(
+        "--slot-minutes",
+        type=int,
+        default=api.SUNNY_SLOT_MINUTES,
+        help="Minutes between slots; a multiple of the API's slot length keeps files aligned with its cache.",
+    )
+    args = parser.parse_args()
+    if not TILE_MIN_ZOOM <= args.zoom <= TILE_MAX_ZOOM:
+        raise SystemExit(f"--zoom must be within {TILE_MIN_ZOOM}-{TILE_MAX_ZOOM}")
+
+    city = get_city_config(args.city)
+    first = api._sunny_slot(api._parse_iso_datetime(args.time))
+    slot_count = max(1, args.hours * 60 // args.slot_minutes)
+    slots = [first + timedelta(minutes=args.slot_minutes * i) for i in range(slot_count)]
+
+    catalog = api.CAFE_CATALOG.index
+    rows = catalog.bbox_rows(*city.bbox)
+    xs, ys = tile_xy(catalog.lons[rows], catalog.lats[rows], args.zoom)
+    occupied = set(zip(xs.tolist(), ys.tolist()))
+    covering = tiles_covering(city.bbox, args.zoom)
+    tiles = [tile for tile in covering if tile in occupied]
+
+    print(
+        f"Precomputing {len(tiles)} of {len(covering)} tiles covering {city.city_id} at z{args.zoom} "
+        f"for {len(slots)} slot(s)..."
+    )
+    started = time.perf_counter()
+    payloads = api.sunny_tile_payloads(args.zoom, tiles, slots)
+
+    output_dir = pathlib.Path(args.output_dir)
+    for (x, y, dt), payload in payloads.items():
+        path = output_dir / _slot_name(dt) / str(args.zoom) / str(x) / f"{y}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(json_bytes(payload))
+
+    index = {
+        "generated_at_utc": datetime.now(timezone.utc).isoformat(),
+        "city_id": city.city_id,
+        "zoom": args.zoom,
+        "slots": [{"time": dt.isoformat(), "path": _slot_name(dt)} for dt in slots],
+        "tiles": [[x, y] for x, y in tiles],
+        "cafes": sum(payloads[(x, y, first)]["count"] for x, y in tiles),
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / "index.json").write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+    print(f"Wrote {len(payloads)} tile files to {output_dir} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
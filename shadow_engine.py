@@ -1,18 +1,23 @@
 """2.5D shadow computation for Copenhagen cafes."""
 from __future__ import annotations
 
+import hashlib
+import itertools
 import math
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from typing import Any
 
 import numpy as np
 import pyproj
-from pysolar.solar import get_altitude, get_azimuth
+import shapely
 from shapely import make_valid
 from shapely.affinity import translate
 from shapely.errors import GEOSException
-from shapely.geometry import MultiPolygon, Point, Polygon
+from shapely.geometry import LineString, MultiPolygon, Point, Polygon
 from shapely.ops import unary_union
 from shapely.strtree import STRtree
 
@@ -26,16 +31,285 @@ TO_WGS = pyproj.Transformer.from_crs("EPSG:25832", "EPSG:4326", always_xy=True)
 MAX_SHADOW_LENGTH = 500.0  # meters
 # Min sun elevation to consider (below this -> no direct sun possible)
 MIN_SUN_ELEVATION = 2.0  # degrees
+# Copenhagen-scale requests can share one sun position without meaningful loss.
+SUN_REF_LON, SUN_REF_LAT = 12.568, 55.676
+# Padding (meters) around candidate search areas to tolerate footprint edge noise
+SEARCH_PADDING_M = 3.0
 
+# "disc": every building within the max shadow length of the seat.
+# "corridor": only buildings along the seat -> sun ray (same result, far fewer candidates).
+# "static": slices of per-seat lists precomputed by build_seat_candidates (no tree query).
+CANDIDATE_MODES = ("disc", "corridor", "static")
+# "polygon": project full shadow polygons and test coverage.
+# "raycast": intersect the seat -> sun ray with footprints, no shadow polygons.
+# "horizon": look up precomputed per-seat obstruction horizons (see HorizonProfiles).
+# "layer": one city-wide shadow layer per sun position, all seats in one batched query.
+SHADE_MODES = ("polygon", "raycast", "horizon", "layer")
+# Azimuth resolution of precomputed seat horizons
+HORIZON_BIN_DEG = 0.5  # degrees
+# Coarse sampling step when searching for seat shade transitions; bisection refines
+# each bracketed transition, but sun/shade flips shorter than a step can be missed.
+TRANSITION_COARSE_STEP_MIN = 10
+# Bisection stops once every transition is bracketed this tightly.
+TRANSITION_RESOLUTION_S = 30.0
+# Defaults for the process-wide shadow cache (see ShadowCache)
+SHADOW_CACHE_MAX_BYTES = 256 * 1024 * 1024
+SHADOW_CACHE_AZIMUTH_STEP_DEG = 0.25
+SHADOW_CACHE_ELEVATION_STEP_DEG = 0.1
+# nearest_sunny_cafes scores candidates in batches that start small (the answer is
+# usually close) and double up to the cap while sunny cafes stay scarce.
+NEAREST_FIRST_BATCH = 8
+NEAREST_MAX_BATCH = 64
 
-@dataclass(frozen=True)
-class BuildingRecord:
-    """Building geometry and resolved height used for shadow casting."""
+_INDEX_IDS = itertools.count(1)
 
-    geom_utm: Polygon | MultiPolygon
-    height_m: float
-    osm_id: int | None
-    height_source: str
+
+@dataclass(frozen=True, slots=True)
+class HorizonProfiles:
+    """
+    Obstruction horizons for every seat of a cafe list, aligned with that list.
+
+    ``horizons[cafe, seat, bin]`` is the highest elevation angle (degrees) at which
+    a building still blocks the sun for azimuths inside ``bin``.
+    """
+
+    bin_deg: float
+    horizons: np.ndarray
+
+    def azimuth_bin(self, sun_azimuth_deg: float) -> int:
+        n_bins = self.horizons.shape[-1]
+        return int(math.floor((sun_azimuth_deg % 360.0) / self.bin_deg)) % n_bins
+
+    def sunny_seats(self, cafe_idx: int, sun_azimuth_deg: float, sun_elevation_deg: float) -> np.ndarray:
+        """Boolean mask of seats of one cafe that receive direct sun."""
+        blocking = self.horizons[cafe_idx, :, self.azimuth_bin(sun_azimuth_deg)]
+        return sun_elevation_deg > blocking
+
+
+@dataclass(frozen=True, slots=True)
+class SeatCandidates:
+    """
+    Buildings within ``MAX_SHADOW_LENGTH`` of every cafe seat, in CSR layout.
+
+    Seat ``row`` owns ``building_idx[offsets[row]:offsets[row + 1]]``, sorted by
+    footprint distance. ``azimuth_lo``/``azimuth_span`` give the bearing interval
+    each footprint envelope covers as seen from the seat.
+    """
+
+    offsets: np.ndarray
+    building_idx: np.ndarray
+    distances: np.ndarray
+    azimuth_lo: np.ndarray
+    azimuth_span: np.ndarray
+    seat_rows: dict[tuple[float, float], int]
+
+    def first_row(self, lon: float, lat: float) -> int | None:
+        return self.seat_rows.get((lon, lat))
+
+    def for_seat(
+        self,
+        row: int,
+        max_distance: float,
+        sun_azimuth_deg: float | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """(building indices, distances) closer than ``max_distance``, optionally facing the sun."""
+        start = int(self.offsets[row])
+        end = int(self.offsets[row + 1])
+        stop = start + int(np.searchsorted(self.distances[start:end], max_distance, side="right"))
+        candidates = self.building_idx[start:stop]
+        distances = self.distances[start:stop]
+        if sun_azimuth_deg is None:
+            return candidates, distances
+        offset = np.mod(sun_azimuth_deg - self.azimuth_lo[start:stop], 360.0)
+        facing = offset <= self.azimuth_span[start:stop] + 1e-3
+        return candidates[facing], distances[facing]
+
+    @property
+    def nbytes(self) -> int:
+        return int(
+            self.offsets.nbytes
+            + self.building_idx.nbytes
+            + self.distances.nbytes
+            + self.azimuth_lo.nbytes
+            + self.azimuth_span.nbytes
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class SunnyGeometry:
+    """
+    Weather-independent half of an engine run: seat sun shares per cafe and timestamp.
+
+    Geometry only changes with buildings, seats and sun position, so it can be
+    cached and re-scored with every new forecast via ``score``.
+    """
+
+    cafes: list[dict]
+    times: list[datetime]
+    sunny_fraction: np.ndarray
+    sun_azimuth_deg: np.ndarray
+    sun_elevation_deg: np.ndarray
+
+    def score(self, cloud_by_time: dict[datetime, float], default_cloud_cover_pct: float = 50.0) -> SunnyTimeseries:
+        """Apply per-timestamp cloud cover; a vectorized multiply, no geometry work."""
+        return SunnyTimeseries.from_fractions(
+            self.cafes,
+            self.times,
+            self.sunny_fraction,
+            cloud_by_time,
+            default_cloud_cover_pct=default_cloud_cover_pct,
+            sun_positions=(self.sun_azimuth_deg, self.sun_elevation_deg),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.sunny_fraction.nbytes + self.sun_azimuth_deg.nbytes + self.sun_elevation_deg.nbytes)
+
+
+@dataclass(frozen=True, slots=True)
+class SunnyTimeseries:
+    """
+    Scores for every cafe (rows) at every timestamp (columns) of one engine run.
+
+    ``sunny_fraction`` is the share of a cafe's seats in direct sun and
+    ``sunny_score`` folds in each timestamp's cloud cover, as ``compute_sunny_cafes`` does.
+    """
+
+    cafes: list[dict]
+    times: list[datetime]
+    sunny_fraction: np.ndarray
+    sunny_score: np.ndarray
+    cloud_cover_pct: np.ndarray
+    sun_azimuth_deg: np.ndarray
+    sun_elevation_deg: np.ndarray
+
+    @classmethod
+    def from_fractions(
+        cls,
+        cafes: list[dict],
+        times: Sequence[datetime],
+        sunny_fraction: np.ndarray,
+        cloud_by_time: dict[datetime, float],
+        default_cloud_cover_pct: float = 50.0,
+        sun_positions: tuple[np.ndarray, np.ndarray] | None = None,
+    ) -> SunnyTimeseries:
+        """Score a precomputed (cafes x times) sunny-fraction matrix with per-timestamp cloud cover."""
+        times = [_to_utc(dt) for dt in times]
+        if sun_positions is None:
+            if times:
+                sun_positions = get_sun_positions(SUN_REF_LAT, SUN_REF_LON, times)
+            else:
+                sun_positions = (np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+        cloud_cover = np.array(
+            [float(cloud_by_time.get(dt, default_cloud_cover_pct)) for dt in times],
+            dtype=np.float64,
+        )
+        weather_factor = 1.0 - np.clip(cloud_cover, 0.0, 100.0) / 100.0
+        return cls(
+            cafes=list(cafes),
+            times=times,
+            sunny_fraction=sunny_fraction,
+            sunny_score=np.round(100.0 * sunny_fraction * weather_factor[None, :], 1),
+            cloud_cover_pct=cloud_cover,
+            sun_azimuth_deg=sun_positions[0],
+            sun_elevation_deg=sun_positions[1],
+        )
+
+    @property
+    def geometry(self) -> SunnyGeometry:
+        return SunnyGeometry(
+            cafes=self.cafes,
+            times=self.times,
+            sunny_fraction=self.sunny_fraction,
+            sun_azimuth_deg=self.sun_azimuth_deg,
+            sun_elevation_deg=self.sun_elevation_deg,
+        )
+
+    def rescored(self, cloud_by_time: dict[datetime, float], default_cloud_cover_pct: float = 50.0) -> SunnyTimeseries:
+        """Same geometry under a new forecast; rows re-rank on the new scores."""
+        return self.geometry.score(cloud_by_time, default_cloud_cover_pct)
+
+    def subset(self, cafe_rows: Sequence[int]) -> SunnyTimeseries:
+        """The same run restricted to ``cafe_rows`` (in that order), e.g. one bbox of a larger batch."""
+        cafe_rows = np.asarray(cafe_rows, dtype=np.intp)
+        return replace(
+            self,
+            cafes=[self.cafes[row] for row in cafe_rows.tolist()],
+            sunny_fraction=self.sunny_fraction[cafe_rows],
+            sunny_score=self.sunny_score[cafe_rows],
+        )
+
+    def rows(self, slot: int, limit: int | None = None) -> list[dict]:
+        """Ranked result rows for one timestamp, shaped like ``compute_sunny_cafes`` output."""
+        sun_elevation_deg = float(self.sun_elevation_deg[slot])
+        daylight = sun_elevation_deg > MIN_SUN_ELEVATION
+        results = []
+        for cafe_idx, feature in enumerate(self.cafes):
+            props = feature.get("properties", {})
+            lon, lat = feature.get("geometry", {}).get("coordinates", [None, None])
+            if daylight and (lon is None or lat is None):
+                continue
+            sunny_fraction = float(self.sunny_fraction[cafe_idx, slot])
+            results.append(
+                {
+                    "osm_id": props.get("osm_id"),
+                    "name": props.get("name", "Unknown Cafe"),
+                    "lon": lon,
+                    "lat": lat,
+                    "sunny_score": float(self.sunny_score[cafe_idx, slot]),
+                    "sunny_fraction": round(sunny_fraction, 3),
+                    "in_shadow": sunny_fraction == 0.0,
+                    "sun_elevation_deg": round(sun_elevation_deg, 2),
+                    "sun_azimuth_deg": round(float(self.sun_azimuth_deg[slot]), 2),
+                    "cloud_cover_pct": round(float(self.cloud_cover_pct[slot]), 1),
+                }
+            )
+        if daylight:
+            results.sort(key=lambda r: (r["sunny_score"], r["sunny_fraction"], r["name"]), reverse=True)
+        return results[:limit] if limit else results
+
+
+@dataclass(frozen=True, slots=True)
+class SeatSunIntervals:
+    """
+    Direct-sun intervals of every seat of one cafe over ``[start_utc, end_utc)``.
+
+    ``seats[i]`` lists minute-aligned ``(start, end)`` UTC pairs during which seat
+    ``i`` has direct sun.
+    """
+
+    start_utc: datetime
+    end_utc: datetime
+    seats: list[list[tuple[datetime, datetime]]]
+
+    def fraction_segments(self) -> list[tuple[datetime, datetime, float]]:
+        """Cover the range with ``(start, end, sunny_fraction)`` pieces, split at every transition."""
+        edges = sorted({self.start_utc, self.end_utc, *(t for seat in self.seats for interval in seat for t in interval)})
+        n_seats = max(1, len(self.seats))
+        segments: list[tuple[datetime, datetime, float]] = []
+        for lo, hi in zip(edges, edges[1:]):
+            sunny = sum(any(start <= lo and hi <= end for start, end in seat) for seat in self.seats)
+            fraction = sunny / n_seats
+            if segments and segments[-1][2] == fraction:
+                segments[-1] = (segments[-1][0], hi, fraction)
+            else:
+                segments.append((lo, hi, fraction))
+        return segments
+
+    def fractions_at(self, times: Sequence[datetime]) -> np.ndarray:
+        """Sunny fraction at each of ``times`` as read off ``fraction_segments`` (0 outside the range)."""
+        segments = self.fraction_segments()
+        out = np.zeros(len(times), dtype=np.float64)
+        if not segments:
+            return out
+        starts = np.array([lo.timestamp() for lo, _, _ in segments])
+        ends = np.array([hi.timestamp() for _, hi, _ in segments])
+        fractions = np.array([fraction for _, _, fraction in segments])
+        moments = np.array([_to_utc(dt).timestamp() for dt in times], dtype=np.float64)
+        idx = np.searchsorted(starts, moments, side="right") - 1
+        inside = (idx >= 0) & (moments < ends[np.maximum(idx, 0)])
+        out[inside] = fractions[idx[inside]]
+        return out
 
 
 def _to_utc(dt: datetime) -> datetime:
@@ -44,12 +318,74 @@ def _to_utc(dt: datetime) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
+def get_sun_positions(lat: float, lon: float, times: Sequence[datetime]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return (azimuth_deg, elevation_deg) arrays for a WGS84 point and many timestamps.
+
+    NOAA solar position algorithm, vectorized over ``times``. Elevation includes the
+    same standard-atmosphere refraction correction as pysolar's ``get_altitude``.
+    """
+    unix_s = np.array([_to_utc(dt).timestamp() for dt in times], dtype=np.float64)
+    return _sun_positions_unix(lat, lon, unix_s)
+
+
+def _sun_positions_unix(lat: float, lon: float, unix_s: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """``get_sun_positions`` for POSIX timestamps (seconds)."""
+    julian_century = (unix_s / 86400.0 + 2440587.5 - 2451545.0) / 36525.0
+    jc = julian_century
+
+    mean_long = np.radians(np.mod(280.46646 + jc * (36000.76983 + jc * 0.0003032), 360.0))
+    mean_anom = np.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    eccentricity = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    center = (
+        np.sin(mean_anom) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + np.sin(2.0 * mean_anom) * (0.019993 - 0.000101 * jc)
+        + np.sin(3.0 * mean_anom) * 0.000289
+    )
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = mean_long + np.radians(center - 0.00569 - 0.00478 * np.sin(omega))
+    mean_obliquity = 23.0 + (26.0 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60.0) / 60.0
+    obliquity = np.radians(mean_obliquity + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_long))
+
+    y = np.tan(obliquity / 2.0) ** 2
+    equation_of_time_min = 4.0 * np.degrees(
+        y * np.sin(2.0 * mean_long)
+        - 2.0 * eccentricity * np.sin(mean_anom)
+        + 4.0 * eccentricity * y * np.sin(mean_anom) * np.cos(2.0 * mean_long)
+        - 0.5 * y * y * np.sin(4.0 * mean_long)
+        - 1.25 * eccentricity * eccentricity * np.sin(2.0 * mean_anom)
+    )
+    true_solar_min = np.mod(np.mod(unix_s, 86400.0) / 60.0 + equation_of_time_min + 4.0 * lon, 1440.0)
+    hour_angle = np.radians(true_solar_min / 4.0 - 180.0)
+
+    lat_rad = math.radians(lat)
+    cos_zenith = np.sin(lat_rad) * np.sin(declination) + np.cos(lat_rad) * np.cos(declination) * np.cos(hour_angle)
+    elevation = 90.0 - np.degrees(np.arccos(np.clip(cos_zenith, -1.0, 1.0)))
+    azimuth = np.mod(
+        np.degrees(
+            np.arctan2(
+                np.sin(hour_angle),
+                np.cos(hour_angle) * math.sin(lat_rad) - np.tan(declination) * math.cos(lat_rad),
+            )
+        )
+        + 180.0,
+        360.0,
+    )
+
+    # NREL SPA refraction at 1013.25 hPa / 15 C, skipped once the sun is fully set.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        refraction = (1013.25 / 1010.0) * (283.0 / 288.15) * 1.02 / (
+            60.0 * np.tan(np.radians(elevation + 10.3 / (elevation + 5.11)))
+        )
+    elevation = elevation + np.where(elevation >= -(0.26667 + 0.5667), refraction, 0.0)
+    return azimuth, elevation
+
+
 def get_sun_position(lat: float, lon: float, dt: datetime) -> tuple[float, float]:
     """Return (azimuth_deg, elevation_deg) for a WGS84 point and timestamp."""
-    dt_utc = _to_utc(dt)
-    elevation = float(get_altitude(lat, lon, dt_utc))
-    azimuth = (float(get_azimuth(lat, lon, dt_utc)) + 360.0) % 360.0
-    return azimuth, elevation
+    azimuth, elevation = get_sun_positions(lat, lon, [dt])
+    return float(azimuth[0]), float(elevation[0])
 
 
 def _azimuth_to_vector(azimuth_deg: float, length: float) -> tuple[float, float]:
@@ -70,16 +406,23 @@ def _iter_polygons(geom: Polygon | MultiPolygon) -> list[Polygon]:
     return []
 
 
+def _repair_polygon(poly: Polygon) -> Polygon | None:
+    """Largest polygon part of ``make_valid(poly)``, or None when nothing polygonal is left."""
+    repaired = make_valid(poly)
+    candidates = _iter_polygons(repaired) if repaired.geom_type in ("Polygon", "MultiPolygon") else []
+    if not candidates:
+        return None
+    return max(candidates, key=lambda p: p.area)
+
+
 def _shadow_for_polygon(poly: Polygon, dx: float, dy: float):
     """
     Create a shadow volume in 2D by bridging each exterior edge to its projected edge.
     """
     if not poly.is_valid:
-        repaired = make_valid(poly)
-        candidates = _iter_polygons(repaired) if repaired.geom_type in ("Polygon", "MultiPolygon") else []
-        if not candidates:
+        poly = _repair_polygon(poly)
+        if poly is None:
             return None
-        poly = max(candidates, key=lambda p: p.area)
 
     shifted = translate(poly, xoff=dx, yoff=dy)
     pieces = [poly, shifted]
@@ -136,7 +479,7 @@ def project_shadow(
     pieces = []
     for poly in _iter_polygons(building_geom):
         shadow = _shadow_for_polygon(poly, dx, dy)
-        if not shadow.is_empty:
+        if shadow is not None and not shadow.is_empty:
             pieces.append(shadow)
 
     if not pieces:
@@ -146,12 +489,319 @@ def project_shadow(
     return unary_union(pieces)
 
 
-def build_building_index(buildings: list[dict[str, Any]]) -> dict[str, Any]:
+class ShadowLayer:
+    """
+    City-wide shadow coverage for one sun position.
+
+    Holds every shadow piece (footprint, translated footprint, edge quads) in an
+    STRtree, so all seats of a slot are answered with one batched point query
+    instead of unioning the pieces.
+    """
+
+    __slots__ = ("pieces", "tree", "nbytes")
+
+    def __init__(self, pieces: np.ndarray):
+        self.pieces = pieces
+        self.tree = STRtree(pieces) if len(pieces) else None
+        self.nbytes = 200 * len(pieces) + 16 * int(shapely.get_num_coordinates(pieces).sum())
+
+    def shaded_xy(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Boolean mask of UTM points covered by any shadow piece."""
+        shaded = np.zeros(len(xs), dtype=bool)
+        if self.tree is None or len(xs) == 0:
+            return shaded
+        point_idx, _ = self.tree.query(shapely.points(xs, ys), predicate="intersects")
+        shaded[point_idx] = True
+        return shaded
+
+
+def build_shadow_layer(
+    building_index: BuildingIndex,
+    sun_azimuth_deg: float,
+    sun_elevation_deg: float,
+) -> ShadowLayer:
+    """
+    Build the shadow pieces of every indexed building at once.
+
+    Produces the same pieces as ``project_shadow`` (minus the per-building union),
+    constructed with vectorized Shapely calls: zero-height buildings cast nothing
+    and invalid parts are replaced by their largest valid polygon first.
+    """
+    geometries = building_index.geometries
+    if sun_elevation_deg <= MIN_SUN_ELEVATION or len(geometries) == 0:
+        return ShadowLayer(np.empty(0, dtype=object))
+
+    tan_elevation = math.tan(math.radians(sun_elevation_deg))
+    lengths = np.minimum(MAX_SHADOW_LENGTH, building_index.heights / tan_elevation)
+    shadow_azimuth = math.radians((sun_azimuth_deg + 180.0) % 360.0)
+    offsets = np.column_stack([math.sin(shadow_azimuth) * lengths, math.cos(shadow_azimuth) * lengths])
+
+    polygons, owner = shapely.get_parts(geometries, return_index=True)
+    keep = ~shapely.is_empty(polygons) & (building_index.heights[owner] > 0)
+    polygons, owner = polygons[keep], owner[keep]
+    invalid = np.flatnonzero(~shapely.is_valid(polygons))
+    if len(invalid):
+        polygons[invalid] = [_repair_polygon(poly) for poly in polygons[invalid]]
+        repaired = ~shapely.is_missing(polygons)
+        polygons, owner = polygons[repaired], owner[repaired]
+    per_coord_offsets = np.repeat(offsets[owner], shapely.get_num_coordinates(polygons), axis=0)
+    shifted = shapely.transform(polygons, lambda coords: coords + per_coord_offsets)
+
+    ring_coords, ring_idx = shapely.get_coordinates(shapely.get_exterior_ring(polygons), return_index=True)
+    same_ring = ring_idx[:-1] == ring_idx[1:]
+    p1 = ring_coords[:-1][same_ring]
+    p2 = ring_coords[1:][same_ring]
+    edge_offsets = offsets[owner[ring_idx[:-1][same_ring]]]
+    quads = shapely.polygons(np.stack([p1, p2, p2 + edge_offsets, p1 + edge_offsets, p1], axis=1))
+    quads = quads[shapely.is_valid(quads) & ~shapely.is_empty(quads)]
+
+    return ShadowLayer(np.concatenate([polygons, shifted, quads]))
+
+
+class ShadowCache:
     """
-    Build a spatial index bundle once at startup and reuse for every request.
+    Process-wide, byte-bounded LRU of projected building shadows.
+
+    Entries are keyed by ``(index_id, building index, azimuth bucket, elevation
+    bucket)``. Shadows are projected for the bucket center, so every request that
+    falls into the same bucket reuses the same polygon.
+    """
+
+    __slots__ = (
+        "max_bytes",
+        "azimuth_step_deg",
+        "elevation_step_deg",
+        "_entries",
+        "_bytes",
+        "_lock",
+        "hits",
+        "misses",
+        "evictions",
+    )
+
+    def __init__(
+        self,
+        max_bytes: int = SHADOW_CACHE_MAX_BYTES,
+        azimuth_step_deg: float = SHADOW_CACHE_AZIMUTH_STEP_DEG,
+        elevation_step_deg: float = SHADOW_CACHE_ELEVATION_STEP_DEG,
+    ):
+        self.max_bytes = int(max_bytes)
+        self.azimuth_step_deg = float(azimuth_step_deg)
+        self.elevation_step_deg = float(elevation_step_deg)
+        self._entries: OrderedDict[tuple, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, sun_azimuth_deg: float, sun_elevation_deg: float) -> tuple[int, int]:
+        return (
+            int(math.floor((sun_azimuth_deg % 360.0) / self.azimuth_step_deg)),
+            int(math.floor(sun_elevation_deg / self.elevation_step_deg)),
+        )
+
+    def bucket_center(self, bucket: tuple[int, int]) -> tuple[float, float]:
+        return (
+            (bucket[0] + 0.5) * self.azimuth_step_deg,
+            (bucket[1] + 0.5) * self.elevation_step_deg,
+        )
+
+    def get_or_project(
+        self,
+        building_index: BuildingIndex,
+        idx: int,
+        sun_azimuth_deg: float,
+        sun_elevation_deg: float,
+    ):
+        bucket = self.quantize(sun_azimuth_deg, sun_elevation_deg)
+        key = (building_index.index_id, idx, *bucket)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        shadow = project_shadow(
+            building_index.geometries[idx],
+            float(building_index.heights[idx]),
+            *self.bucket_center(bucket),
+        )
+        self._store(key, shadow, _geometry_nbytes(shadow))
+        return shadow
+
+    def get_or_build_layer(
+        self,
+        building_index: BuildingIndex,
+        sun_azimuth_deg: float,
+        sun_elevation_deg: float,
+    ) -> ShadowLayer:
+        """City-wide ShadowLayer for the sun bucket, sharing the byte budget."""
+        bucket = self.quantize(sun_azimuth_deg, sun_elevation_deg)
+        key = (building_index.index_id, "layer", *bucket)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        layer = build_shadow_layer(building_index, *self.bucket_center(bucket))
+        self._store(key, layer, layer.nbytes)
+        return layer
+
+    def get_or_compute_geometry(self, building_index: BuildingIndex, key: tuple, compute) -> SunnyGeometry:
+        """Cached ``SunnyGeometry`` for ``key`` (shade mode, cafes, times), sharing the byte budget."""
+        key = (building_index.index_id, "geometry", *key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        geometry = compute()
+        self._store(key, geometry, geometry.nbytes)
+        return geometry
+
+    def _store(self, key: tuple, value: Any, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "azimuth_step_deg": self.azimuth_step_deg,
+                "elevation_step_deg": self.elevation_step_deg,
+            }
+
+
+def _geometry_nbytes(geom) -> int:
+    """Rough in-memory size of a cached geometry (coordinates plus object overhead)."""
+    if geom is None:
+        return 64
+    return 200 + 16 * int(shapely.get_num_coordinates(geom))
+
+
+SHADOW_CACHE = ShadowCache()
+
+
+class BuildingIndex:
+    """
+    Columnar building store plus its STRtree, built once and shared by every request.
+
+    Row ``i`` of every column describes the same building, and STRtree query
+    results index the columns directly.
+    """
+
+    __slots__ = (
+        "index_id",
+        "geometries",
+        "heights",
+        "bounds",
+        "centroids",
+        "source_codes",
+        "source_names",
+        "osm_ids",
+        "tree",
+        "max_height_m",
+        "seat_candidates",
+        "fingerprint",
+    )
+
+    def __init__(
+        self,
+        geometries: np.ndarray,
+        heights: np.ndarray,
+        osm_ids: np.ndarray,
+        source_codes: np.ndarray,
+        source_names: Sequence[str],
+        bounds: np.ndarray | None = None,
+    ):
+        self.index_id = next(_INDEX_IDS)
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.heights = np.asarray(heights, dtype=np.float32)
+        self.osm_ids = np.asarray(osm_ids, dtype=np.int64)
+        self.source_codes = np.asarray(source_codes, dtype=np.uint16)
+        self.source_names = tuple(source_names)
+        self.bounds = (
+            shapely.bounds(self.geometries).reshape(-1, 4)
+            if bounds is None
+            else np.asarray(bounds, dtype=np.float64)
+        )
+        self.centroids = shapely.get_coordinates(shapely.centroid(self.geometries)).reshape(-1, 2)
+        self.tree = STRtree(self.geometries) if len(self.geometries) else None
+        self.max_height_m = float(self.heights.max()) if len(self.heights) else 20.0
+        self.seat_candidates: SeatCandidates | None = None
+        # Content fingerprint; see ``building_artifact.buildings_fingerprint``.
+        self.fingerprint: str | None = None
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def osm_id(self, idx: int) -> int | None:
+        value = int(self.osm_ids[idx])
+        return None if value < 0 else value
+
+    def height_source(self, idx: int) -> str:
+        return self.source_names[int(self.source_codes[idx])]
+
+    def memory_report(self) -> dict[str, int]:
+        """Approximate bytes held per column (geometry size estimated from coordinates)."""
+        report = {
+            "rows": len(self),
+            "heights": int(self.heights.nbytes),
+            "bounds": int(self.bounds.nbytes),
+            "centroids": int(self.centroids.nbytes),
+            "source_codes": int(self.source_codes.nbytes),
+            "osm_ids": int(self.osm_ids.nbytes),
+            "geometry_refs": int(self.geometries.nbytes),
+            "geometry_coords": 16 * int(shapely.get_num_coordinates(self.geometries).sum()),
+            "seat_candidates": self.seat_candidates.nbytes if self.seat_candidates is not None else 0,
+        }
+        report["total"] = sum(value for key, value in report.items() if key != "rows")
+        return report
+
+
+def build_building_index(
+    buildings: list[dict[str, Any]],
+    cafes: list[dict] | None = None,
+) -> BuildingIndex:
+    """
+    Build a spatial index once at startup and reuse for every request.
+
+    When ``cafes`` is given, per-seat candidate lists are precomputed as well so
+    requests can use ``candidate_mode="static"``.
     """
-    records: list[BuildingRecord] = []
     geometries = []
+    heights: list[float] = []
+    osm_ids: list[int] = []
+    source_codes: list[int] = []
+    source_names: dict[str, int] = {}
 
     for item in buildings:
         geom = item.get("geom_utm") or item.get("geometry_utm") or item.get("geometry")
@@ -164,44 +814,312 @@ def build_building_index(buildings: list[dict[str, Any]]) -> dict[str, Any]:
         if height <= 0:
             continue
 
-        records.append(
-            BuildingRecord(
-                geom_utm=geom,
-                height_m=height,
-                osm_id=item.get("osm_id"),
-                height_source=item.get("height_source", "unknown"),
-            )
-        )
+        osm_id = item.get("osm_id")
+        source = item.get("height_source", "unknown")
         geometries.append(geom)
+        heights.append(height)
+        osm_ids.append(int(osm_id) if osm_id is not None else -1)
+        source_codes.append(source_names.setdefault(source, len(source_names)))
 
-    index = STRtree(geometries) if geometries else None
-    id_map = {id(g): idx for idx, g in enumerate(geometries)}
-    max_height = max((rec.height_m for rec in records), default=20.0)
+    if len(source_names) > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"Too many distinct height sources ({len(source_names)}) for uint16 source codes")
 
-    return {
-        "records": records,
-        "geometries": geometries,
-        "index": index,
-        "id_map": id_map,
-        "max_height_m": max_height,
-    }
+    building_index = BuildingIndex(
+        geometries=np.array(geometries, dtype=object),
+        heights=np.array(heights, dtype=np.float32),
+        osm_ids=np.array(osm_ids, dtype=np.int64),
+        source_codes=np.array(source_codes, dtype=np.uint16),
+        source_names=list(source_names),
+    )
+    if cafes is not None:
+        building_index.seat_candidates = build_seat_candidates(cafes, building_index)
+    return building_index
 
 
-def _query_candidate_indices(index_bundle: dict[str, Any], search_area) -> list[int]:
-    tree = index_bundle.get("index")
+def _ensure_building_index(buildings: list[dict] | BuildingIndex) -> BuildingIndex:
+    if isinstance(buildings, BuildingIndex):
+        return buildings
+    return build_building_index(buildings)
+
+
+def build_seat_candidates(cafes: list[dict], building_index: BuildingIndex) -> SeatCandidates:
+    """
+    Precompute, for every cafe seat, the buildings that could ever shade it.
+
+    Seats only move when the cafe file changes, so this runs at index build time.
+    """
+    xs, ys, owners = _seat_utm_coords(cafes)
+    n_seats = len(xs)
+    seat_rows = _seat_row_lookup(cafes, owners)
+
+    tree = building_index.tree
+    if tree is None or n_seats == 0:
+        seat_idx = np.empty(0, dtype=np.intp)
+        building_idx = np.empty(0, dtype=np.intp)
+    else:
+        seats = shapely.points(xs, ys)
+        seat_idx, building_idx = tree.query(
+            seats,
+            predicate="dwithin",
+            distance=MAX_SHADOW_LENGTH + SEARCH_PADDING_M,
+        )
+    geometries = building_index.geometries
+    distances = shapely.distance(shapely.points(xs[seat_idx], ys[seat_idx]), geometries[building_idx])
+
+    order = np.lexsort((distances, seat_idx))
+    seat_idx = seat_idx[order]
+    building_idx = building_idx[order]
+    distances = distances[order]
+
+    # Bearing interval of each footprint envelope as seen from its seat.
+    bounds = building_index.bounds[building_idx]
+    corner_x = bounds[:, [0, 2, 2, 0]] - xs[seat_idx][:, None]
+    corner_y = bounds[:, [1, 1, 3, 3]] - ys[seat_idx][:, None]
+    corner_az = np.degrees(np.arctan2(corner_x, corner_y))
+    center_az = np.degrees(
+        np.arctan2(
+            (bounds[:, 0] + bounds[:, 2]) / 2.0 - xs[seat_idx],
+            (bounds[:, 1] + bounds[:, 3]) / 2.0 - ys[seat_idx],
+        )
+    )
+    relative = np.mod(corner_az - center_az[:, None] + 180.0, 360.0) - 180.0
+    azimuth_lo = np.mod(center_az + relative.min(axis=1), 360.0)
+    azimuth_span = relative.max(axis=1) - relative.min(axis=1)
+    inside = (
+        (bounds[:, 0] <= xs[seat_idx])
+        & (xs[seat_idx] <= bounds[:, 2])
+        & (bounds[:, 1] <= ys[seat_idx])
+        & (ys[seat_idx] <= bounds[:, 3])
+    )
+    azimuth_span[inside] = 360.0
+
+    offsets = np.zeros(n_seats + 1, dtype=np.int64)
+    np.cumsum(np.bincount(seat_idx, minlength=n_seats), out=offsets[1:])
+    return SeatCandidates(
+        offsets=offsets,
+        building_idx=building_idx.astype(np.int32),
+        distances=distances.astype(np.float32),
+        azimuth_lo=azimuth_lo.astype(np.float32),
+        azimuth_span=azimuth_span.astype(np.float32),
+        seat_rows=seat_rows,
+    )
+
+
+def _query_candidate_indices(building_index: BuildingIndex, search_area) -> np.ndarray:
+    tree = building_index.tree
     if tree is None:
-        return []
+        return np.empty(0, dtype=np.intp)
+    return tree.query(search_area)
 
-    result = tree.query(search_area)
-    if len(result) == 0:
-        return []
 
-    first = result[0]
-    if isinstance(first, (int, np.integer)):
-        return [int(i) for i in result]
+def _sun_corridor(seat_point: Point, sun_azimuth_deg: float, length: float) -> Polygon:
+    """
+    Thin search rectangle running from the seat toward the sun.
+
+    A prism shades a point only if the ray from that point toward the sun crosses
+    its footprint, so the corridor needs no more width than the search padding.
+    """
+    dx, dy = _azimuth_to_vector(sun_azimuth_deg, length)
+    ray = LineString([(seat_point.x, seat_point.y), (seat_point.x + dx, seat_point.y + dy)])
+    return ray.buffer(SEARCH_PADDING_M, cap_style="square")
+
+
+def _candidate_search_area(
+    seat_point: Point,
+    candidate_mode: str,
+    sun_azimuth_deg: float,
+    max_shadow_search: float,
+):
+    if candidate_mode == "corridor":
+        return _sun_corridor(seat_point, sun_azimuth_deg, max_shadow_search)
+    return seat_point.buffer(max_shadow_search + SEARCH_PADDING_M)
+
+
+def _prune_candidates(
+    building_index: BuildingIndex,
+    seat_point: Point,
+    candidate_indices,
+    tan_elevation: float,
+    distances: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Drop buildings that cannot reach the seat and order the rest by blocking odds.
+
+    A building shades a seat only if ``height_m >= distance * tan(elevation)``
+    (and the distance is under the shadow length cap), where ``distance`` is the
+    nearest footprint distance. Survivors are sorted by ``height / distance`` so
+    the first-shade ``break`` triggers early.
+    """
+    idx = np.asarray(candidate_indices, dtype=np.intp)
+    if len(idx) == 0:
+        return idx
+    if distances is None:
+        distances = shapely.distance(seat_point, building_index.geometries[idx])
+    # Small slack keeps float32 precomputed distances conservative.
+    distances = np.maximum(0.0, np.asarray(distances, dtype=np.float64) - 1e-3)
+    heights = building_index.heights[idx]
+    reachable = (heights >= distances * tan_elevation) & (distances <= MAX_SHADOW_LENGTH)
+    idx, heights, distances = idx[reachable], heights[reachable], distances[reachable]
+    with np.errstate(divide="ignore"):
+        blocking_ratio = heights / distances
+    return idx[np.argsort(-blocking_ratio, kind="stable")]
+
+
+def _polygon_shaded(
+    building_index: BuildingIndex,
+    seat_point: Point,
+    candidate_indices: list[int],
+    shadow_cache: dict[int, Any],
+    sun_azimuth_deg: float,
+    sun_elevation_deg: float,
+    shared_cache: ShadowCache | None = None,
+) -> bool:
+    for idx in candidate_indices:
+        idx = int(idx)
+        if idx in shadow_cache:
+            shadow_poly = shadow_cache[idx]
+        elif shared_cache is not None:
+            shadow_poly = shared_cache.get_or_project(building_index, idx, sun_azimuth_deg, sun_elevation_deg)
+            shadow_cache[idx] = shadow_poly
+        else:
+            shadow_poly = project_shadow(
+                building_index.geometries[idx],
+                float(building_index.heights[idx]),
+                sun_azimuth_deg,
+                sun_elevation_deg,
+            )
+            shadow_cache[idx] = shadow_poly
+
+        if shadow_poly is not None and shadow_poly.covers(seat_point):
+            return True
+    return False
+
+
+def _raycast_shaded(
+    building_index: BuildingIndex,
+    seat_point: Point,
+    candidate_indices: list[int],
+    sun_azimuth_deg: float,
+    tan_elevation: float,
+) -> bool:
+    """
+    Point-in-shadow test without building shadow polygons.
+
+    The seat is shaded when the ray toward the sun enters a footprint at a distance
+    where the ray is still below the building top (and within the shadow length cap).
+    """
+    if len(candidate_indices) == 0:
+        return False
+
+    idx = np.asarray(candidate_indices, dtype=np.intp)
+    heights = building_index.heights[idx]
+    reach = np.minimum(MAX_SHADOW_LENGTH, heights / tan_elevation)
+    dx, dy = _azimuth_to_vector(sun_azimuth_deg, float(reach.max()) + SEARCH_PADDING_M)
+    ray = LineString([(seat_point.x, seat_point.y), (seat_point.x + dx, seat_point.y + dy)])
 
-    id_map = index_bundle.get("id_map", {})
-    return [id_map[id(g)] for g in result if id(g) in id_map]
+    hits = shapely.intersection(ray, building_index.geometries[idx])
+    # Empty intersections yield NaN distances, which never compare as shaded.
+    hit_distance = shapely.distance(seat_point, hits)
+    return bool(np.any(hit_distance <= reach))
+
+
+def _seat_horizon(
+    building_index: BuildingIndex,
+    seat_x: float,
+    seat_y: float,
+    bin_deg: float,
+) -> np.ndarray:
+    """Max blocking elevation per azimuth bin, from one ray per bin center."""
+    n_bins = int(round(360.0 / bin_deg))
+    horizon = np.zeros(n_bins, dtype=np.float32)
+    tree = building_index.tree
+    if tree is None:
+        return horizon
+
+    centers = np.radians((np.arange(n_bins) + 0.5) * bin_deg)
+    ray_length = MAX_SHADOW_LENGTH + SEARCH_PADDING_M
+    coords = np.empty((n_bins, 2, 2), dtype=np.float64)
+    coords[:, 0, 0] = seat_x
+    coords[:, 0, 1] = seat_y
+    coords[:, 1, 0] = seat_x + np.sin(centers) * ray_length
+    coords[:, 1, 1] = seat_y + np.cos(centers) * ray_length
+    rays = shapely.linestrings(coords)
+
+    ray_idx, building_idx = tree.query(rays, predicate="intersects")
+    if len(ray_idx) == 0:
+        return horizon
+
+    hits = shapely.intersection(rays[ray_idx], building_index.geometries[building_idx])
+    hit_distance = shapely.distance(shapely.points(seat_x, seat_y), hits)
+    within = hit_distance <= MAX_SHADOW_LENGTH
+    elevation = np.degrees(
+        np.arctan2(building_index.heights[building_idx[within]], hit_distance[within])
+    )
+    np.maximum.at(horizon, ray_idx[within], elevation.astype(np.float32))
+    return horizon
+
+
+def build_horizon_profiles(
+    cafes: list[dict],
+    buildings: list[dict] | BuildingIndex,
+    bin_deg: float = HORIZON_BIN_DEG,
+) -> HorizonProfiles:
+    """
+    Precompute seat obstruction horizons once; shade tests then become lookups.
+
+    Buildings and seats are static, so the result is valid for every timestamp.
+    """
+    building_index = _ensure_building_index(buildings)
+    n_bins = int(round(360.0 / bin_deg))
+    n_seats = len(_candidate_seating_points(0.0, 0.0))
+    horizons = np.zeros((len(cafes), n_seats, n_bins), dtype=np.float32)
+
+    for cafe_idx, feature in enumerate(cafes):
+        lon, lat = feature.get("geometry", {}).get("coordinates", [None, None])
+        if lon is None or lat is None:
+            continue
+        for seat_idx, (seat_lon, seat_lat) in enumerate(_candidate_seating_points(lon, lat)):
+            x, y = TO_UTM.transform(seat_lon, seat_lat)
+            horizons[cafe_idx, seat_idx] = _seat_horizon(building_index, x, y, bin_deg)
+
+    return HorizonProfiles(bin_deg=bin_deg, horizons=horizons)
+
+
+def _seat_utm_coords(cafes: list[dict]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """UTM x/y of every candidate seat plus the position of its cafe in ``cafes``."""
+    seat_lons: list[float] = []
+    seat_lats: list[float] = []
+    owners: list[int] = []
+    for cafe_idx, feature in enumerate(cafes):
+        lon, lat = feature.get("geometry", {}).get("coordinates", [None, None])
+        if lon is None or lat is None:
+            continue
+        for seat_lon, seat_lat in _candidate_seating_points(lon, lat):
+            seat_lons.append(seat_lon)
+            seat_lats.append(seat_lat)
+            owners.append(cafe_idx)
+    if not owners:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.intp)
+    xs, ys = TO_UTM.transform(np.asarray(seat_lons), np.asarray(seat_lats))
+    return np.asarray(xs), np.asarray(ys), np.asarray(owners, dtype=np.intp)
+
+
+def _seat_row_lookup(cafes: list[dict], owners: np.ndarray) -> dict[tuple[float, float], int]:
+    """Map each cafe's (lon, lat) to the row of its first seat."""
+    seat_rows: dict[tuple[float, float], int] = {}
+    for row, cafe_idx in enumerate(owners):
+        lon, lat = cafes[cafe_idx]["geometry"]["coordinates"][:2]
+        seat_rows.setdefault((lon, lat), row)
+    return seat_rows
+
+
+def _layer_sunny_counts(layer: ShadowLayer, cafes: list[dict]) -> np.ndarray:
+    xs, ys, owners = _seat_utm_coords(cafes)
+    sunny = ~layer.shaded_xy(xs, ys)
+    counts = np.zeros(len(cafes), dtype=np.intp)
+    np.add.at(counts, owners[sunny], 1)
+    return counts
 
 
 def _candidate_seating_points(cafe_lon: float, cafe_lat: float) -> list[tuple[float, float]]:
@@ -227,24 +1145,40 @@ def _cloud_factor(cloud_cover_pct: float) -> float:
 
 def compute_sunny_cafes(
     cafes: list[dict],
-    buildings: list[dict] | dict[str, Any],
+    buildings: list[dict] | BuildingIndex,
     dt: datetime,
     cloud_cover_pct: float,
     limit: int | None = 200,
+    candidate_mode: str = "corridor",
+    shade_mode: str = "polygon",
+    horizons: HorizonProfiles | None = None,
+    sun_position: tuple[float, float] | None = None,
+    shared_shadow_cache: ShadowCache | None = None,
 ) -> list[dict]:
     """
     Rank cafes by direct sun score (geometry x weather).
+
+    ``candidate_mode`` selects how occluder candidates are pulled from the STRtree
+    (see ``CANDIDATE_MODES``); both modes produce identical scores. ``shade_mode``
+    selects the point-in-shadow test (see ``SHADE_MODES``). In "horizon" mode pass
+    ``horizons`` built for the same cafe list to reuse them across timestamps.
+    ``sun_position`` lets callers pass an (azimuth, elevation) pair from a batched
+    ``get_sun_positions`` call instead of computing it here. Passing a
+    ``shared_shadow_cache`` (usually ``SHADOW_CACHE``) reuses polygon-mode shadows
+    across calls at the cache's sun quantization, including "layer" mode layers.
     """
+    if candidate_mode not in CANDIDATE_MODES:
+        raise ValueError(f"Unknown candidate_mode '{candidate_mode}'. Choices: {', '.join(CANDIDATE_MODES)}")
+    if shade_mode not in SHADE_MODES:
+        raise ValueError(f"Unknown shade_mode '{shade_mode}'. Choices: {', '.join(SHADE_MODES)}")
     if not cafes:
         return []
 
-    index_bundle = buildings if isinstance(buildings, dict) and "index" in buildings else build_building_index(buildings)  # type: ignore[arg-type]
-    records: list[BuildingRecord] = index_bundle.get("records", [])
+    building_index = _ensure_building_index(buildings)
 
-    dt_utc = _to_utc(dt)
-    # Copenhagen-scale requests can share one sun position without meaningful loss.
-    ref_lon, ref_lat = 12.568, 55.676
-    sun_azimuth_deg, sun_elevation_deg = get_sun_position(ref_lat, ref_lon, dt_utc)
+    if sun_position is None:
+        sun_position = get_sun_position(SUN_REF_LAT, SUN_REF_LON, dt)
+    sun_azimuth_deg, sun_elevation_deg = float(sun_position[0]), float(sun_position[1])
 
     weather_factor = _cloud_factor(cloud_cover_pct)
     results = []
@@ -271,11 +1205,25 @@ def compute_sunny_cafes(
         return results[:limit] if limit else results
 
     tan_elevation = math.tan(math.radians(sun_elevation_deg))
-    max_height_m = float(index_bundle.get("max_height_m", 20.0))
+    max_height_m = building_index.max_height_m
     max_shadow_search = min(MAX_SHADOW_LENGTH, max_height_m / tan_elevation) if tan_elevation > 0 else MAX_SHADOW_LENGTH
 
+    if shade_mode == "horizon" and horizons is None:
+        horizons = build_horizon_profiles(cafes, building_index)
+
+    layer_sunny_counts = None
+    if shade_mode == "layer":
+        if shared_shadow_cache is not None:
+            layer = shared_shadow_cache.get_or_build_layer(building_index, sun_azimuth_deg, sun_elevation_deg)
+        else:
+            layer = build_shadow_layer(building_index, sun_azimuth_deg, sun_elevation_deg)
+        layer_sunny_counts = _layer_sunny_counts(layer, cafes)
+
+    # Cafes missing from the precomputed lists fall back to a corridor query.
+    seat_candidates = building_index.seat_candidates if candidate_mode == "static" else None
+
     shadow_cache: dict[int, Any] = {}
-    for feature in cafes:
+    for cafe_idx, feature in enumerate(cafes):
         props = feature.get("properties", {})
         geom = feature.get("geometry", {})
         lon, lat = geom.get("coordinates", [None, None])
@@ -283,34 +1231,61 @@ def compute_sunny_cafes(
             continue
 
         seating_points_lonlat = _candidate_seating_points(lon, lat)
-        sunny_count = 0
 
-        for seat_lon, seat_lat in seating_points_lonlat:
-            x, y = TO_UTM.transform(seat_lon, seat_lat)
-            seat_point = Point(x, y)
-            search_area = seat_point.buffer(max_shadow_search + 3.0)
-            candidate_indices = _query_candidate_indices(index_bundle, search_area)
-
-            shaded = False
-            for idx in candidate_indices:
-                if idx in shadow_cache:
-                    shadow_poly = shadow_cache[idx]
+        if shade_mode == "horizon":
+            sunny_count = int(horizons.sunny_seats(cafe_idx, sun_azimuth_deg, sun_elevation_deg).sum())
+        elif layer_sunny_counts is not None:
+            sunny_count = int(layer_sunny_counts[cafe_idx])
+        else:
+            sunny_count = 0
+            first_seat_row = seat_candidates.first_row(lon, lat) if seat_candidates is not None else None
+            for seat_idx, (seat_lon, seat_lat) in enumerate(seating_points_lonlat):
+                x, y = TO_UTM.transform(seat_lon, seat_lat)
+                seat_point = Point(x, y)
+                candidate_distances = None
+                if first_seat_row is not None:
+                    candidate_indices, candidate_distances = seat_candidates.for_seat(
+                        first_seat_row + seat_idx,
+                        max_shadow_search + SEARCH_PADDING_M,
+                        sun_azimuth_deg,
+                    )
                 else:
-                    rec = records[idx]
-                    shadow_poly = project_shadow(
-                        rec.geom_utm,
-                        rec.height_m,
+                    search_area = _candidate_search_area(
+                        seat_point,
+                        "disc" if candidate_mode == "disc" else "corridor",
                         sun_azimuth_deg,
-                        sun_elevation_deg,
+                        max_shadow_search,
                     )
-                    shadow_cache[idx] = shadow_poly
+                    candidate_indices = _query_candidate_indices(building_index, search_area)
+                candidate_indices = _prune_candidates(
+                    building_index,
+                    seat_point,
+                    candidate_indices,
+                    tan_elevation,
+                    candidate_distances,
+                )
 
-                if shadow_poly is not None and shadow_poly.covers(seat_point):
-                    shaded = True
-                    break
+                if shade_mode == "raycast":
+                    shaded = _raycast_shaded(
+                        building_index,
+                        seat_point,
+                        candidate_indices,
+                        sun_azimuth_deg,
+                        tan_elevation,
+                    )
+                else:
+                    shaded = _polygon_shaded(
+                        building_index,
+                        seat_point,
+                        candidate_indices,
+                        shadow_cache,
+                        sun_azimuth_deg,
+                        sun_elevation_deg,
+                        shared_cache=shared_shadow_cache,
+                    )
 
-            if not shaded:
-                sunny_count += 1
+                if not shaded:
+                    sunny_count += 1
 
         sunny_fraction = sunny_count / max(1, len(seating_points_lonlat))
         sunny_score = round(100.0 * sunny_fraction * weather_factor, 1)
@@ -334,3 +1309,376 @@ def compute_sunny_cafes(
     if limit:
         return results[:limit]
     return results
+
+
+def compute_sunny_timeseries(
+    cafes: list[dict],
+    buildings: list[dict] | BuildingIndex,
+    times: Sequence[datetime],
+    cloud_by_time: dict[datetime, float],
+    shade_mode: str = "polygon",
+    horizons: HorizonProfiles | None = None,
+    shared_shadow_cache: ShadowCache | None = None,
+    default_cloud_cover_pct: float = 50.0,
+) -> SunnyTimeseries:
+    """
+    Score ``cafes`` at every timestamp in ``times`` in one pass.
+
+    Everything that does not depend on the sun (seat positions, candidate lists,
+    horizons) is computed once and shared by all timestamps, and sun positions
+    come from a single batched ephemeris call. Timestamps missing from
+    ``cloud_by_time`` use ``default_cloud_cover_pct``. Scores at each timestamp
+    equal ``compute_sunny_cafes`` with the same ``shade_mode``.
+
+    With a ``shared_shadow_cache`` the geometry (``compute_sunny_geometry``) is
+    cached too, so a repeat call with a new forecast only re-applies the weather.
+    """
+    return compute_sunny_geometry(
+        cafes,
+        buildings,
+        times,
+        shade_mode=shade_mode,
+        horizons=horizons,
+        shared_shadow_cache=shared_shadow_cache,
+    ).score(cloud_by_time, default_cloud_cover_pct)
+
+
+def compute_sunny_geometry(
+    cafes: list[dict],
+    buildings: list[dict] | BuildingIndex,
+    times: Sequence[datetime],
+    shade_mode: str = "polygon",
+    horizons: HorizonProfiles | None = None,
+    shared_shadow_cache: ShadowCache | None = None,
+) -> SunnyGeometry:
+    """
+    Seat sun shares of ``cafes`` at every timestamp, without weather.
+
+    ``shared_shadow_cache`` also memoizes the result, keyed by shade mode, seat
+    positions and timestamps.
+    """
+    if shade_mode not in SHADE_MODES:
+        raise ValueError(f"Unknown shade_mode '{shade_mode}'. Choices: {', '.join(SHADE_MODES)}")
+
+    building_index = _ensure_building_index(buildings)
+    times = [_to_utc(dt) for dt in times]
+    xs, ys, owners = _seat_utm_coords(cafes)
+
+    def compute() -> SunnyGeometry:
+        return _sunny_geometry(cafes, building_index, times, xs, ys, owners, shade_mode, horizons, shared_shadow_cache)
+
+    if shared_shadow_cache is None:
+        return compute()
+    key = (
+        shade_mode,
+        None if horizons is None else horizons.bin_deg,
+        len(cafes),
+        _seat_key(xs, ys, owners),
+        tuple(dt.timestamp() for dt in times),
+    )
+    geometry = shared_shadow_cache.get_or_compute_geometry(building_index, key, compute)
+    # The key only covers seat positions, so hand back the caller's own feature dicts.
+    return replace(geometry, cafes=list(cafes))
+
+
+def nearest_sunny_cafes(
+    candidates: Iterable[tuple[dict, float]],
+    buildings: list[dict] | BuildingIndex,
+    dt: datetime,
+    cloud_cover_pct: float,
+    k: int,
+    min_sunny_fraction: float = 0.0,
+    shade_mode: str = "polygon",
+    shared_shadow_cache: ShadowCache | None = None,
+    score_batch: Callable[[list[dict]], SunnyTimeseries] | None = None,
+) -> list[dict]:
+    """
+    The ``k`` nearest cafes with seats in direct sun at ``dt``, nearest first.
+
+    ``candidates`` yields (feature, distance in metres) in increasing distance,
+    e.g. ``CafeIndex.iter_nearest``. It is consumed batch by batch and only
+    until ``k`` cafes with a sunny fraction above zero and at least
+    ``min_sunny_fraction`` are found, so the cost follows ``k`` and how sunny
+    the neighbourhood is, not the size of the city. Rows are shaped like
+    ``compute_sunny_cafes`` output plus ``distance_m``. ``score_batch`` replaces
+    the engine for scoring a batch at ``dt`` (the API passes the sun atlas).
+    """
+    dt = _to_utc(dt)
+    _, sun_elevation_deg = get_sun_position(SUN_REF_LAT, SUN_REF_LON, dt)
+    if k <= 0 or sun_elevation_deg <= MIN_SUN_ELEVATION:
+        return []
+    if score_batch is None:
+        building_index = _ensure_building_index(buildings)
+
+        def score_batch(batch: list[dict]) -> SunnyTimeseries:
+            return compute_sunny_timeseries(
+                batch,
+                building_index,
+                [dt],
+                {dt: cloud_cover_pct},
+                shade_mode=shade_mode,
+                shared_shadow_cache=shared_shadow_cache,
+            )
+
+    found: list[dict] = []
+    candidates = iter(candidates)
+    batch_size = NEAREST_FIRST_BATCH
+    while len(found) < k:
+        batch = list(itertools.islice(candidates, batch_size))
+        if not batch:
+            break
+        series = score_batch([feature for feature, _ in batch])
+        for cafe_idx, (_, distance_m) in enumerate(batch):
+            sunny_fraction = float(series.sunny_fraction[cafe_idx, 0])
+            if sunny_fraction > 0.0 and sunny_fraction >= min_sunny_fraction:
+                row = series.subset([cafe_idx]).rows(0)[0]
+                row["distance_m"] = round(distance_m, 1)
+                found.append(row)
+                if len(found) == k:
+                    break
+        batch_size = min(2 * batch_size, NEAREST_MAX_BATCH)
+    return found
+
+
+def _seat_key(xs: np.ndarray, ys: np.ndarray, owners: np.ndarray) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for column in (xs, ys, owners):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    return digest.digest()
+
+
+def _sunny_geometry(
+    cafes: list[dict],
+    building_index: BuildingIndex,
+    times: list[datetime],
+    xs: np.ndarray,
+    ys: np.ndarray,
+    owners: np.ndarray,
+    shade_mode: str,
+    horizons: HorizonProfiles | None,
+    shared_shadow_cache: ShadowCache | None,
+) -> SunnyGeometry:
+    if times:
+        sun_azimuths, sun_elevations = get_sun_positions(SUN_REF_LAT, SUN_REF_LON, times)
+    else:
+        sun_azimuths = sun_elevations = np.empty(0, dtype=np.float64)
+
+    sunny = np.zeros((len(xs), len(times)), dtype=bool)
+    daylight = np.flatnonzero(sun_elevations > MIN_SUN_ELEVATION)
+
+    if len(xs) and len(daylight):
+        if shade_mode == "horizon":
+            if horizons is None:
+                horizons = build_horizon_profiles(cafes, building_index)
+            seat_slot = np.arange(len(owners)) - np.searchsorted(owners, owners)
+            n_bins = horizons.horizons.shape[-1]
+            bins = np.floor(np.mod(sun_azimuths[daylight], 360.0) / horizons.bin_deg).astype(np.intp) % n_bins
+            blocking = horizons.horizons[owners[:, None], seat_slot[:, None], bins[None, :]]
+            sunny[:, daylight] = sun_elevations[daylight][None, :] > blocking
+        elif shade_mode == "layer":
+            for slot in daylight:
+                azimuth, elevation = float(sun_azimuths[slot]), float(sun_elevations[slot])
+                if shared_shadow_cache is not None:
+                    layer = shared_shadow_cache.get_or_build_layer(building_index, azimuth, elevation)
+                else:
+                    layer = build_shadow_layer(building_index, azimuth, elevation)
+                sunny[:, slot] = ~layer.shaded_xy(xs, ys)
+        else:
+            sunny[:, daylight] = _exact_sunny_matrix(
+                building_index,
+                cafes,
+                xs,
+                ys,
+                owners,
+                sun_azimuths[daylight],
+                sun_elevations[daylight],
+                shade_mode,
+                shared_shadow_cache,
+            )
+
+    counts = np.zeros((len(cafes), len(times)), dtype=np.int64)
+    np.add.at(counts, owners, sunny)
+    seats_per_cafe = np.maximum(np.bincount(owners, minlength=len(cafes)), 1)
+    return SunnyGeometry(
+        cafes=list(cafes),
+        times=times,
+        sunny_fraction=counts / seats_per_cafe[:, None],
+        sun_azimuth_deg=sun_azimuths,
+        sun_elevation_deg=sun_elevations,
+    )
+
+
+def _exact_sunny_matrix(
+    building_index: BuildingIndex,
+    cafes: list[dict],
+    xs: np.ndarray,
+    ys: np.ndarray,
+    owners: np.ndarray,
+    sun_azimuths: np.ndarray,
+    sun_elevations: np.ndarray,
+    shade_mode: str,
+    shared_shadow_cache: ShadowCache | None,
+) -> np.ndarray:
+    """(n_seats, n_sun_positions) direct-sun mask from the per-seat candidate lists."""
+    seat_candidates = building_index.seat_candidates
+    seat_rows = None
+    if seat_candidates is not None:
+        first_rows = [seat_candidates.first_row(*cafes[owner]["geometry"]["coordinates"][:2]) for owner in owners]
+        if None not in first_rows:
+            seat_slot = np.arange(len(owners)) - np.searchsorted(owners, owners)
+            seat_rows = np.asarray(first_rows, dtype=np.intp) + seat_slot
+    if seat_rows is None:
+        seat_candidates = build_seat_candidates(cafes, building_index)
+        seat_rows = np.arange(len(xs))
+
+    seat_points = shapely.points(xs, ys)
+    max_height_m = building_index.max_height_m
+    sunny = np.zeros((len(xs), len(sun_azimuths)), dtype=bool)
+    for col, (sun_azimuth_deg, sun_elevation_deg) in enumerate(zip(sun_azimuths.tolist(), sun_elevations.tolist())):
+        tan_elevation = math.tan(math.radians(sun_elevation_deg))
+        max_shadow_search = min(MAX_SHADOW_LENGTH, max_height_m / tan_elevation)
+        shadow_cache: dict[int, Any] = {}
+        for seat, (seat_point, row) in enumerate(zip(seat_points, seat_rows.tolist())):
+            candidate_indices, candidate_distances = seat_candidates.for_seat(
+                row,
+                max_shadow_search + SEARCH_PADDING_M,
+                sun_azimuth_deg,
+            )
+            candidate_indices = _prune_candidates(
+                building_index,
+                seat_point,
+                candidate_indices,
+                tan_elevation,
+                candidate_distances,
+            )
+            if shade_mode == "raycast":
+                shaded = _raycast_shaded(building_index, seat_point, candidate_indices, sun_azimuth_deg, tan_elevation)
+            else:
+                shaded = _polygon_shaded(
+                    building_index,
+                    seat_point,
+                    candidate_indices,
+                    shadow_cache,
+                    sun_azimuth_deg,
+                    sun_elevation_deg,
+                    shared_cache=shared_shadow_cache,
+                )
+            sunny[seat, col] = not shaded
+    return sunny
+
+
+def _horizon_sunny(
+    profile: np.ndarray,
+    bin_deg: float,
+    seat_idx: np.ndarray,
+    sun_azimuths: np.ndarray,
+    sun_elevations: np.ndarray,
+) -> np.ndarray:
+    """Direct sun for (seat, sun position) pairs against one cafe's horizon ``profile``."""
+    n_bins = profile.shape[-1]
+    bins = np.floor(np.mod(sun_azimuths, 360.0) / bin_deg).astype(np.intp) % n_bins
+    return (sun_elevations > MIN_SUN_ELEVATION) & (sun_elevations > profile[seat_idx, bins])
+
+
+def compute_seat_sun_intervals(
+    cafe: dict,
+    buildings: list[dict] | BuildingIndex,
+    start_utc: datetime,
+    end_utc: datetime,
+    horizons: HorizonProfiles | None = None,
+    coarse_step_min: int = TRANSITION_COARSE_STEP_MIN,
+    resolution_s: float = TRANSITION_RESOLUTION_S,
+) -> SeatSunIntervals:
+    """
+    Minute-level times at which each seat of ``cafe`` enters and leaves direct sun.
+
+    The sun path is sampled every ``coarse_step_min`` against the seat horizons,
+    then every sampled flip is bisected (vectorized across seats and flips)
+    until it is bracketed within ``resolution_s``. ``horizons`` must be built
+    for ``[cafe]`` and is computed when omitted.
+    """
+    return compute_seat_sun_intervals_many(
+        [cafe],
+        buildings,
+        start_utc,
+        end_utc,
+        horizons=horizons,
+        coarse_step_min=coarse_step_min,
+        resolution_s=resolution_s,
+    )[0]
+
+
+def compute_seat_sun_intervals_many(
+    cafes: list[dict],
+    buildings: list[dict] | BuildingIndex,
+    start_utc: datetime,
+    end_utc: datetime,
+    horizons: HorizonProfiles | None = None,
+    coarse_step_min: int = TRANSITION_COARSE_STEP_MIN,
+    resolution_s: float = TRANSITION_RESOLUTION_S,
+) -> list[SeatSunIntervals]:
+    """
+    ``compute_seat_sun_intervals`` for a cafe list in one pass.
+
+    The sun path and every bisection step are evaluated once for all seats of
+    all cafes. ``horizons`` must be built for ``cafes`` and is computed when omitted.
+    """
+    start_utc, end_utc = _to_utc(start_utc), _to_utc(end_utc)
+    if not cafes:
+        return []
+    if horizons is None:
+        horizons = build_horizon_profiles(cafes, buildings)
+    n_cafes, n_seats, n_bins = horizons.horizons.shape
+    profile = horizons.horizons.reshape(n_cafes * n_seats, n_bins)
+    n_rows = profile.shape[0]
+    if end_utc <= start_utc:
+        return [
+            SeatSunIntervals(start_utc=start_utc, end_utc=end_utc, seats=[[] for _ in range(n_seats)]) for _ in cafes
+        ]
+
+    start_s, end_s = start_utc.timestamp(), end_utc.timestamp()
+    grid = np.append(np.arange(start_s, end_s, coarse_step_min * 60.0), end_s)
+    sun_azimuths, sun_elevations = _sun_positions_unix(SUN_REF_LAT, SUN_REF_LON, grid)
+    row_grid = np.repeat(np.arange(n_rows), len(grid))
+    state = _horizon_sunny(
+        profile,
+        horizons.bin_deg,
+        row_grid,
+        np.tile(sun_azimuths, n_rows),
+        np.tile(sun_elevations, n_rows),
+    ).reshape(n_rows, len(grid))
+
+    flip_row, flip_step = np.nonzero(state[:, 1:] != state[:, :-1])
+    lo = grid[flip_step]
+    hi = grid[flip_step + 1]
+    before = state[flip_row, flip_step]
+    while len(lo) and float(np.max(hi - lo)) > resolution_s:
+        mid = (lo + hi) / 2.0
+        mid_azimuths, mid_elevations = _sun_positions_unix(SUN_REF_LAT, SUN_REF_LON, mid)
+        unchanged = _horizon_sunny(profile, horizons.bin_deg, flip_row, mid_azimuths, mid_elevations) == before
+        lo = np.where(unchanged, mid, lo)
+        hi = np.where(unchanged, hi, mid)
+    flip_times = np.round((lo + hi) / 120.0) * 60.0
+
+    # ``np.nonzero`` yields flips grouped by row and in time order within each row.
+    row_bounds = np.searchsorted(flip_row, np.arange(n_rows + 1))
+    rows: list[list[tuple[datetime, datetime]]] = []
+    for row in range(n_rows):
+        intervals: list[tuple[datetime, datetime]] = []
+        opened = start_utc if state[row, 0] else None
+        flips = slice(row_bounds[row], row_bounds[row + 1])
+        for when, was_sunny in zip(flip_times[flips], before[flips]):
+            moment = min(max(datetime.fromtimestamp(float(when), tz=timezone.utc), start_utc), end_utc)
+            if was_sunny:
+                if opened is not None and opened < moment:
+                    intervals.append((opened, moment))
+                opened = None
+            else:
+                opened = moment
+        if opened is not None and opened < end_utc:
+            intervals.append((opened, end_utc))
+        rows.append(intervals)
+    return [
+        SeatSunIntervals(start_utc=start_utc, end_utc=end_utc, seats=rows[i * n_seats : (i + 1) * n_seats])
+        for i in range(n_cafes)
+    ]
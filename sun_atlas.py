@@ -0,0 +1,370 @@
+"""
+Precomputed geometric sun atlas: per cafe seat, per calendar day, a 5-minute bitmask.
+
+Bit ``slot`` of ``bits[day, cafe, seat]`` is set when that seat has direct sun
+(above its obstruction horizon and ``MIN_SUN_ELEVATION``) at
+``day 00:00 UTC + slot * 5 min``. Rows are (month, day) in leap-year order, so
+Feb 29 always has its own row and Mar 1 is row 60 in every year. The atlas
+describes one calendar year; callers fall back to the engine for other years
+(``SunAtlas.covers``). Geometry does not depend on weather, so
+requests only apply the cloud factor to lookups and never touch Shapely. The
+seat horizons the bits were derived from are stored alongside, which lets
+minute-level transitions (``compute_seat_sun_intervals``) run without Shapely too.
+
+``python sun_atlas.py`` builds or refreshes ``data/sun_atlas/``. Each cafe row
+carries a digest of its seat positions and of every building that can shade
+it, so a refresh only recomputes cafes whose surroundings changed.
+"""
+from __future__ import annotations
+
+import argparse
+import calendar
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from collections.abc import Sequence
+from datetime import date, datetime, timezone
+
+import numpy as np
+import shapely
+
+from building_artifact import (
+    ARTIFACT_DIR,
+    BUILDINGS_GEOJSON,
+    CAFES_GEOJSON,
+    DATA_DIR,
+    _building_hashes,
+    buildings_fingerprint,
+    load_building_index,
+)
+from shadow_engine import (
+    HORIZON_BIN_DEG,
+    MAX_SHADOW_LENGTH,
+    MIN_SUN_ELEVATION,
+    SEARCH_PADDING_M,
+    SUN_REF_LAT,
+    SUN_REF_LON,
+    BuildingIndex,
+    HorizonProfiles,
+    SunnyGeometry,
+    SunnyTimeseries,
+    _candidate_seating_points,
+    _seat_utm_coords,
+    _sun_positions_unix,
+    _to_utc,
+    build_horizon_profiles,
+    get_sun_positions,
+)
+
+ATLAS_DIR = DATA_DIR / "sun_atlas"
+# Bump whenever the on-disk layout or the sun test changes.
+ATLAS_FORMAT_VERSION = 2
+ATLAS_SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // ATLAS_SLOT_MINUTES
+# One row per (month, day) of a leap year, Feb 29 included.
+ATLAS_DAYS = 366
+
+
+def _cafe_coords(cafes: list[dict]) -> np.ndarray:
+    coords = np.full((len(cafes), 2), np.nan, dtype=np.float64)
+    for row, feature in enumerate(cafes):
+        lon, lat = feature.get("geometry", {}).get("coordinates", [None, None])
+        if lon is not None and lat is not None:
+            coords[row] = (lon, lat)
+    return coords
+
+
+def _calendar_row(dt: datetime) -> int:
+    """Atlas row of the (month, day) of ``dt``."""
+    return date(2000, dt.month, dt.day).timetuple().tm_yday - 1
+
+
+def _cafe_digests(cafes: list[dict], building_index: BuildingIndex) -> list[str | None]:
+    """Per-cafe digest of seat positions plus every building within shadow reach."""
+    xs, ys, owners = _seat_utm_coords(cafes)
+    digests: list[str | None] = [None] * len(cafes)
+    if len(xs) == 0:
+        return digests
+    if building_index.tree is not None:
+        seat_idx, building_idx = building_index.tree.query(
+            shapely.points(xs, ys),
+            predicate="dwithin",
+            distance=MAX_SHADOW_LENGTH + SEARCH_PADDING_M,
+        )
+    else:
+        seat_idx = building_idx = np.empty(0, dtype=np.intp)
+    hashes = _building_hashes(building_index)
+    cafe_of_pair = owners[seat_idx]
+    for cafe_idx in np.unique(owners):
+        digest = hashlib.sha256()
+        seats = owners == cafe_idx
+        digest.update(np.ascontiguousarray(xs[seats]).tobytes())
+        digest.update(np.ascontiguousarray(ys[seats]).tobytes())
+        digest.update(np.unique(hashes[building_idx[cafe_of_pair == cafe_idx]]).tobytes())
+        digests[int(cafe_idx)] = digest.hexdigest()
+    return digests
+
+
+def _year_sun_track(year: int, bin_deg: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Daylight slots of the year as (flat slot index, horizon bin, sun elevation).
+
+    Row ``_calendar_row(d)`` holds day ``d`` of ``year``. In a common year the
+    Feb 29 row holds the previous leap year's Feb 29; it is never looked up
+    for ``year`` but keeps the layout identical.
+    """
+    leap_year = year
+    while not calendar.isleap(leap_year):
+        leap_year -= 1
+    day_starts = np.empty(ATLAS_DAYS, dtype=np.float64)
+    for row in range(ATLAS_DAYS):
+        day = date.fromordinal(date(2000, 1, 1).toordinal() + row)
+        day_year = year if calendar.isleap(year) or (day.month, day.day) != (2, 29) else leap_year
+        day_starts[row] = datetime(day_year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+    slot_offsets = np.arange(SLOTS_PER_DAY, dtype=np.float64) * ATLAS_SLOT_MINUTES * 60.0
+    unix_s = (day_starts[:, None] + slot_offsets[None, :]).ravel()
+    azimuths, elevations = _sun_positions_unix(SUN_REF_LAT, SUN_REF_LON, unix_s)
+    daylight = np.flatnonzero(elevations > MIN_SUN_ELEVATION)
+    n_bins = int(round(360.0 / bin_deg))
+    bins = np.floor(np.mod(azimuths[daylight], 360.0) / bin_deg).astype(np.intp) % n_bins
+    return daylight, bins, elevations[daylight]
+
+
+def _pack_cafe(profile: np.ndarray, sun_track: tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """(ATLAS_DAYS, n_seats, SLOTS_PER_DAY // 8) packed bits for one cafe's horizon profile."""
+    daylight, bins, elevations = sun_track
+    n_seats = profile.shape[0]
+    # Same test as the engine's horizon mode, restricted to slots with the sun up.
+    sunny = np.zeros((n_seats, ATLAS_DAYS * SLOTS_PER_DAY), dtype=bool)
+    sunny[:, daylight] = elevations > profile[:, bins]
+    sunny = sunny.reshape(n_seats, ATLAS_DAYS, SLOTS_PER_DAY)
+    return np.packbits(sunny, axis=-1).transpose(1, 0, 2)
+
+
+class SunAtlas:
+    """Memory-mapped sun atlas; see the module docstring for the layout."""
+
+    __slots__ = ("bits", "horizons", "coords", "digests", "year", "bin_deg", "buildings_fingerprint", "_rows")
+
+    def __init__(
+        self,
+        bits: np.ndarray,
+        horizons: np.ndarray,
+        coords: np.ndarray,
+        digests: list[str | None],
+        year: int,
+        bin_deg: float,
+        buildings_fingerprint: str | None = None,
+    ):
+        self.buildings_fingerprint = buildings_fingerprint
+        self.bits = bits
+        self.horizons = horizons
+        self.coords = coords
+        self.digests = digests
+        self.year = year
+        self.bin_deg = bin_deg
+        self._rows = {
+            (float(lon), float(lat)): row
+            for row, (lon, lat) in enumerate(coords.tolist())
+            if digests[row] is not None
+        }
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.bits.nbytes + self.horizons.nbytes + self.coords.nbytes)
+
+    def rows_for(self, cafes: list[dict]) -> np.ndarray | None:
+        """Atlas row of every cafe, or None when any cafe is not in the atlas."""
+        rows = []
+        for feature in cafes:
+            lon, lat = feature.get("geometry", {}).get("coordinates", [None, None])
+            row = self._rows.get((lon, lat)) if lon is not None and lat is not None else None
+            if row is None:
+                return None
+            rows.append(row)
+        return np.asarray(rows, dtype=np.intp)
+
+    def covers(self, times: Sequence[datetime]) -> bool:
+        """True when every time falls in the atlas year (UTC); other years must use the engine."""
+        return all(_to_utc(dt).year == self.year for dt in times)
+
+    def horizon_profiles(self, rows: Sequence[int]) -> HorizonProfiles:
+        return HorizonProfiles(bin_deg=self.bin_deg, horizons=np.asarray(self.horizons[np.asarray(rows, dtype=np.intp)]))
+
+    def sunny_fraction(self, rows: np.ndarray, times: Sequence[datetime]) -> np.ndarray:
+        """
+        (len(rows), len(times)) share of seats in direct sun, from the 5-minute slot containing each time.
+
+        Only the month and day of each time are used; check ``covers`` first.
+        """
+        fraction = np.zeros((len(rows), len(times)), dtype=np.float64)
+        n_seats = self.bits.shape[2]
+        for col, dt in enumerate(times):
+            dt = _to_utc(dt)
+            day = _calendar_row(dt)
+            slot = (dt.hour * 60 + dt.minute) // ATLAS_SLOT_MINUTES
+            byte = self.bits[day, rows, :, slot // 8]
+            fraction[:, col] = ((byte >> (7 - slot % 8)) & 1).sum(axis=1) / n_seats
+        return fraction
+
+    def geometry(self, cafes: list[dict], rows: np.ndarray, times: Sequence[datetime]) -> SunnyGeometry:
+        """``compute_sunny_geometry``-shaped lookups (horizon geometry, 5-min slots)."""
+        times = [_to_utc(dt) for dt in times]
+        if times:
+            sun_azimuths, sun_elevations = get_sun_positions(SUN_REF_LAT, SUN_REF_LON, times)
+        else:
+            sun_azimuths = sun_elevations = np.empty(0, dtype=np.float64)
+        return SunnyGeometry(
+            cafes=list(cafes),
+            times=times,
+            sunny_fraction=self.sunny_fraction(rows, times),
+            sun_azimuth_deg=sun_azimuths,
+            sun_elevation_deg=sun_elevations,
+        )
+
+    def timeseries(
+        self,
+        cafes: list[dict],
+        rows: np.ndarray,
+        times: Sequence[datetime],
+        cloud_by_time: dict[datetime, float],
+        default_cloud_cover_pct: float = 50.0,
+    ) -> SunnyTimeseries:
+        """``compute_sunny_timeseries``-shaped scores: atlas geometry times the cloud factor."""
+        return self.geometry(cafes, rows, times).score(cloud_by_time, default_cloud_cover_pct)
+
+
+def load_sun_atlas(
+    atlas_dir: pathlib.Path = ATLAS_DIR,
+    building_index: BuildingIndex | None = None,
+) -> SunAtlas | None:
+    """
+    Memory-map a built atlas; None when missing, from another format, or (when
+    ``building_index`` is given) built for different buildings.
+    """
+    atlas_dir = pathlib.Path(atlas_dir)
+    meta_path = atlas_dir / "meta.json"
+    if not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != ATLAS_FORMAT_VERSION:
+        return None
+    if building_index is not None and meta.get("buildings_fingerprint") != buildings_fingerprint(building_index):
+        return None
+    return SunAtlas(
+        bits=np.load(atlas_dir / "bits.npy", mmap_mode="r"),
+        horizons=np.load(atlas_dir / "horizons.npy", mmap_mode="r"),
+        coords=np.load(atlas_dir / "coords.npy"),
+        digests=meta["digests"],
+        year=meta["year"],
+        bin_deg=meta["bin_deg"],
+        buildings_fingerprint=meta.get("buildings_fingerprint"),
+    )
+
+
+def build_sun_atlas(
+    cafes: list[dict],
+    building_index: BuildingIndex,
+    atlas_dir: pathlib.Path = ATLAS_DIR,
+    year: int | None = None,
+    bin_deg: float = HORIZON_BIN_DEG,
+) -> dict:
+    """
+    Build or incrementally refresh the atlas for ``cafes``; returns build stats.
+
+    Rows of an existing atlas (same format, year and bin size) are reused for
+    every cafe whose digest is unchanged; only new or affected cafes get their
+    horizons and bitmasks recomputed.
+    """
+    atlas_dir = pathlib.Path(atlas_dir)
+    year = year or datetime.now(timezone.utc).year
+    previous = load_sun_atlas(atlas_dir)
+    if previous is not None and (previous.year != year or previous.bin_deg != bin_deg):
+        previous = None
+
+    digests = _cafe_digests(cafes, building_index)
+    coords = _cafe_coords(cafes)
+    reuse: dict[int, int] = {}
+    if previous is not None:
+        previous_rows = {
+            digest: row for row, digest in enumerate(previous.digests) if digest is not None
+        }
+        for row, digest in enumerate(digests):
+            if digest is not None and digest in previous_rows:
+                reuse[row] = previous_rows[digest]
+    rebuild = [row for row, digest in enumerate(digests) if digest is not None and row not in reuse]
+
+    n_bins = int(round(360.0 / bin_deg))
+    n_seats = len(_candidate_seating_points(0.0, 0.0))
+    staging = atlas_dir.with_name(atlas_dir.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    bits = np.lib.format.open_memmap(
+        staging / "bits.npy",
+        mode="w+",
+        dtype=np.uint8,
+        shape=(ATLAS_DAYS, len(cafes), n_seats, SLOTS_PER_DAY // 8),
+    )
+    horizons = np.zeros((len(cafes), n_seats, n_bins), dtype=np.float32)
+
+    for row, previous_row in reuse.items():
+        bits[:, row] = previous.bits[:, previous_row]
+        horizons[row] = previous.horizons[previous_row]
+    if rebuild:
+        fresh = build_horizon_profiles([cafes[row] for row in rebuild], building_index, bin_deg)
+        sun_track = _year_sun_track(year, bin_deg)
+        for position, row in enumerate(rebuild):
+            horizons[row] = fresh.horizons[position]
+            bits[:, row] = _pack_cafe(fresh.horizons[position], sun_track)
+    bits.flush()
+    del bits
+
+    np.save(staging / "horizons.npy", horizons, allow_pickle=False)
+    np.save(staging / "coords.npy", coords, allow_pickle=False)
+    meta = {
+        "format_version": ATLAS_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "year": year,
+        "slot_minutes": ATLAS_SLOT_MINUTES,
+        "bin_deg": bin_deg,
+        "buildings_fingerprint": buildings_fingerprint(building_index),
+        "digests": digests,
+    }
+    with open(staging / "meta.json", "w") as f:
+        json.dump(meta, f)
+
+    retired = atlas_dir.with_name(atlas_dir.name + ".old")
+    shutil.rmtree(retired, ignore_errors=True)
+    if atlas_dir.exists():
+        os.replace(atlas_dir, retired)
+    os.replace(staging, atlas_dir)
+    shutil.rmtree(retired, ignore_errors=True)
+    return {"cafes": len(cafes), "reused": len(reuse), "rebuilt": len(rebuild)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or refresh the per-seat sun bitmask atlas.")
+    parser.add_argument("--year", type=int, default=None, help="Calendar year of the sun track (default: current).")
+    parser.add_argument("--cafes", type=pathlib.Path, default=CAFES_GEOJSON)
+    parser.add_argument("--output", type=pathlib.Path, default=ATLAS_DIR)
+    args = parser.parse_args()
+
+    with open(args.cafes) as f:
+        cafes = json.load(f)["features"]
+    building_index, origin = load_building_index(BUILDINGS_GEOJSON, ARTIFACT_DIR, cafes=None)
+    stats = build_sun_atlas(cafes, building_index, args.output, year=args.year)
+    size_mb = sum(p.stat().st_size for p in args.output.iterdir()) / (1024 * 1024)
+    print(
+        f"Wrote {args.output}: {stats['cafes']} cafes ({stats['rebuilt']} rebuilt, "
+        f"{stats['reused']} reused), buildings from {origin}, {size_mb:.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
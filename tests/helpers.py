@@ -0,0 +1,75 @@
+"""Fixture factories shared by the test modules."""
+import json
+import pathlib
+import random
+
+from shapely.affinity import rotate
+from shapely.geometry import box
+
+from shadow_engine import TO_UTM
+
+DATA_DIR = pathlib.Path(__file__).resolve().parents[1] / "data"
+
+
+def load_cafes(count: int) -> list[dict]:
+    with open(DATA_DIR / "cafes_copenhagen.geojson") as f:
+        features = json.load(f)["features"]
+    return features[:count]
+
+
+def synthetic_city(cafes: list[dict], seed: int = 7, per_cafe: int = 12) -> list[dict]:
+    """Random rotated blocks scattered around real cafe locations (deterministic)."""
+    rng = random.Random(seed)
+    buildings = []
+    for feature in cafes:
+        lon, lat = feature["geometry"]["coordinates"]
+        x, y = TO_UTM.transform(lon, lat)
+        for _ in range(per_cafe):
+            cx = x + rng.uniform(-160.0, 160.0)
+            cy = y + rng.uniform(-160.0, 160.0)
+            w = rng.uniform(6.0, 40.0)
+            d = rng.uniform(6.0, 30.0)
+            footprint = rotate(box(cx - w / 2, cy - d / 2, cx + w / 2, cy + d / 2), rng.uniform(0, 90))
+            buildings.append(
+                {
+                    "geom_utm": footprint,
+                    "height_m": rng.choice([6.0, 9.0, 12.0, 15.0, 18.0, 24.0, 35.0]),
+                    "osm_id": len(buildings) + 1,
+                    "height_source": "test",
+                }
+            )
+    return buildings
+
+
+def _square(lon: float, lat: float, half: float) -> list[list[float]]:
+    return [[lon - half, lat - half], [lon + half, lat - half], [lon + half, lat + half], [lon - half, lat + half], [lon - half, lat - half]]
+
+
+def buildings_geojson(cafes: list[dict], seed: int = 3) -> dict:
+    """WGS84 building FeatureCollection around ``cafes``, including one MultiPolygon (deterministic)."""
+    rng = random.Random(seed)
+    features = []
+    for feature in cafes:
+        lon, lat = feature["geometry"]["coordinates"]
+        for _ in range(8):
+            blon = lon + rng.uniform(-0.002, 0.002)
+            blat = lat + rng.uniform(-0.0012, 0.0012)
+            features.append(
+                {
+                    "type": "Feature",
+                    "properties": {"osm_id": len(features) + 1, "building:levels": rng.choice([2, 4, 6])},
+                    "geometry": {"type": "Polygon", "coordinates": [_square(blon, blat, rng.uniform(0.00005, 0.0002))]},
+                }
+            )
+    lon, lat = cafes[0]["geometry"]["coordinates"]
+    features.append(
+        {
+            "type": "Feature",
+            "properties": {"building": "church"},
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [[_square(lon + 0.0004, lat, 0.0001)], [_square(lon - 0.0004, lat, 0.0001)]],
+            },
+        }
+    )
+    return {"type": "FeatureCollection", "features": features}
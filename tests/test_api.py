@@ -0,0 +1,274 @@
+import contextlib
+import importlib
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+import warnings
+from datetime import datetime, timezone
+from unittest import mock
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import shadow_engine
+from building_artifact import load_building_index
+from cafe_index import haversine_m
+from sun_atlas import SunAtlas, build_sun_atlas
+from tiles import tile_bounds, tiles_covering
+
+from helpers import buildings_geojson, load_cafes
+
+api = None
+client = None
+_tmp = None
+_cwd = None
+_patches = []
+# Daylight in the year the atlas is built for (the current one, as the API would).
+YEAR = datetime.now(timezone.utc).year
+NOON = datetime(YEAR, 6, 1, 12, 0, tzinfo=timezone.utc)
+CLOUD_COVER = 20.0
+
+
+def setUpModule():
+    # api loads its data from ./data at import, so import it from a scratch directory.
+    global api, client, _tmp, _cwd
+    _tmp = tempfile.TemporaryDirectory()
+    root = pathlib.Path(_tmp.name)
+    data = root / "data"
+    data.mkdir()
+    cafes = load_cafes(40)
+    (data / "cafes_copenhagen.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": cafes}))
+    (data / "buildings.geojson").write_text(json.dumps(buildings_geojson(cafes)))
+    _cwd = os.getcwd()
+    os.chdir(root)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        index, _ = load_building_index(data / "buildings.geojson", data / "buildings_artifact")
+        build_sun_atlas(cafes, index, data / "sun_atlas", year=YEAR)
+        api = importlib.import_module("api")
+    _patches.append(mock.patch.object(api, "get_cloud_cover", lambda dt: CLOUD_COVER))
+    for patch in _patches:
+        patch.start()
+    client = TestClient(api.app)
+
+
+def tearDownModule():
+    for patch in _patches:
+        patch.stop()
+    os.chdir(_cwd)
+    _tmp.cleanup()
+
+
+def _without_atlas():
+    return mock.patch.object(api, "SUN_ATLAS", None)
+
+
+@contextlib.contextmanager
+def _counting_scorers():
+    """Record atlas lookups and engine passes while still running them."""
+    with (
+        mock.patch.object(SunAtlas, "timeseries", autospec=True, side_effect=SunAtlas.timeseries) as atlas_calls,
+        mock.patch.object(
+            shadow_engine, "compute_sunny_timeseries", side_effect=shadow_engine.compute_sunny_timeseries
+        ) as engine_calls,
+    ):
+        yield atlas_calls, engine_calls
+
+
+def _cafe_key(row: dict) -> tuple:
+    return row["name"], row["lon"], row["lat"]
+
+
+def _touch(path: pathlib.Path) -> None:
+    """Move the mtime forward so a rewrite within the filesystem's timestamp granularity still counts."""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+class SunnyEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.assertIsNotNone(api.SUN_ATLAS)
+        api.SUNNY_CACHE.clear()
+        api.SUNNY_CELLS.clear()
+        api.TILE_CACHE.clear()
+
+    def test_batch_matches_single_queries(self):
+        lons = [c["geometry"]["coordinates"][0] for c in api.CAFE_CATALOG.features]
+        lats = [c["geometry"]["coordinates"][1] for c in api.CAFE_CATALOG.features]
+        mid_lon, mid_lat = float(np.median(lons)), float(np.median(lats))
+        south_west = {"min_lon": min(lons), "min_lat": min(lats), "max_lon": mid_lon, "max_lat": mid_lat}
+        north_east = {"min_lon": mid_lon, "min_lat": mid_lat, "max_lon": max(lons), "max_lat": max(lats)}
+        queries = [
+            {"time": NOON.isoformat(), "limit": 500},
+            {"time": NOON.isoformat(), **south_west},
+            {"time": f"{YEAR}-06-01T15:20:00Z", **north_east, "limit": 5},
+            # A year the atlas does not cover goes through the engine.
+            {"time": f"{YEAR + 1}-06-01T09:05:00Z", "limit": 500},
+            {"time": NOON.isoformat(), "limit": 500},
+        ]
+        for with_atlas in (True, False):
+            atlas = mock.patch.object(api, "SUN_ATLAS", api.SUN_ATLAS) if with_atlas else _without_atlas()
+            with self.subTest(with_atlas=with_atlas), atlas:
+                api.SUNNY_CACHE.clear()
+                batch = client.post("/api/sunny/batch", json={"queries": queries})
+                self.assertEqual(batch.status_code, 200)
+                results = batch.json()["results"]
+                self.assertEqual(len(results), len(queries))
+                self.assertEqual(results[0], results[-1])
+                self.assertGreater(results[0]["count"], 0)
+
+                api.SUNNY_CACHE.clear()
+                for position, (query, result) in enumerate(zip(queries, results)):
+                    single = client.get("/api/sunny", params=query)
+                    self.assertEqual(single.headers["x-cache"], "HIT" if query in queries[:position] else "MISS")
+                    self.assertEqual(single.json(), result)
+
+    def test_answers_hold_only_the_requested_bbox(self):
+        coords = np.array([c["geometry"]["coordinates"] for c in api.CAFE_CATALOG.features])
+        west = coords[int(np.argmin(coords[:, 0]))]
+        # Cut the west edge just past a cafe: the snapped cell still holds it, the answer must not.
+        bbox = (west[0] + 1e-6, coords[:, 1].min(), coords[:, 0].max(), coords[:, 1].max())
+        self.assertLessEqual(api._snap_bbox(bbox)[0], west[0])
+        inside = sorted(
+            (float(lon), float(lat))
+            for lon, lat in coords
+            if bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3]
+        )
+        params = {"time": NOON.isoformat(), **dict(zip(("min_lon", "min_lat", "max_lon", "max_lat"), bbox))}
+        for with_atlas in (True, False):
+            atlas = mock.patch.object(api, "SUN_ATLAS", api.SUN_ATLAS) if with_atlas else _without_atlas()
+            with self.subTest(with_atlas=with_atlas), atlas:
+                api.SUNNY_CACHE.clear()
+                api.SUNNY_CELLS.clear()
+                full = client.get("/api/sunny", params=params | {"limit": 500}).json()
+                self.assertEqual(sorted((row["lon"], row["lat"]) for row in full["cafes"]), inside)
+                # The limit applies after the cut, to the same ranking.
+                top = client.get("/api/sunny", params=params | {"limit": 3}).json()
+                self.assertEqual(top["count"], 3)
+                self.assertEqual(top["cafes"], full["cafes"][:3])
+
+    def test_tiles_partition_cafes_and_reject_out_of_range(self):
+        self.assertEqual(client.get("/api/sunny/tiles/15/32768/0").status_code, 404)
+        self.assertEqual(client.get("/api/sunny/tiles/15/0/32768").status_code, 404)
+        self.assertEqual(client.get("/api/sunny/tiles/9/0/0").status_code, 422)
+
+        coords = np.array([c["geometry"]["coordinates"] for c in api.CAFE_CATALOG.features])
+        bbox = (*coords.min(axis=0), *coords.max(axis=0))
+        seen = []
+        for x, y in tiles_covering(bbox, 16):
+            tile = client.get(f"/api/sunny/tiles/16/{x}/{y}", params={"time": NOON.isoformat()})
+            self.assertEqual(tile.status_code, 200)
+            min_lon, min_lat, max_lon, max_lat = tile_bounds(16, x, y)
+            for row in tile.json()["cafes"]:
+                # Half-open: west and north edges belong to the tile, east and south do not.
+                self.assertTrue(min_lon <= row["lon"] < max_lon and min_lat < row["lat"] <= max_lat)
+                seen.append(_cafe_key(row))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), len(coords))
+
+    def test_nearest_uses_the_atlas_for_the_whole_request(self):
+        lon, lat = api.CAFE_CATALOG.features[0]["geometry"]["coordinates"]
+        params = {"lon": lon, "lat": lat, "k": 4, "time": NOON.isoformat(), "max_radius_m": 20000}
+        found = client.get("/api/sunny/nearest", params=params).json()
+        self.assertEqual(found["count"], 4)
+
+        # Brute force over the atlas: every sunny cafe, nearest first.
+        features = api.CAFE_CATALOG.features
+        series = api.SUN_ATLAS.timeseries(features, api.SUN_ATLAS.rows_for(features), [NOON], {NOON: CLOUD_COVER})
+        coords = np.array([f["geometry"]["coordinates"] for f in features])
+        distances = haversine_m(lon, lat, coords[:, 0], coords[:, 1])
+        sunny = [i for i in np.argsort(distances, kind="stable") if series.sunny_fraction[i, 0] > 0]
+        expected = [series.subset([i]).rows(0)[0] | {"distance_m": round(float(distances[i]), 1)} for i in sunny[:4]]
+        self.assertEqual(found["cafes"], expected)
+
+        # One shade model per request: every batch of a deep search goes to the atlas ...
+        params["k"] = 30
+        with _counting_scorers() as (atlas_calls, engine_calls):
+            client.get("/api/sunny/nearest", params=params)
+        self.assertGreater(atlas_calls.call_count, 1)
+        self.assertEqual(engine_calls.call_count, 0)
+
+        # ... unless the atlas misses a cafe, even one far away: then no batch uses it.
+        far = coords[int(np.argmax(distances))]
+        partial = {key: row for key, row in api.SUN_ATLAS._rows.items() if key != (far[0], far[1])}
+        # Coverage is cached per catalog generation and atlas, so drop it around the swap.
+        self.addCleanup(api._ATLAS_COVERS_CATALOG.clear)
+        api._ATLAS_COVERS_CATALOG.clear()
+        with mock.patch.object(api.SUN_ATLAS, "_rows", partial), _counting_scorers() as (atlas_calls, engine_calls):
+            client.get("/api/sunny/nearest", params=params)
+        self.assertEqual(atlas_calls.call_count, 0)
+        self.assertGreater(engine_calls.call_count, 1)
+
+        # Outside the atlas year the whole request falls back to polygon shading.
+        params["time"] = f"{YEAR + 1}-06-01T12:00:00Z"
+        other_year = client.get("/api/sunny/nearest", params=params).json()
+        with _without_atlas():
+            self.assertEqual(client.get("/api/sunny/nearest", params=params).json(), other_year)
+
+
+class EncodedResponseTests(unittest.TestCase):
+    def test_each_content_encoding_has_its_own_etag(self):
+        identity = client.get("/api/cafes", headers={"Accept-Encoding": "identity"})
+        gzipped = client.get("/api/cafes", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", identity.headers)
+        self.assertEqual(gzipped.headers["content-encoding"], "gzip")
+        self.assertEqual(gzipped.json(), identity.json())
+        self.assertNotEqual(gzipped.headers["etag"], identity.headers["etag"])
+
+        # A cached gzip body revalidates even when the client now asks for identity.
+        revalidated = client.get(
+            "/api/cafes", headers={"Accept-Encoding": "identity", "If-None-Match": gzipped.headers["etag"]}
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.headers["etag"], identity.headers["etag"])
+
+        refused = client.get("/api/cafes", headers={"Accept-Encoding": "gzip;q=0, *"})
+        self.assertNotEqual(refused.headers.get("content-encoding"), "gzip")
+
+
+class LifecycleTests(unittest.TestCase):
+    def test_shutdown_closes_the_scoring_pool(self):
+        scorer = mock.Mock()
+        with mock.patch.object(api, "_SCORER", scorer):
+            with TestClient(api.app):
+                pass
+            self.assertIsNone(api._SCORER)
+        scorer.close.assert_called_once_with()
+
+
+class CafeReloadTests(unittest.TestCase):
+    def test_cafe_file_edits_are_picked_up_in_one_swap(self):
+        path = api.CAFES_PATH
+        original = path.read_bytes()
+        first = client.get("/api/cafes")
+        features = first.json()["cafes"]
+        generation = api.CAFE_CATALOG.generation
+        try:
+            with mock.patch.object(api, "CAFES_RELOAD_CHECK_S", 0.0):
+                path.write_text(json.dumps({"type": "FeatureCollection", "features": features[:-1]}))
+                _touch(path)
+                second = client.get("/api/cafes", headers={"If-None-Match": first.headers["etag"]})
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual(len(second.json()["cafes"]), len(features) - 1)
+                catalog = api.CAFE_CATALOG
+                self.assertEqual(catalog.generation, generation + 1)
+                self.assertIsNone(catalog.index.find(api.feature_id(features[-1])))
+
+                # A half-written file keeps the current catalog.
+                path.write_text('{"features": [')
+                _touch(path)
+                third = client.get("/api/cafes", headers={"If-None-Match": second.headers["etag"]})
+                self.assertEqual(third.status_code, 304)
+                self.assertIs(api.CAFE_CATALOG, catalog)
+        finally:
+            path.write_bytes(original)
+            _touch(path)
+            with mock.patch.object(api, "CAFES_RELOAD_CHECK_S", 0.0):
+                api._cafe_catalog()
+        self.assertEqual(len(api.CAFE_CATALOG.features), len(features))
+
+
+if __name__ == "__main__":
+    unittest.main()
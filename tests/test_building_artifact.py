@@ -0,0 +1,84 @@
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+
+from building_artifact import (
+    artifact_stale_reason,
+    buildings_fingerprint,
+    compile_artifact,
+    load_artifact,
+    load_building_index,
+    read_artifact_meta,
+)
+from shadow_engine import compute_sunny_cafes
+
+from helpers import buildings_geojson, load_cafes
+
+class BuildingArtifactTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp.name)
+        self.cafes = load_cafes(25)
+        self.geojson = self.root / "buildings.geojson"
+        self.geojson.write_text(json.dumps(buildings_geojson(self.cafes)))
+        self.artifact = self.root / "buildings_artifact"
+        self.enterContext(warnings.catch_warnings())
+        warnings.simplefilter("ignore", DeprecationWarning)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_artifact_matches_geojson_index(self):
+        compile_artifact(self.geojson, self.artifact, cafes=self.cafes)
+        loaded, origin = load_building_index(self.geojson, self.artifact, cafes=self.cafes)
+        self.assertEqual(origin, "artifact")
+        self.assertIsInstance(loaded.heights.base, np.memmap)
+
+        parsed, origin = load_building_index(self.geojson, self.root / "missing", cafes=self.cafes)
+        self.assertTrue(origin.startswith("geojson"))
+        self.assertEqual(len(loaded), len(parsed))
+        self.assertEqual(sorted(loaded.osm_ids.tolist()), sorted(parsed.osm_ids.tolist()))
+        self.assertEqual(sum(g.geom_type == "MultiPolygon" for g in loaded.geometries), 1)
+
+        # The loaded index carries the fingerprint recorded at compile time instead of rehashing.
+        recorded = loaded.fingerprint
+        self.assertEqual(recorded, read_artifact_meta(self.artifact)["buildings_fingerprint"])
+        loaded.fingerprint = None
+        self.assertEqual(buildings_fingerprint(loaded), recorded)
+        self.assertEqual(buildings_fingerprint(parsed), recorded)
+
+        dt = datetime(2026, 4, 20, 14, 0, tzinfo=timezone.utc)
+        for mode in ("static", "corridor"):
+            from_artifact = compute_sunny_cafes(self.cafes, loaded, dt, 0.0, limit=None, candidate_mode=mode)
+            from_geojson = compute_sunny_cafes(self.cafes, parsed, dt, 0.0, limit=None, candidate_mode=mode)
+            self.assertEqual(from_artifact, from_geojson)
+
+    def test_seat_lists_rebuilt_when_cafes_change(self):
+        compile_artifact(self.geojson, self.artifact, cafes=self.cafes)
+        loaded = load_artifact(self.artifact, cafes=self.cafes[:10])
+        self.assertEqual(len(loaded.seat_candidates.offsets), 3 * 10 + 1)
+
+    def test_stale_artifact_falls_back_to_geojson(self):
+        compile_artifact(self.geojson, self.artifact)
+        self.assertIsNone(artifact_stale_reason(read_artifact_meta(self.artifact), self.geojson))
+
+        # Touching the file alone keeps the artifact: the content hash still matches.
+        stat = self.geojson.stat()
+        os.utime(self.geojson, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNone(artifact_stale_reason(read_artifact_meta(self.artifact), self.geojson))
+
+        raw = json.loads(self.geojson.read_text())
+        raw["features"] = raw["features"][:-5]
+        self.geojson.write_text(json.dumps(raw))
+        _, origin = load_building_index(self.geojson, self.artifact)
+        self.assertEqual(origin, "geojson (source size changed)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import random
+import unittest
+
+import numpy as np
+
+from cafe_index import CafeIndex, feature_id, haversine_m
+
+from helpers import load_cafes
+
+
+def _cafe(name: str, lon: float, lat: float, osm_id=None) -> dict:
+    props = {"name": name}
+    if osm_id is not None:
+        props["osm_id"] = osm_id
+    return {"type": "Feature", "properties": props, "geometry": {"type": "Point", "coordinates": [lon, lat]}}
+
+
+class CafeIndexTests(unittest.TestCase):
+    def test_finds_every_cafe_by_feature_id_and_osm_id(self):
+        cafes = load_cafes(200)
+        index = CafeIndex(cafes)
+        self.assertEqual(len(index), 200)
+        for cafe in cafes:
+            self.assertIs(index.find(feature_id(cafe)), cafe)
+            self.assertIs(index.find(f"  {feature_id(cafe).upper()} "), cafe)
+            osm_id = cafe["properties"].get("osm_id")
+            if osm_id is not None:
+                self.assertIs(index.find(str(osm_id)), cafe)
+        self.assertIsNone(index.find("osm-0"))
+        self.assertIsNone(index.find("not-a-cafe"))
+
+    def test_first_feature_wins_and_name_ids_resolve(self):
+        first = _cafe("Kaffe", 12.5, 55.6, osm_id=7)
+        duplicate = _cafe("Kaffe bis", 12.6, 55.7, osm_id=7)
+        unnamed = _cafe("Bønne ", 12.55, 55.68)
+        floaty = _cafe("Float", 12.57, 55.69, osm_id=9.0)
+        index = CafeIndex([first, duplicate, unnamed, floaty])
+        self.assertIs(index.find("osm-7"), first)
+        self.assertIs(index.find("7"), first)
+        self.assertIs(index.find("Bønne-55.68-12.55"), unnamed)
+        self.assertIs(index.find("9"), floaty)
+
+
+class CafeSpatialIndexTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cafes = load_cafes(1000)
+        cls.cafes.append({"type": "Feature", "properties": {"name": "Nowhere"}, "geometry": {"coordinates": [None, None]}})
+        cls.index = CafeIndex(cls.cafes)
+        cls.lons = np.array([c["geometry"]["coordinates"][0] or np.nan for c in cls.cafes], dtype=float)
+        cls.lats = np.array([c["geometry"]["coordinates"][1] or np.nan for c in cls.cafes], dtype=float)
+
+    def test_bbox_matches_linear_scan(self):
+        rng = random.Random(5)
+        bboxes = [(12.56, 55.675, 12.60, 55.695), (-180.0, -90.0, 180.0, 90.0), (12.7, 55.9, 12.6, 56.0)]
+        for _ in range(40):
+            lon, lat = rng.uniform(12.45, 12.7), rng.uniform(55.6, 55.75)
+            bboxes.append((lon, lat, lon + rng.uniform(0.0, 0.06), lat + rng.uniform(0.0, 0.04)))
+        for bbox in bboxes:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            expected = [
+                cafe
+                for cafe, lon, lat in zip(self.cafes, self.lons, self.lats)
+                if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+            ]
+            self.assertEqual(self.index.in_bbox(*bbox), expected, msg=str(bbox))
+
+    def test_radius_and_nearest_match_brute_force(self):
+        rng = random.Random(9)
+        for _ in range(20):
+            lon, lat = rng.uniform(12.45, 12.7), rng.uniform(55.6, 55.75)
+            distances = haversine_m(lon, lat, self.lons, self.lats)
+            order = [row for row in np.lexsort((np.arange(len(distances)), distances)) if not np.isnan(distances[row])]
+
+            within = self.index.within_radius(lon, lat, 400.0)
+            self.assertEqual([cafe for cafe, _ in within], [self.cafes[row] for row in order if distances[row] <= 400.0])
+
+            nearest = self.index.nearest(lon, lat, 15)
+            self.assertEqual([cafe for cafe, _ in nearest], [self.cafes[row] for row in order[:15]])
+            self.assertTrue(all(a[1] <= b[1] for a, b in zip(nearest, nearest[1:])))
+
+        walked = list(self.index.iter_nearest(12.0, 40.0))
+        self.assertEqual(len(walked), len(self.cafes) - 1)
+        self.assertEqual(self.index.nearest(12.57, 55.68, 5, max_radius_m=1.0), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from execution import EngineExecutor, RouteLimit, RouteOverloaded, SingleFlight
+
+
+class _Probe:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def work(self, seconds: float, value=None):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(seconds)
+        with self.lock:
+            self.running -= 1
+        return value
+
+
+class EngineExecutorTests(unittest.TestCase):
+    def setUp(self):
+        self.executor = EngineExecutor(
+            {"slow": RouteLimit(max_concurrent=2, max_queue=8), "fast": RouteLimit(max_concurrent=2, max_queue=8)},
+            threads=4,
+        )
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_route_concurrency_is_bounded_and_results_come_back(self):
+        probe = _Probe()
+
+        async def burst():
+            return await asyncio.gather(*(self.executor.run("slow", probe.work, 0.03, i) for i in range(6)))
+
+        self.assertEqual(asyncio.run(burst()), list(range(6)))
+        self.assertEqual(probe.peak, 2)
+        stats = self.executor.stats()["routes"]["slow"]
+        self.assertEqual((stats["completed"], stats["active"], stats["waiting"]), (6, 0, 0))
+        self.assertGreaterEqual(stats["max_waiting"], 1)
+
+    def test_saturated_route_does_not_block_another(self):
+        probe = _Probe()
+
+        async def mixed():
+            slow = [asyncio.ensure_future(self.executor.run("slow", probe.work, 0.3)) for _ in range(6)]
+            await asyncio.sleep(0.02)
+            started = time.perf_counter()
+            await self.executor.run("fast", probe.work, 0.0)
+            fast_s = time.perf_counter() - started
+            await asyncio.gather(*slow)
+            return fast_s
+
+        self.assertLess(asyncio.run(mixed()), 0.2)
+
+    def test_full_queue_rejects_and_cancelled_waiters_free_their_place(self):
+        executor = EngineExecutor({"one": RouteLimit(max_concurrent=1, max_queue=1)}, threads=2)
+        probe = _Probe()
+
+        async def overload():
+            running = asyncio.ensure_future(executor.run("one", probe.work, 0.1))
+            await asyncio.sleep(0.01)
+            queued = asyncio.ensure_future(executor.run("one", probe.work, 0.0))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(RouteOverloaded):
+                await executor.run("one", probe.work, 0.0)
+            queued.cancel()
+            await asyncio.sleep(0)
+            await running
+            return await executor.run("one", probe.work, 0.0, "after")
+
+        self.assertEqual(asyncio.run(overload()), "after")
+        stats = executor.stats()["routes"]["one"]
+        self.assertEqual((stats["rejected"], stats["active"], stats["waiting"]), (1, 0, 0))
+        executor.shutdown()
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_concurrent_threads_share_one_call(self):
+        flights = SingleFlight("test")
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(1.0)
+            return {"payload": 1}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do("k", compute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while flights.stats()["coalesced"] < 4:
+            time.sleep(0.005)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flights.stats(), {"leaders": 1, "coalesced": 4, "in_flight": 0})
+        # Finished flights are forgotten: the next caller computes again.
+        self.assertEqual(flights.do("k", compute), {"payload": 1})
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_reach_waiters_and_cancelled_waiters_do_not_cancel_the_work(self):
+        flights = SingleFlight("test")
+        calls = []
+
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            if value == "boom":
+                raise ValueError(value)
+            return value
+
+        async def scenario():
+            first = asyncio.ensure_future(flights.run("a", lambda: compute("ok")))
+            impatient = asyncio.ensure_future(flights.run("a", lambda: compute("ok")))
+            patient = asyncio.ensure_future(flights.run("a", lambda: compute("ok")))
+            await asyncio.sleep(0.01)
+            impatient.cancel()
+            results = await asyncio.gather(first, patient)
+
+            failing = [asyncio.ensure_future(flights.run("b", lambda: compute("boom"))) for _ in range(3)]
+            errors = await asyncio.gather(*failing, return_exceptions=True)
+            return results, errors
+
+        results, errors = asyncio.run(scenario())
+        self.assertEqual(results, ["ok", "ok"])
+        self.assertEqual(calls, ["ok", "boom"])
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        self.assertEqual(flights.stats(), {"leaders": 2, "coalesced": 4, "in_flight": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import pathlib
+import tempfile
+import unittest
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from building_artifact import compile_artifact, load_building_index
+from parallel_scoring import ParallelScorer
+from shadow_engine import ShadowCache, compute_sunny_cafes, compute_sunny_timeseries
+
+from helpers import buildings_geojson, load_cafes
+
+
+class ParallelScoringTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        root = pathlib.Path(cls.tmp.name)
+        cls.cafes = load_cafes(40)
+        geojson = root / "buildings.geojson"
+        geojson.write_text(json.dumps(buildings_geojson(cls.cafes)))
+        artifact = root / "buildings_artifact"
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            compile_artifact(geojson, artifact, cafes=cls.cafes)
+        cls.index, _ = load_building_index(geojson, artifact, cafes=cls.cafes)
+        cls.scorer = ParallelScorer(workers=2, geojson_path=geojson, artifact_dir=artifact, cafes=cls.cafes)
+        cls.times = [datetime(2026, 6, 1, 3, 0, tzinfo=timezone.utc) + timedelta(minutes=45 * i) for i in range(24)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.scorer.close()
+        cls.tmp.cleanup()
+
+    def test_workers_attach_to_the_artifact(self):
+        self.assertEqual(self.scorer.warm_up(), [len(self.index)] * 2)
+
+    def test_parallel_ranking_matches_serial(self):
+        for dt in self.times[::4]:
+            for kwargs in ({"candidate_mode": "static", "shade_mode": "raycast"}, {"shade_mode": "layer"}):
+                serial = compute_sunny_cafes(self.cafes, self.index, dt, 30.0, limit=None, **kwargs)
+                parallel = self.scorer.compute_sunny_cafes(self.cafes, dt, 30.0, limit=None, **kwargs)
+                self.assertEqual(parallel, serial, msg=f"{kwargs} {dt.isoformat()}")
+            self.assertEqual(
+                self.scorer.compute_sunny_cafes(self.cafes, dt, 30.0, limit=5, shared_shadow_cache=ShadowCache()),
+                compute_sunny_cafes(self.cafes, self.index, dt, 30.0, limit=5, shared_shadow_cache=ShadowCache()),
+            )
+
+    def test_parallel_timeseries_matches_serial(self):
+        cloud_by_time = {dt: float(i * 4) for i, dt in enumerate(self.times)}
+        serial = compute_sunny_timeseries(self.cafes, self.index, self.times, cloud_by_time)
+        parallel = self.scorer.compute_sunny_timeseries(self.cafes, self.times, cloud_by_time)
+        self.assertEqual(parallel.times, serial.times)
+        np.testing.assert_array_equal(parallel.sunny_fraction, serial.sunny_fraction)
+        np.testing.assert_array_equal(parallel.sunny_score, serial.sunny_score)
+        self.assertEqual(parallel.rows(10), serial.rows(10))
+
+
+if __name__ == "__main__":
+    unittest.main()
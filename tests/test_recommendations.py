@@ -16,6 +16,20 @@ class RecommendationLogicTests(unittest.TestCase):
         self.assertEqual(windows[0]["duration_min"], 120)
         self.assertEqual(windows[0]["condition"], "partial")
 
+    def test_merge_windows_uses_row_end_for_minute_segments(self):
+        segments = [
+            {"time_utc": "2026-02-21T10:00:00+00:00", "end_utc": "2026-02-21T10:37:00+00:00", "time_local": "2026-02-21T11:00:00+01:00", "timezone": "Europe/Copenhagen", "condition": "shaded"},
+            {"time_utc": "2026-02-21T10:37:00+00:00", "end_utc": "2026-02-21T11:00:00+00:00", "time_local": "2026-02-21T11:37:00+01:00", "timezone": "Europe/Copenhagen", "condition": "sunny"},
+            {"time_utc": "2026-02-21T11:00:00+00:00", "end_utc": "2026-02-21T11:12:00+00:00", "time_local": "2026-02-21T12:00:00+01:00", "timezone": "Europe/Copenhagen", "condition": "sunny"},
+            {"time_utc": "2026-02-21T11:12:00+00:00", "end_utc": "2026-02-21T12:00:00+00:00", "time_local": "2026-02-21T12:12:00+01:00", "timezone": "Europe/Copenhagen", "condition": "shaded"},
+        ]
+        windows = merge_windows(segments, min_duration_min=20)
+        self.assertEqual(len(windows), 1)
+        self.assertEqual(windows[0]["start_utc"], "2026-02-21T10:37:00+00:00")
+        self.assertEqual(windows[0]["end_utc"], "2026-02-21T11:12:00+00:00")
+        self.assertEqual(windows[0]["duration_min"], 35)
+        self.assertEqual(windows[0]["end_local"], "2026-02-21T12:12:00+01:00")
+
     def test_rank_recommendations_is_deterministic(self):
         windows_by_cafe = {
             "osm-1": {
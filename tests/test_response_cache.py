@@ -0,0 +1,112 @@
+import gzip
+import json
+import unittest
+
+from response_cache import ResponseCache, encode_payload, etag_matches, json_bytes, ndjson_chunks
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def test_entries_expire_after_ttl(self):
+        clock = _Clock()
+        cache = ResponseCache(max_bytes=1024, ttl_s=60.0, clock=clock)
+        cache.put("a", b"payload")
+        clock.now = 59.0
+        self.assertEqual(cache.get("a"), b"payload")
+        clock.now = 60.0
+        self.assertIsNone(cache.get("a"))
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["expirations"]), (1, 1, 1))
+        self.assertEqual((stats["entries"], stats["bytes"], stats["hit_rate"]), (0, 0, 0.5))
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = ResponseCache(max_bytes=10, ttl_s=60.0, clock=_Clock())
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        self.assertEqual(cache.get("a"), b"aaaa")
+        cache.put("c", b"cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"aaaa")
+        self.assertEqual(cache.get("c"), b"cccc")
+
+        # Replacing a key re-counts its bytes; oversized bodies are never stored.
+        cache.put("a", b"aaaaaa")
+        cache.put("huge", b"x" * 11)
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["bytes"], stats["evictions"]), (2, 10, 1))
+        self.assertIsNone(cache.get("huge"))
+
+    def test_json_bytes_round_trips_compactly(self):
+        payload = {"name": "Café Æble", "scores": [1, 0.5], "none": None}
+        body = json_bytes(payload)
+        self.assertEqual(json.loads(body), payload)
+        self.assertIn("Café".encode("utf-8"), body)
+        self.assertNotIn(b", ", body)
+        with self.assertRaises(ValueError):
+            json_bytes({"bad": float("nan")})
+
+    def test_ndjson_chunks_put_the_header_first_and_group_rows(self):
+        rows = [{"id": i} for i in range(5)]
+        chunks = list(ndjson_chunks({"count": 5}, iter(rows), chunk_rows=2))
+        self.assertEqual(len(chunks), 4)
+        lines = b"".join(chunks).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{"count": 5}, *rows])
+        self.assertTrue(all(chunk.endswith(b"\n") for chunk in chunks))
+        self.assertEqual(list(ndjson_chunks({"count": 0}, [])), [b'{"count":0}\n'])
+
+    def test_encoded_payload_variants_and_etags(self):
+        payload = {"cafes": [{"name": f"Cafe {i}", "score": i} for i in range(200)]}
+        encoded = encode_payload(payload, "cafes:0")
+        self.assertEqual(gzip.decompress(encoded.gzip), json_bytes(payload))
+        self.assertEqual(encoded.negotiate("gzip, deflate"), (encoded.gzip, "gzip"))
+        self.assertEqual(encoded.negotiate("gzip;q=0, identity"), (encoded.body, None))
+        # The wildcard never re-admits a coding refused with q=0.
+        refused_gzip = encoded.negotiate("gzip;q=0, *")
+        self.assertNotEqual(refused_gzip[1], "gzip")
+        if encoded.br is None:
+            self.assertEqual(refused_gzip, (encoded.body, None))
+        self.assertEqual(encoded.negotiate("gzip;q=0, br;q=0, *"), (encoded.body, None))
+        self.assertEqual(encoded.negotiate("*"), (encoded.br, "br") if encoded.br is not None else (encoded.gzip, "gzip"))
+        self.assertEqual(encoded.negotiate(None), (encoded.body, None))
+        if encoded.br is not None:
+            self.assertEqual(encoded.negotiate("gzip, br;q=0.5"), (encoded.br, "br"))
+
+        # Same bytes and version -> same ETag; either changing -> a new one.
+        self.assertEqual(encode_payload(payload, "cafes:0").etag, encoded.etag)
+        self.assertNotEqual(encode_payload(payload, "cafes:1").etag, encoded.etag)
+        self.assertNotEqual(encode_payload({"cafes": []}, "cafes:0").etag, encoded.etag)
+
+        # Tiny bodies are not worth compressing.
+        self.assertIsNone(encode_payload({"cities": []}, "cities").gzip)
+
+        # Each encoding is a different byte sequence, so it carries its own strong ETag ...
+        gzip_etag = encoded.etag_for("gzip")
+        self.assertEqual(len({encoded.etag, gzip_etag, encoded.etag_for("br")}), 3)
+        self.assertTrue(gzip_etag.startswith(encoded.etag[:-1]) and gzip_etag.endswith('-gz"'))
+        # ... and revalidating with any variant's tag still matches the payload.
+        self.assertTrue(etag_matches(gzip_etag, encoded.etag))
+        self.assertTrue(etag_matches(f'W/{encoded.etag_for("br")}', encoded.etag))
+        self.assertFalse(etag_matches(encode_payload(payload, "cafes:1").etag_for("gzip"), encoded.etag))
+
+        self.assertTrue(etag_matches(f'"other", {encoded.etag}', encoded.etag))
+        self.assertTrue(etag_matches(f"W/{encoded.etag}", encoded.etag))
+        self.assertTrue(etag_matches("*", encoded.etag))
+        self.assertFalse(etag_matches('"other"', encoded.etag))
+        self.assertFalse(etag_matches(None, encoded.etag))
+
+        cache = ResponseCache(max_bytes=10 * encoded.nbytes, ttl_s=60.0, clock=_Clock())
+        cache.put("cafes", encoded)
+        self.assertIs(cache.get("cafes"), encoded)
+        self.assertEqual(cache.stats()["bytes"], encoded.nbytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,333 @@
+import unittest
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import shapely
+from pysolar.solar import get_altitude, get_azimuth
+from shapely.geometry import Point, Polygon, box
+
+from cafe_index import CafeIndex, haversine_m
+from shadow_engine import (
+    SUN_REF_LAT,
+    SUN_REF_LON,
+    TO_UTM,
+    BuildingIndex,
+    HorizonProfiles,
+    ShadowCache,
+    build_building_index,
+    build_horizon_profiles,
+    build_shadow_layer,
+    compute_seat_sun_intervals,
+    compute_seat_sun_intervals_many,
+    compute_sunny_cafes,
+    compute_sunny_timeseries,
+    get_sun_positions,
+    nearest_sunny_cafes,
+    project_shadow,
+    _prune_candidates,
+)
+
+from helpers import load_cafes, synthetic_city
+
+
+def _sample_times() -> list[datetime]:
+    day = datetime(2026, 4, 20, 4, 0, tzinfo=timezone.utc)
+    return [day + timedelta(minutes=50 * i) for i in range(18)]
+
+
+class SunPositionTests(unittest.TestCase):
+    def test_vectorized_ephemeris_matches_pysolar_over_a_year(self):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        times = [start + timedelta(minutes=187 * i) for i in range(2811)]
+        azimuth, elevation = get_sun_positions(SUN_REF_LAT, SUN_REF_LON, times)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            ref_elevation = np.array([get_altitude(SUN_REF_LAT, SUN_REF_LON, t) for t in times])
+            ref_azimuth = np.array([get_azimuth(SUN_REF_LAT, SUN_REF_LON, t) % 360.0 for t in times])
+
+        daylight = ref_elevation > 0.0
+        self.assertGreater(daylight.sum(), 1000)
+        azimuth_error = np.abs((azimuth - ref_azimuth + 180.0) % 360.0 - 180.0)
+        self.assertLess(np.abs(elevation - ref_elevation)[daylight].max(), 0.05)
+        self.assertLess(azimuth_error[daylight].max(), 0.05)
+
+
+class ShadowEngineTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cafes = load_cafes(60)
+        cls.buildings = synthetic_city(cls.cafes)
+        cls.index = build_building_index(cls.buildings)
+
+    def _fractions(self, dt: datetime, **kwargs) -> dict:
+        rows = compute_sunny_cafes(self.cafes, self.index, dt, 0.0, limit=None, **kwargs)
+        return {row["osm_id"]: row["sunny_fraction"] for row in rows}
+
+    def test_corridor_candidates_match_disc(self):
+        for dt in _sample_times():
+            self.assertEqual(
+                self._fractions(dt, candidate_mode="disc"),
+                self._fractions(dt, candidate_mode="corridor"),
+                msg=dt.isoformat(),
+            )
+
+    def test_static_candidates_match_corridor(self):
+        index = build_building_index(self.buildings, cafes=self.cafes)
+        candidates = index.seat_candidates
+        self.assertEqual(len(candidates.offsets), 3 * len(self.cafes) + 1)
+        self.assertTrue(np.all(np.diff(candidates.distances[candidates.offsets[0]:candidates.offsets[1]]) >= 0))
+        for dt in _sample_times():
+            static = compute_sunny_cafes(self.cafes, index, dt, 0.0, limit=None, candidate_mode="static")
+            self.assertEqual(
+                {row["osm_id"]: row["sunny_fraction"] for row in static},
+                self._fractions(dt, candidate_mode="corridor"),
+                msg=dt.isoformat(),
+            )
+
+    def test_raycast_matches_polygon_shadows(self):
+        for dt in _sample_times():
+            self.assertEqual(
+                self._fractions(dt, shade_mode="polygon"),
+                self._fractions(dt, shade_mode="raycast"),
+                msg=dt.isoformat(),
+            )
+
+    def test_shadow_layer_matches_polygon_shadows(self):
+        for dt in _sample_times():
+            self.assertEqual(
+                self._fractions(dt, shade_mode="polygon"),
+                self._fractions(dt, shade_mode="layer"),
+                msg=dt.isoformat(),
+            )
+
+    def test_shadow_layer_repairs_invalid_and_skips_zero_height_footprints(self):
+        x, y = TO_UTM.transform(12.568, 55.676)
+        bowtie = Polygon([(x, y), (x + 20, y + 20), (x + 20, y), (x, y + 20), (x, y)])
+        flat = box(x + 60, y, x + 80, y + 20)
+        plain = box(x - 60, y, x - 40, y + 20)
+        self.assertFalse(bowtie.is_valid)
+        index = BuildingIndex(
+            np.array([bowtie, flat, plain], dtype=object),
+            np.array([15.0, 0.0, 10.0], dtype=np.float32),
+            np.array([1, 2, 3]),
+            np.zeros(3, dtype=np.uint8),
+            ["test"],
+        )
+        grid_x, grid_y = np.meshgrid(np.arange(x - 100, x + 120, 2.5), np.arange(y - 100, y + 60, 2.5))
+        xs, ys = grid_x.ravel(), grid_y.ravel()
+        points = shapely.points(xs, ys)
+        for azimuth, elevation in ((200.0, 25.0), (95.0, 12.0), (300.0, 40.0)):
+            layer = build_shadow_layer(index, azimuth, elevation)
+            expected = np.zeros(len(xs), dtype=bool)
+            for geom, height in zip(index.geometries, index.heights.tolist()):
+                shadow = project_shadow(geom, height, azimuth, elevation)
+                if shadow is not None:
+                    expected |= shapely.intersects(shadow, points)
+            np.testing.assert_array_equal(layer.shaded_xy(xs, ys), expected)
+            self.assertFalse(layer.shaded_xy(np.array([x + 70.0]), np.array([y + 10.0]))[0])
+
+    def test_horizon_lookup_tracks_raycast(self):
+        cafes = self.cafes[:20]
+        horizons = build_horizon_profiles(cafes, self.index)
+        self.assertEqual(horizons.horizons.shape, (20, 3, 720))
+        total = mismatched = 0
+        for dt in _sample_times():
+            exact = compute_sunny_cafes(cafes, self.index, dt, 0.0, limit=None, shade_mode="raycast")
+            binned = compute_sunny_cafes(
+                cafes, self.index, dt, 0.0, limit=None, shade_mode="horizon", horizons=horizons
+            )
+            binned_by_id = {row["osm_id"]: row["sunny_fraction"] for row in binned}
+            for row in exact:
+                total += 1
+                mismatched += row["sunny_fraction"] != binned_by_id[row["osm_id"]]
+        # Azimuth binning may flip a seat right at a building edge, nothing more.
+        self.assertLessEqual(mismatched / total, 0.02)
+
+    def test_shared_shadow_cache_reuses_quantized_shadows(self):
+        cache = ShadowCache(azimuth_step_deg=0.5, elevation_step_deg=0.5)
+        dt = _sample_times()[8]
+        first = self._fractions(dt, shared_shadow_cache=cache)
+        misses = cache.misses
+        self.assertGreater(misses, 0)
+
+        # A request a few seconds later lands in the same sun bucket.
+        second = self._fractions(dt + timedelta(seconds=5), shared_shadow_cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual(cache.misses, misses)
+        self.assertGreater(cache.stats()["hit_rate"], 0.0)
+
+    def test_shared_shadow_cache_evicts_by_bytes(self):
+        cache = ShadowCache(max_bytes=20_000)
+        for dt in _sample_times()[4:8]:
+            self._fractions(dt, shared_shadow_cache=cache)
+        stats = cache.stats()
+        self.assertGreater(stats["evictions"], 0)
+        self.assertLessEqual(stats["bytes"], 20_000)
+
+    def test_prune_drops_unreachable_buildings_and_orders_by_blocking_ratio(self):
+        index = build_building_index(
+            [
+                {"geom_utm": box(100.0, -5.0, 110.0, 5.0), "height_m": 5.0},  # low shed far away
+                {"geom_utm": box(20.0, -5.0, 30.0, 5.0), "height_m": 15.0},  # ratio 0.75
+                {"geom_utm": box(10.0, -5.0, 20.0, 5.0), "height_m": 30.0},  # ratio 3.0
+            ]
+        )
+        kept = _prune_candidates(index, Point(0.0, 0.0), [0, 1, 2], tan_elevation=0.5)
+        self.assertEqual(kept.tolist(), [2, 1])
+
+    def test_timeseries_matches_per_slot_ranking(self):
+        index = build_building_index(self.buildings, cafes=self.cafes)
+        cafes = self.cafes[:25]
+        times = _sample_times()
+        cloud_by_time = {dt: float(10 * (i % 7)) for i, dt in enumerate(times)}
+        horizons = build_horizon_profiles(cafes, index)
+        for shade_mode in ("raycast", "horizon", "layer"):
+            series = compute_sunny_timeseries(
+                cafes, index, times, cloud_by_time, shade_mode=shade_mode, horizons=horizons
+            )
+            self.assertEqual(series.sunny_score.shape, (25, len(times)))
+            for slot, dt in enumerate(times):
+                expected = compute_sunny_cafes(
+                    cafes,
+                    index,
+                    dt,
+                    cloud_by_time[dt],
+                    limit=None,
+                    candidate_mode="static",
+                    shade_mode=shade_mode,
+                    horizons=horizons,
+                )
+                self.assertEqual(series.rows(slot), expected, msg=f"{shade_mode} {dt.isoformat()}")
+
+        # A subset ranks exactly like a run over just those cafes.
+        rows = [3, 17, 4, 11]
+        subset = series.subset(rows)
+        alone = compute_sunny_timeseries(
+            [cafes[row] for row in rows], index, times, cloud_by_time, shade_mode="layer"
+        )
+        for slot in range(len(times)):
+            self.assertEqual(subset.rows(slot, limit=3), alone.rows(slot, limit=3))
+
+    def test_weather_refresh_reuses_cached_geometry(self):
+        cafes = self.cafes[:20]
+        times = _sample_times()
+        cache = ShadowCache()
+        first = compute_sunny_timeseries(cafes, self.index, times, {}, shade_mode="layer", shared_shadow_cache=cache)
+        misses = cache.misses
+
+        forecast = {dt: float(15 * (i % 5)) for i, dt in enumerate(times)}
+        refreshed = compute_sunny_timeseries(
+            cafes, self.index, times, forecast, shade_mode="layer", shared_shadow_cache=cache
+        )
+        self.assertEqual(cache.misses, misses)
+        fresh = compute_sunny_timeseries(
+            cafes, self.index, times, forecast, shade_mode="layer", shared_shadow_cache=ShadowCache()
+        )
+        np.testing.assert_array_equal(refreshed.sunny_score, fresh.sunny_score)
+        np.testing.assert_array_equal(first.rescored(forecast).sunny_score, fresh.sunny_score)
+        for slot in range(len(times)):
+            self.assertEqual(first.rescored(forecast).rows(slot), fresh.rows(slot))
+
+    def test_timeseries_builds_candidates_for_unindexed_cafes(self):
+        cafes = self.cafes[:10]
+        times = _sample_times()[6:12]
+        # Both left at their default shade mode, so the two paths must agree.
+        series = compute_sunny_timeseries(cafes, self.index, times, {})
+        self.assertTrue(np.all(series.cloud_cover_pct == 50.0))
+        for slot, dt in enumerate(times):
+            expected = compute_sunny_cafes(cafes, self.index, dt, 50.0, limit=None)
+            self.assertEqual(series.rows(slot), expected)
+
+    def test_nearest_sunny_cafes_match_brute_force_and_stop_early(self):
+        catalog = CafeIndex(self.cafes)
+        lon, lat = 12.568, 55.679
+        for dt in _sample_times()[4:14:3]:
+            rows = compute_sunny_cafes(self.cafes, self.index, dt, 30.0, limit=None, candidate_mode="static")
+            distances = haversine_m(lon, lat, np.array([r["lon"] for r in rows]), np.array([r["lat"] for r in rows]))
+            for row, distance in zip(rows, distances.tolist()):
+                row["distance_m"] = round(distance, 1)
+            for k, min_fraction in ((1, 0.0), (5, 0.0), (4, 0.75)):
+                expected = sorted(
+                    (r for r in rows if r["sunny_fraction"] > 0 and r["sunny_fraction"] >= min_fraction),
+                    key=lambda r: r["distance_m"],
+                )[:k]
+
+                consumed = []
+
+                def candidates():
+                    for item in catalog.iter_nearest(lon, lat):
+                        consumed.append(item)
+                        yield item
+
+                found = nearest_sunny_cafes(
+                    candidates(), self.index, dt, 30.0, k, min_sunny_fraction=min_fraction
+                )
+                self.assertEqual(found, expected, msg=f"{dt.isoformat()} k={k}")
+                if len(found) == k and k == 1:
+                    self.assertLess(len(consumed), len(self.cafes))
+
+        night = datetime(2026, 4, 20, 23, 0, tzinfo=timezone.utc)
+        self.assertEqual(nearest_sunny_cafes(catalog.iter_nearest(lon, lat), self.index, night, 0.0, 3), [])
+
+    def test_seat_sun_intervals_match_minute_sampling(self):
+        cafes = self.cafes[:6]
+        horizons = build_horizon_profiles(cafes, self.index)
+        start = datetime(2026, 4, 20, 0, 0, tzinfo=timezone.utc)
+        minutes = [start + timedelta(minutes=m) for m in range(24 * 60)]
+        series = compute_sunny_timeseries(cafes, self.index, minutes, {}, shade_mode="horizon", horizons=horizons)
+
+        batched = compute_seat_sun_intervals_many(
+            cafes, self.index, start, start + timedelta(days=1), horizons=horizons, coarse_step_min=5
+        )
+        transitions = mismatched = 0
+        for cafe_idx, cafe in enumerate(cafes):
+            single = HorizonProfiles(bin_deg=horizons.bin_deg, horizons=horizons.horizons[cafe_idx:cafe_idx + 1])
+            intervals = compute_seat_sun_intervals(
+                cafe, self.index, start, start + timedelta(days=1), horizons=single, coarse_step_min=5
+            )
+            self.assertEqual(batched[cafe_idx], intervals)
+            transitions += sum(2 * len(seat) for seat in intervals.seats)
+            segments = intervals.fraction_segments()
+            hours = minutes[::60]
+            expected = [next(f for lo, hi, f in segments if lo <= dt < hi) for dt in hours]
+            self.assertEqual(intervals.fractions_at(hours).tolist(), expected)
+            self.assertEqual(intervals.fractions_at([start - timedelta(hours=1)]).tolist(), [0.0])
+            self.assertEqual(segments[0][0], start)
+            self.assertEqual(segments[-1][1], start + timedelta(days=1))
+            for slot, dt in enumerate(minutes):
+                fraction = next(f for lo, hi, f in segments if lo <= dt < hi)
+                if fraction != series.sunny_fraction[cafe_idx, slot]:
+                    # Disagreement is limited to rounding at a transition and to
+                    # flicker shorter than the coarse step right next to one.
+                    mismatched += 1
+                    edges = [abs((t - dt).total_seconds()) for lo, hi, _ in segments for t in (lo, hi)]
+                    self.assertLessEqual(min(edges), 5 * 60.0, msg=f"{cafe_idx} {dt.isoformat()}")
+        self.assertGreater(transitions, 0)
+        self.assertLessEqual(mismatched / (len(cafes) * len(minutes)), 0.01)
+
+    def test_building_index_is_columnar(self):
+        self.assertEqual(len(self.index), len(self.buildings))
+        self.assertEqual(self.index.heights.dtype, np.float32)
+        self.assertEqual(self.index.osm_ids.dtype, np.int64)
+        self.assertEqual(self.index.bounds.shape, (len(self.buildings), 4))
+        self.assertEqual(self.index.osm_id(0), 1)
+        self.assertEqual(self.index.height_source(0), "test")
+        report = self.index.memory_report()
+        self.assertEqual(report["rows"], len(self.buildings))
+        self.assertGreater(report["total"], report["heights"])
+
+        # Per-building source tags can outnumber a byte; codes must not wrap.
+        tagged = [dict(b, height_source=f"survey-{i}") for i, b in enumerate(self.buildings[:300])]
+        index = build_building_index(tagged)
+        self.assertEqual(index.height_source(299), "survey-299")
+        self.assertEqual(len(set(index.source_codes.tolist())), len(tagged))
+
+    def test_unknown_candidate_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            compute_sunny_cafes(self.cafes, self.index, _sample_times()[0], 0.0, candidate_mode="ring")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import pathlib
+import tempfile
+import unittest
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import shapely
+
+from shadow_engine import TO_UTM, BuildingIndex, build_building_index, compute_sunny_timeseries
+from sun_atlas import ATLAS_SLOT_MINUTES, build_sun_atlas, load_sun_atlas
+
+from helpers import load_cafes, synthetic_city
+
+
+class SunAtlasTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.atlas_dir = pathlib.Path(self.tmp.name) / "sun_atlas"
+        self.cafes = load_cafes(12)
+        self.index = build_building_index(synthetic_city(self.cafes), cafes=self.cafes)
+        self.enterContext(warnings.catch_warnings())
+        warnings.simplefilter("ignore", DeprecationWarning)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_atlas_matches_horizon_timeseries_on_slot_times(self):
+        stats = build_sun_atlas(self.cafes, self.index, self.atlas_dir, year=2026)
+        self.assertEqual(stats, {"cafes": 12, "reused": 0, "rebuilt": 12})
+        atlas = load_sun_atlas(self.atlas_dir, building_index=self.index)
+        self.assertIsInstance(atlas.bits, np.memmap)
+
+        day = datetime(2026, 5, 14, tzinfo=timezone.utc)
+        times = [day + timedelta(minutes=ATLAS_SLOT_MINUTES * i) for i in range(0, 288, 7)]
+        cloud_by_time = {dt: float(i % 5) * 20.0 for i, dt in enumerate(times)}
+        rows = atlas.rows_for(self.cafes)
+        looked_up = atlas.timeseries(self.cafes, rows, times, cloud_by_time)
+        computed = compute_sunny_timeseries(
+            self.cafes,
+            self.index,
+            times,
+            cloud_by_time,
+            shade_mode="horizon",
+            horizons=atlas.horizon_profiles(rows),
+        )
+        np.testing.assert_array_equal(looked_up.sunny_fraction, computed.sunny_fraction)
+        np.testing.assert_array_equal(looked_up.sunny_score, computed.sunny_score)
+        self.assertEqual(looked_up.rows(30, limit=5), computed.rows(30, limit=5))
+
+        # Atlas built for other buildings is ignored, even when bounds and heights match.
+        other = build_building_index(synthetic_city(self.cafes[:3]))
+        self.assertIsNone(load_sun_atlas(self.atlas_dir, building_index=other))
+        reshaped = synthetic_city(self.cafes)
+        reshaped[0]["geom_utm"] = shapely.box(*reshaped[0]["geom_utm"].bounds)
+        self.assertIsNone(load_sun_atlas(self.atlas_dir, building_index=build_building_index(reshaped)))
+        # Unknown cafes disable lookups.
+        moved = {**self.cafes[0], "geometry": {"type": "Point", "coordinates": [12.0, 55.0]}}
+        self.assertIsNone(atlas.rows_for([moved]))
+
+    def test_calendar_rows_across_feb_29_and_the_year_boundary(self):
+        for year in (2028, 2026):
+            build_sun_atlas(self.cafes, self.index, self.atlas_dir, year=year)
+            atlas = load_sun_atlas(self.atlas_dir, building_index=self.index)
+            self.assertEqual(atlas.year, year)
+            rows = atlas.rows_for(self.cafes)
+
+            days = [datetime(year, 2, 28, tzinfo=timezone.utc), datetime(year, 3, 1, tzinfo=timezone.utc)]
+            if year == 2028:
+                days.insert(1, datetime(year, 2, 29, tzinfo=timezone.utc))
+            days.append(datetime(year, 12, 31, tzinfo=timezone.utc))
+            times = [day + timedelta(minutes=ATLAS_SLOT_MINUTES * i) for day in days for i in range(96, 192, 9)]
+            self.assertTrue(atlas.covers(times))
+            computed = compute_sunny_timeseries(
+                self.cafes, self.index, times, {}, shade_mode="horizon", horizons=atlas.horizon_profiles(rows)
+            )
+            np.testing.assert_array_equal(atlas.sunny_fraction(rows, times), computed.sunny_fraction)
+
+            # The next year's sun track differs; lookups must go to the engine.
+            new_year = datetime(year + 1, 1, 1, 12, 0, tzinfo=timezone.utc)
+            self.assertFalse(atlas.covers([times[-1], new_year]))
+            self.assertTrue(atlas.covers([datetime(year, 12, 31, 23, 59, tzinfo=timezone.utc)]))
+
+    def test_refresh_only_rebuilds_cafes_near_changed_buildings(self):
+        build_sun_atlas(self.cafes, self.index, self.atlas_dir, year=2026)
+        before = load_sun_atlas(self.atlas_dir)
+        before_bits = np.array(before.bits)
+
+        # Raise one building next to the first cafe.
+        x, y = TO_UTM.transform(*self.cafes[0]["geometry"]["coordinates"])
+        nearest = int(np.argmin(np.hypot(self.index.centroids[:, 0] - x, self.index.centroids[:, 1] - y)))
+        heights = self.index.heights.copy()
+        heights[nearest] += 30.0
+        changed = BuildingIndex(
+            self.index.geometries,
+            heights,
+            self.index.osm_ids,
+            self.index.source_codes,
+            self.index.source_names,
+        )
+        near = {
+            row
+            for row, cafe in enumerate(self.cafes)
+            if shapely.distance(shapely.points(*TO_UTM.transform(*cafe["geometry"]["coordinates"])), self.index.geometries[nearest])
+            < 600.0
+        }
+
+        stats = build_sun_atlas(self.cafes, changed, self.atlas_dir, year=2026)
+        self.assertGreaterEqual(stats["rebuilt"], 1)
+        self.assertEqual(stats["reused"] + stats["rebuilt"], len(self.cafes))
+        self.assertLess(stats["rebuilt"], len(self.cafes))
+        after = load_sun_atlas(self.atlas_dir)
+        for row in range(len(self.cafes)):
+            if row not in near:
+                np.testing.assert_array_equal(after.bits[:, row], before_bits[:, row])
+
+
+if __name__ == "__main__":
+    unittest.main()
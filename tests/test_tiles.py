@@ -0,0 +1,47 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+from tiles import tile_bounds, tile_xy, tiles_covering
+
+
+class TileMathTests(unittest.TestCase):
+    def test_points_land_in_the_tile_whose_bounds_contain_them(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            z = rng.randint(10, 20)
+            lon, lat = rng.uniform(12.4, 12.7), rng.uniform(55.6, 55.8)
+            xs, ys = tile_xy(np.array([lon]), np.array([lat]), z)
+            min_lon, min_lat, max_lon, max_lat = tile_bounds(z, int(xs[0]), int(ys[0]))
+            self.assertTrue(min_lon <= lon < max_lon)
+            self.assertTrue(min_lat < lat <= max_lat)
+
+    def test_known_tile_and_shared_edges(self):
+        # Copenhagen city hall at z15.
+        xs, ys = tile_xy(np.array([12.5683]), np.array([55.6761]), 15)
+        self.assertEqual((int(xs[0]), int(ys[0])), (17527, 10256))
+        west = tile_bounds(15, 17527, 10256)
+        east = tile_bounds(15, 17528, 10256)
+        south = tile_bounds(15, 17527, 10257)
+        self.assertEqual(west[2], east[0])
+        self.assertEqual(west[1], south[3])
+        self.assertTrue(math.isclose(tile_bounds(0, 0, 0)[3], 85.0511287798, rel_tol=1e-9))
+
+    def test_tiles_covering_a_bbox(self):
+        bbox = (12.55, 55.67, 12.60, 55.69)
+        tiles = tiles_covering(bbox, 15)
+        self.assertEqual(len(tiles), len(set(tiles)))
+        for x, y in tiles:
+            min_lon, min_lat, max_lon, max_lat = tile_bounds(15, x, y)
+            self.assertTrue(min_lon < bbox[2] and max_lon > bbox[0])
+            self.assertTrue(min_lat < bbox[3] and max_lat > bbox[1])
+        lons = np.random.default_rng(3).uniform(bbox[0], bbox[2], 200)
+        lats = np.random.default_rng(4).uniform(bbox[1], bbox[3], 200)
+        xs, ys = tile_xy(lons, lats, 15)
+        self.assertTrue(set(zip(xs.tolist(), ys.tolist())) <= set(tiles))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Slippy-map (Web Mercator, XYZ) tile math for the tile endpoints.
+
+A tile covers ``[west, east)`` by ``(south, north]``, so every point belongs
+to exactly one tile per zoom and adjacent tiles never repeat a cafe.
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+TILE_MIN_ZOOM = 10
+TILE_MAX_ZOOM = 20
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of tile ``z/x/y``."""
+    n = 1 << z
+    return _tile_lon(x, n), _tile_lat(y + 1, n), _tile_lon(x + 1, n), _tile_lat(y, n)
+
+
+def tile_xy(lons: np.ndarray, lats: np.ndarray, z: int) -> tuple[np.ndarray, np.ndarray]:
+    """Tile columns and rows containing each point at zoom ``z``."""
+    n = 1 << z
+    lat_r = np.radians(np.clip(lats, -85.05112878, 85.05112878))
+    xs = np.floor((np.asarray(lons) + 180.0) / 360.0 * n)
+    ys = np.floor((1.0 - np.arcsinh(np.tan(lat_r)) / math.pi) / 2.0 * n)
+    return np.clip(xs, 0, n - 1).astype(np.int64), np.clip(ys, 0, n - 1).astype(np.int64)
+
+
+def tiles_covering(bbox: tuple[float, float, float, float], z: int) -> list[tuple[int, int]]:
+    """Every (x, y) at zoom ``z`` overlapping the lon/lat bbox, row by row from the north-west."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    xs, ys = tile_xy(np.array([min_lon, max_lon]), np.array([max_lat, min_lat]), z)
+    return [(x, y) for y in range(int(ys[0]), int(ys[1]) + 1) for x in range(int(xs[0]), int(xs[1]) + 1)]
+
+
+def _tile_lon(x: int, n: int) -> float:
+    return x / n * 360.0 - 180.0
+
+
+def _tile_lat(y: int, n: int) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * y / n))))
@@ -12,6 +12,8 @@ from typing import Callable
 import requests
 
 from city_config import get_city_config
+from execution import SingleFlight
+from recommendations import cache_key_from_parts
 from weather import get_cloud_cover as get_legacy_cloud_cover
 
 
@@ -23,6 +25,9 @@ STALE_TTL_HOURS = 12.0
 MET_NO_URL = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
 DMI_EDR_URL = "https://dmigw.govcloud.dk/v1/forecastedr/collections/harmonie_dini_sf/position"
 
+# One provider round trip per (city, range) no matter how many outlooks miss at once.
+WEATHER_FLIGHTS = SingleFlight("weather")
+
 
 @dataclass
 class WeatherSeriesResult:
@@ -42,6 +47,14 @@ def get_cloud_cover_series(
     city = get_city_config(city_id)
     start_utc = _ensure_utc(start_utc).replace(minute=0, second=0, microsecond=0)
     end_utc = _ensure_utc(end_utc).replace(minute=0, second=0, microsecond=0)
+    return WEATHER_FLIGHTS.do(
+        cache_key_from_parts(city.city_id, start_utc.isoformat(), end_utc.isoformat()),
+        lambda: _route_cloud_cover_series(city.city_id, start_utc, end_utc),
+    )
+
+
+def _route_cloud_cover_series(city_id: str, start_utc: datetime, end_utc: datetime) -> WeatherSeriesResult:
+    city = get_city_config(city_id)
     fallback_used = False
 
     fetchers: dict[str, Callable[[str, datetime, datetime], WeatherSeriesResult]] = {